@@ -7,20 +7,22 @@ except ImportError:
     pass
 
 from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect, Form
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, Response
+from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, Response, StreamingResponse
+from fastapi.concurrency import iterate_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import whisper
 from faster_whisper import WhisperModel
 import tempfile
+import io
 import os
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import sys
 import soundfile as sf
 import json
 import json
-import requests
+import httpx
 import asyncio
 from typing import Optional, List, Dict, Any
 import uuid
@@ -29,6 +31,15 @@ import sqlite3
 from pathlib import Path
 import subprocess
 import platform
+import threading
+import contextlib
+import csv
+import zlib
+import gc
+import weakref
+import re
+from collections import OrderedDict, Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Port cleanup function
 def cleanup_ports():
@@ -117,6 +128,7 @@ from pydantic import BaseModel
 import librosa
 import numpy as np
 import base64
+import hashlib
 
 # Configuration Management
 class Config:
@@ -135,9 +147,72 @@ class Config:
         self.DEFAULT_LLM_PROVIDER = os.getenv("DEFAULT_LLM_PROVIDER", "gemini")
         self.OPENROUTER_DEFAULT_MODEL = os.getenv("OPENROUTER_DEFAULT_MODEL", "deepseek/deepseek-chat")
         self.GEMINI_DEFAULT_MODEL = os.getenv("GEMINI_DEFAULT_MODEL", "gemini-1.5-flash")
+
+        # LLM HTTP client configuration (base URLs can point at a local stub for testing)
+        self.OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+        self.GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+        self.LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "30"))
+        self.LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+        self.OPENROUTER_MAX_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "20"))
+        self.GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "20"))
+        self.LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+        self.LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+        # Provider health: circuit breakers and routing ("preferred" keeps the requested
+        # provider first while healthy, "latency" always tries the fastest healthy one first)
+        self.LLM_ROUTING = os.getenv("LLM_ROUTING", "preferred").lower()
+        self.CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+        self.CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("CIRCUIT_COOLDOWN_SECONDS", "30"))
+        self.CIRCUIT_TRIAL_TIMEOUT_SECONDS = float(os.getenv("CIRCUIT_TRIAL_TIMEOUT_SECONDS", "120"))
+        self.LLM_LATENCY_EWMA_ALPHA = float(os.getenv("LLM_LATENCY_EWMA_ALPHA", "0.2"))
+        self.OPENROUTER_RPM_LIMIT = int(os.getenv("OPENROUTER_RPM_LIMIT", "0"))  # 0 = no client-side limit
+        self.GEMINI_RPM_LIMIT = int(os.getenv("GEMINI_RPM_LIMIT", "0"))
+
+        # Hedged requests: "off", "voice" (voice turns only) or "all". The backup provider is
+        # called once the primary exceeds its LLM_HEDGE_PERCENTILE time-to-first-byte.
+        self.LLM_HEDGING = os.getenv("LLM_HEDGING", "off").lower()
+        self.LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.3"))
+        self.LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "2.0"))
+
+        # LLM response cache for repeated prompts (opt-in)
+        self.LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+        self.LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+        self.LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+        self.LLM_CACHE_PERSIST = os.getenv("LLM_CACHE_PERSIST", "false").lower() == "true"
+
+        # Semantic near-duplicate cache (needs the optional sentence-transformers package)
+        self.SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+        self.SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+        self.SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+        self.SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+        self.SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
         
         # Database Configuration
         self.DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./agent_database.db")
+        self.SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+        self.SQLITE_CACHE_SIZE_MB = int(os.getenv("SQLITE_CACHE_SIZE_MB", "64"))
+        self.SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+        # "async" = write-behind batches (default), "sync" = commit before responding
+        self.DB_DURABILITY = os.getenv("DB_DURABILITY", "async").lower()
+        self.DB_FLUSH_INTERVAL_MS = int(os.getenv("DB_FLUSH_INTERVAL_MS", "200"))
+        self.DB_FLUSH_BATCH_SIZE = int(os.getenv("DB_FLUSH_BATCH_SIZE", "100"))
+        self.DB_WRITE_QUEUE_MAX = int(os.getenv("DB_WRITE_QUEUE_MAX", "10000"))
+        # Failed batches are retried with backoff, then spilled to a file replayed on the next flush
+        self.DB_FLUSH_RETRIES = int(os.getenv("DB_FLUSH_RETRIES", "4"))
+        self.DB_SPILL_PATH = os.getenv("DB_SPILL_PATH", "db_write_spill.jsonl")
+
+        # History retention (days to keep per table, 0 = keep forever)
+        self.RETENTION_CONVERSATION_DAYS = int(os.getenv("RETENTION_CONVERSATION_DAYS", "0"))
+        self.RETENTION_WHATSAPP_DAYS = int(os.getenv("RETENTION_WHATSAPP_DAYS", "0"))
+        self.RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "6"))
+        self.PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "500"))
+        self.SQLITE_INCREMENTAL_VACUUM = os.getenv("SQLITE_INCREMENTAL_VACUUM", "false").lower() == "true"
+
+        # Conversation context sent to the LLM (0 turns = stateless)
+        self.CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", "6"))
+        self.CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+        self.CONTEXT_CACHE_SESSIONS = int(os.getenv("CONTEXT_CACHE_SESSIONS", "1000"))
         
         # System Configuration
         self.MAX_AUDIO_SIZE_MB = int(os.getenv("MAX_AUDIO_SIZE_MB", "25"))
@@ -148,6 +223,34 @@ class Config:
         self.PRODUCTION_MODE = os.getenv("PRODUCTION_MODE", "true").lower() == "true"
         self.ENABLE_FILE_MONITORING = os.getenv("ENABLE_FILE_MONITORING", "false").lower() == "true"
 
+        # TTS Configuration
+        self.TTS_DEFAULT_MODEL = os.getenv("TTS_DEFAULT_MODEL", "tts_models/multilingual/multi-dataset/xtts_v2")
+        self.TTS_DEFAULT_DEVICE = os.getenv("TTS_DEFAULT_DEVICE", "cpu")
+        self.TTS_PREWARM_DEFAULT_MODEL = os.getenv("TTS_PREWARM_DEFAULT_MODEL", "true").lower() == "true"
+        self.TTS_MODEL_CACHE_SIZE = int(os.getenv("TTS_MODEL_CACHE_SIZE", "2"))
+        self.TTS_MODEL_MEMORY_BUDGET_MB = int(os.getenv("TTS_MODEL_MEMORY_BUDGET_MB", "4096"))
+        self.TTS_WORKERS = int(os.getenv("TTS_WORKERS", "0"))  # 0 = one worker per physical core
+        self.TTS_TORCH_THREADS = int(os.getenv("TTS_TORCH_THREADS", "0"))  # 0 = cores / concurrent models
+        self.TTS_MAX_QUEUE = int(os.getenv("TTS_MAX_QUEUE", "8"))
+        self.TTS_REQUEST_TIMEOUT = float(os.getenv("TTS_REQUEST_TIMEOUT", "120"))
+        self.TTS_STREAM_TIMEOUT = float(os.getenv("TTS_STREAM_TIMEOUT", "900"))  # whole streamed synthesis
+        self.TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+        self.TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", "512"))
+        self.TTS_CACHE_MAX_ENTRIES = int(os.getenv("TTS_CACHE_MAX_ENTRIES", "5000"))
+        self.TTS_LATENT_CACHE_SIZE = int(os.getenv("TTS_LATENT_CACHE_SIZE", "32"))  # voices kept in memory
+        self.TTS_SEGMENT_MAX_CHARS = int(os.getenv("TTS_SEGMENT_MAX_CHARS", "200"))  # 0 = synthesize in one call
+        self.TTS_CROSSFADE_MS = int(os.getenv("TTS_CROSSFADE_MS", "40"))
+        self.TTS_REFERENCE_SAMPLE_RATE = int(os.getenv("TTS_REFERENCE_SAMPLE_RATE", "22050"))
+        self.TTS_REFERENCE_MAX_SECONDS = int(os.getenv("TTS_REFERENCE_MAX_SECONDS", "30"))
+        self.TTS_REFERENCE_TTL_HOURS = float(os.getenv("TTS_REFERENCE_TTL_HOURS", "24"))  # unused uploads
+        self.TTS_REFERENCE_GC_INTERVAL_HOURS = float(os.getenv("TTS_REFERENCE_GC_INTERVAL_HOURS", "1"))
+
+        # STT Configuration
+        self.STT_WORKERS = int(os.getenv("STT_WORKERS", "2"))
+        self.STT_CPU_THREADS = int(os.getenv("STT_CPU_THREADS", "0"))  # 0 = split physical cores across workers
+        self.STT_MAX_QUEUE = int(os.getenv("STT_MAX_QUEUE", "16"))
+        self.STT_REQUEST_TIMEOUT = float(os.getenv("STT_REQUEST_TIMEOUT", "300"))
+
 # Global configuration
 config = Config()
 
@@ -204,6 +307,628 @@ active_connections: List[WebSocket] = []
 recent_errors = []
 rate_limit_tracker = {}  # Track API call timestamps for rate limiting
 
+def physical_cpu_count() -> int:
+    """Number of physical CPU cores (falls back to logical count)"""
+    try:
+        import psutil
+        cores = psutil.cpu_count(logical=False)
+        if cores:
+            return cores
+    except ImportError:
+        pass
+    return os.cpu_count() or 1
+
+# Bounded worker pools for blocking inference
+class WorkerPoolSaturated(Exception):
+    """Raised when a worker pool has no free worker and its queue is full"""
+    pass
+
+class WorkerPool:
+    """Thread pool that runs blocking work off the event loop with a bounded queue"""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, timeout: float):
+        self.name = name
+        self.max_workers = max(max_workers, 1)
+        self.max_queue = max(max_queue, 0)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._pending = 0  # queued + running jobs
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def run(self, func, *args, timeout: float = None, **kwargs):
+        """Run func in the pool and return its result"""
+        result, _ = await self.run_timed(func, *args, timeout=timeout, **kwargs)
+        return result
+
+    async def run_timed(self, func, *args, timeout: float = None, **kwargs):
+        """Run func in the pool and return (result, timings) with queue wait and run time"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise WorkerPoolSaturated(
+                    f"{self.name} queue full ({self._pending} jobs in flight, max {self.max_workers + self.max_queue})"
+                )
+            self._pending += 1
+
+        submitted_at = time.perf_counter()
+        timings = {"queue_wait_time": 0.0, "inference_time": 0.0}
+        state = {"abandoned": False}
+
+        def job():
+            with self._lock:
+                if state["abandoned"]:
+                    # Caller already timed out while this job was queued - don't waste a worker on it
+                    self._pending -= 1
+                    return None
+                self._running += 1
+            started_at = time.perf_counter()
+            timings["queue_wait_time"] = started_at - submitted_at
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings["inference_time"] = time.perf_counter() - started_at
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+                    self.completed += 1
+
+        future = asyncio.wrap_future(self._executor.submit(job))
+        try:
+            # Shield so a timeout doesn't cancel the executor future before job() can release its slot
+            result = await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                state["abandoned"] = True
+                self.timed_out += 1
+            raise
+        return result, timings
+
+    def status(self):
+        """Current pool utilisation"""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out
+            }
+
+    def shutdown(self):
+        """Stop accepting work and release worker threads"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+def encode_wav(samples, sample_rate: int) -> bytes:
+    """Encode float samples in [-1, 1] as 16-bit mono WAV bytes"""
+    import wave
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm16(samples))
+    return buffer.getvalue()
+
+def pcm16(samples) -> bytes:
+    """Float samples in [-1, 1] as raw 16-bit little-endian PCM"""
+    audio = np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0)
+    return (audio * 32767).astype("<i2").tobytes()
+
+def wav_stream_header(sample_rate: int) -> bytes:
+    """16-bit mono WAV header for a stream of unknown length (sizes set to the maximum)"""
+    import struct
+    return b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVEfmt " + struct.pack(
+        "<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16
+    ) + b"data" + struct.pack("<I", 0xFFFFFFFF)
+
+def remove_file(path: str):
+    """Delete a file if it exists (cleanup of work files after failures)"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"⚠️ Could not delete {os.path.basename(path)}: {e}")
+
+def decode_wav(data: bytes):
+    """Decode WAV bytes into (mono float32 samples, sample rate)"""
+    samples, sample_rate = sf.read(io.BytesIO(data), dtype="float32")
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    return samples, sample_rate
+
+def crossfade_concat(parts: List[np.ndarray], overlap: int) -> np.ndarray:
+    """Join audio segments, blending each boundary with an equal-power crossfade of `overlap` samples"""
+    pieces = []
+    tail = np.asarray(parts[0], dtype=np.float32)
+    for part in parts[1:]:
+        part = np.asarray(part, dtype=np.float32)
+        n = min(overlap, len(tail), len(part))
+        if n > 0:
+            fade = np.linspace(0.0, np.pi / 2, n, dtype=np.float32)
+            pieces.append(tail[:-n])
+            pieces.append(tail[-n:] * np.cos(fade) + part[:n] * np.sin(fade))
+            tail = part[n:]
+        else:
+            pieces.append(tail)
+            tail = part
+    pieces.append(tail)
+    return np.concatenate(pieces)
+
+class ResponseCache:
+    """TTL + LRU cache of LLM answers for repeated prompts, optionally persisted to SQLite"""
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (response, expires_at)
+        self._lock = threading.Lock()
+        self.db = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, provider: str, model: str, system_prompt: str, message: str,
+            max_tokens: int, history: List[dict] = None) -> Optional[str]:
+        """Cache key for a prompt, or None when the request shouldn't be cached"""
+        if not config.LLM_CACHE_ENABLED or provider not in ("openrouter", "gemini"):
+            return None
+        default_models = {"openrouter": config.OPENROUTER_DEFAULT_MODEL, "gemini": config.GEMINI_DEFAULT_MODEL}
+        normalized = " ".join(message.split()).casefold()
+        # Earlier turns change the answer, so they are part of the key too
+        parts = [provider, model or default_models[provider], system_prompt or "", normalized, max_tokens, history or []]
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Optional[str], response: str, provider: str = None, model: str = None):
+        if key is None or not response:
+            return
+        expires_at = time.time() + config.LLM_CACHE_TTL_SECONDS
+        self._store(key, response, expires_at)
+        if self.db is not None:
+            # Persist off the event loop; losing a cache row is harmless
+            asyncio.get_running_loop().run_in_executor(
+                None, self.db.save_cached_response, key, provider, model, response, expires_at
+            )
+
+    def _store(self, key: str, response: str, expires_at: float):
+        with self._lock:
+            self._entries[key] = (response, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > config.LLM_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def attach(self, db: "DatabaseService"):
+        """Persist new entries to SQLite and restore the unexpired ones (blocking)"""
+        self.db = db
+        rows = db.load_cached_responses(config.LLM_CACHE_MAX_ENTRIES)
+        for key, response, expires_at in rows:
+            self._store(key, response, expires_at)
+        logger.info(f"⚡ LLM response cache restored {len(rows)} entries")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def status(self):
+        total = self.hits + self.misses
+        return {
+            "enabled": config.LLM_CACHE_ENABLED,
+            "persistent": self.db is not None,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0
+        }
+
+class SemanticCache:
+    """Near-duplicate answer cache: local sentence embeddings + brute-force cosine search in NumPy"""
+
+    def __init__(self):
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.available = True  # False once the embedding model failed to load
+        self._vectors: Optional[np.ndarray] = None  # (capacity, dim) unit vectors
+        self._scopes = np.zeros(0, dtype=np.int64)
+        self._expires = np.zeros(0)
+        self._last_used = np.zeros(0)
+        self._responses: List[Optional[str]] = []
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return config.SEMANTIC_CACHE_ENABLED and self.available
+
+    def load(self):
+        """Load the embedding model (blocking); disables the cache if it can't be loaded"""
+        with self._model_lock:
+            if self._model is not None or not self.available:
+                return self._model
+            try:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(config.SEMANTIC_CACHE_MODEL, device="cpu")
+                logger.info(f"✅ Semantic cache embedding model loaded: {config.SEMANTIC_CACHE_MODEL}")
+            except ImportError:
+                self.available = False
+                logger.warning("⚠️ sentence-transformers not installed, semantic cache disabled")
+            except Exception as e:
+                self.available = False
+                logger.error(f"❌ Failed to load semantic cache model '{config.SEMANTIC_CACHE_MODEL}': {e}")
+            return self._model
+
+    def scope(self, provider: str, model: str, system_prompt: str, max_tokens: int) -> int:
+        """Answers are only shared between requests with the same provider, model, prompt and limit"""
+        digest = hashlib.sha256(json.dumps([provider, model, system_prompt or "", max_tokens]).encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "little", signed=True)
+
+    async def embed(self, message: str) -> Optional[np.ndarray]:
+        """Unit-length embedding of a message (None if the model is unavailable)"""
+        if not self.enabled:
+            return None
+        try:
+            return await asyncio.to_thread(self._embed_sync, message)
+        except Exception as e:
+            logger.error(f"Semantic cache embedding error: {e}")
+            return None
+
+    def _embed_sync(self, message: str) -> Optional[np.ndarray]:
+        model = self._model or self.load()
+        if model is None:
+            return None
+        vector = model.encode(" ".join(message.split()), normalize_embeddings=True)
+        return np.asarray(vector, dtype=np.float32)
+
+    def lookup(self, embedding: Optional[np.ndarray], scope: int) -> Optional[str]:
+        """Cached answer for the most similar live message in scope, if above the threshold"""
+        if embedding is None:
+            return None
+        with self._lock:
+            if self._size:
+                now = time.time()
+                similarities = self._vectors[:self._size] @ embedding
+                live = (self._scopes[:self._size] == scope) & (self._expires[:self._size] > now)
+                similarities = np.where(live, similarities, -1.0)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= config.SEMANTIC_CACHE_THRESHOLD:
+                    self._last_used[best] = now
+                    self.hits += 1
+                    logger.info(f"⚡ Semantic cache hit (similarity {similarities[best]:.3f})")
+                    return self._responses[best]
+            self.misses += 1
+            return None
+
+    def add(self, embedding: Optional[np.ndarray], scope: int, response: str):
+        """Remember an answer, replacing the least recently used entry when full"""
+        if embedding is None or not response:
+            return
+        with self._lock:
+            capacity = config.SEMANTIC_CACHE_MAX_ENTRIES
+            if self._vectors is None:
+                self._vectors = np.zeros((capacity, embedding.shape[0]), dtype=np.float32)
+                self._scopes = np.zeros(capacity, dtype=np.int64)
+                self._expires = np.zeros(capacity)
+                self._last_used = np.zeros(capacity)
+                self._responses = [None] * capacity
+            if self._size < capacity:
+                index = self._size
+                self._size += 1
+            else:
+                index = int(np.argmin(self._last_used))
+            now = time.time()
+            self._vectors[index] = embedding
+            self._scopes[index] = scope
+            self._expires[index] = now + config.SEMANTIC_CACHE_TTL_SECONDS
+            self._last_used[index] = now
+            self._responses[index] = response
+
+    def status(self):
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "model": config.SEMANTIC_CACHE_MODEL,
+            "model_loaded": self._model is not None,
+            "threshold": config.SEMANTIC_CACHE_THRESHOLD,
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0
+        }
+
+class SentenceChunker:
+    """Accumulates streamed LLM text and emits complete sentences for incremental TTS"""
+
+    SENTENCE_END = re.compile(r'([.!?…]+["\')\]]*)(\s+)|(\n+)')
+    CLAUSE_END = re.compile(r'[,;:]["\')\]]*\s+|\s+[—–]\s+')
+    # Portuguese abbreviations whose period doesn't end the sentence ("Sr. Silva", "Av. Paulista", "nº. 12")
+    ABBREVIATIONS = {
+        "sr", "sra", "srta", "dr", "dra", "prof", "profa", "eng", "exmo", "exma", "av", "nº", "pág", "pg",
+        "p", "ex", "obs", "tel", "art", "cap", "vol", "ltda", "cia", "etc"
+    }
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    @classmethod
+    def _is_abbreviation(cls, text: str, match) -> bool:
+        """Whether a sentence-end match is just the period of an abbreviation or an initial ("J. Silva")"""
+        if match.group(1) != ".":
+            return False
+        word = re.search(r'(\w+)$', text[max(match.start() - 12, 0):match.start()])
+        if not word:
+            return False
+        word = word.group(1)
+        if word.lower() == "etc":
+            # "etc." ends the sentence unless the text carries on in lower case
+            return text[match.end():match.end() + 1].islower()
+        return word.lower() in cls.ABBREVIATIONS or (len(word) == 1 and word.isupper())
+
+    def feed(self, delta: str) -> List[str]:
+        """Add a text delta and return any sentences it completed"""
+        self.buffer += delta
+        sentences = []
+        search_from = 0
+        while True:
+            match = self.SENTENCE_END.search(self.buffer, search_from)
+            if not match:
+                break
+            candidate = self.buffer[:match.end()].strip()
+            # Merge very short fragments ("Sim." / "Olá!") into the next sentence
+            if len(candidate) < self.min_chars or self._is_abbreviation(self.buffer, match):
+                search_from = match.end()
+                continue
+            sentences.append(candidate)
+            self.buffer = self.buffer[match.end():]
+            search_from = 0
+        return sentences
+
+    def flush(self) -> List[str]:
+        """Return whatever text remains once the stream has ended"""
+        remainder = self.buffer.strip()
+        self.buffer = ""
+        return [remainder] if remainder else []
+
+    @classmethod
+    def split(cls, text: str, max_chars: int) -> List[str]:
+        """Split a complete text into segments of at most max_chars for chunked synthesis
+
+        Whole sentences are packed together; a sentence longer than max_chars is broken at clause
+        boundaries (commas, semicolons, dashes), then at word boundaries.
+        """
+        chunker = cls(min_chars=1)
+        pieces = []
+        for sentence in chunker.feed(text) + chunker.flush():
+            pieces.extend(cls._split_clauses(sentence, max_chars))
+
+        segments = []
+        for piece in pieces:
+            if segments and len(segments[-1]) + 1 + len(piece) <= max_chars:
+                segments[-1] += " " + piece
+            else:
+                segments.append(piece)
+        return segments
+
+    @classmethod
+    def _split_clauses(cls, sentence: str, max_chars: int) -> List[str]:
+        parts = []
+        while len(sentence) > max_chars:
+            window = sentence[:max_chars + 1]
+            breaks = [m.end() for m in cls.CLAUSE_END.finditer(window) if m.end() > max_chars // 3]
+            cut = breaks[-1] if breaks else window.rfind(" ")
+            if cut <= 0:
+                cut = max_chars
+            parts.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            parts.append(sentence)
+        return parts
+
+class LLMProviderError(Exception):
+    """Provider call failed; carries the HTTP status and any Retry-After hint for the circuit breaker"""
+
+    def __init__(self, message: str, status_code: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta or HTTP date) or a Gemini RetryInfo body"""
+    value = response.headers.get("retry-after")
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                from email.utils import parsedate_to_datetime
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+            except Exception:
+                pass
+    try:
+        for detail in response.json().get("error", {}).get("details", []):
+            delay = detail.get("retryDelay")
+            if delay and delay.endswith("s"):
+                return float(delay[:-1])
+    except Exception:
+        pass
+    return None
+
+class ProviderHealth:
+    """Per-provider circuit breakers, EWMA latency and call-rate tracking used to route LLM requests"""
+
+    REMOTE_PROVIDERS = ("openrouter", "gemini")
+
+    def __init__(self):
+        self._state: Dict[str, Dict[str, Any]] = {
+            provider: {
+                "state": "closed",
+                "consecutive_failures": 0,
+                "open_until": 0.0,
+                "trial_started": None,  # time the half-open probe request was sent
+                "ewma_latency": None,
+                "latencies": deque(maxlen=200),
+                "successes": 0,
+                "failures": 0,
+                "client_errors": 0,
+                "last_error": None
+            }
+            for provider in self.REMOTE_PROVIDERS
+        }
+        for provider in self.REMOTE_PROVIDERS:
+            rate_limit_tracker.setdefault(provider, deque())
+
+    def _rpm_limit(self, provider: str) -> int:
+        return {"openrouter": config.OPENROUTER_RPM_LIMIT, "gemini": config.GEMINI_RPM_LIMIT}[provider]
+
+    def _calls_last_minute(self, provider: str) -> int:
+        calls = rate_limit_tracker[provider]
+        cutoff = time.time() - 60
+        while calls and calls[0] < cutoff:
+            calls.popleft()
+        return len(calls)
+
+    def available(self, provider: str) -> bool:
+        """Whether a request may be sent to the provider right now"""
+        health = self._state.get(provider)
+        if health is None:
+            return True
+        limit = self._rpm_limit(provider)
+        if limit and self._calls_last_minute(provider) >= limit:
+            return False
+        if health["state"] == "open":
+            if time.time() < health["open_until"]:
+                return False
+            health["state"] = "half_open"
+        if health["state"] == "half_open":
+            # Let a single trial request through to probe recovery (a lost trial expires)
+            trial_started = health["trial_started"]
+            return trial_started is None or time.time() - trial_started > config.CIRCUIT_TRIAL_TIMEOUT_SECONDS
+        return True
+
+    def route(self, provider: str) -> List[str]:
+        """Providers to try in order: the requested one if healthy, then the others by latency"""
+        if provider not in self._state:
+            return [provider]
+        others = [p for p in self.REMOTE_PROVIDERS if p != provider]
+        if config.LLM_ROUTING == "latency":
+            candidates = sorted(self.REMOTE_PROVIDERS, key=self._latency_rank)
+        else:
+            candidates = [provider] + sorted(others, key=self._latency_rank)
+        return [p for p in candidates if self.available(p)]
+
+    def _latency_rank(self, provider: str) -> float:
+        # Providers without samples yet rank after measured ones
+        latency = self._state[provider]["ewma_latency"]
+        return latency if latency is not None else float("inf")
+
+    def record_call(self, provider: str):
+        health = self._state.get(provider)
+        if health is None:
+            return
+        rate_limit_tracker[provider].append(time.time())
+        if health["state"] == "half_open":
+            health["trial_started"] = time.time()
+
+    def record_success(self, provider: str, latency: float):
+        """Close the circuit and fold the time-to-first-byte into the latency EWMA"""
+        health = self._state.get(provider)
+        if health is None:
+            return
+        alpha = config.LLM_LATENCY_EWMA_ALPHA
+        health["ewma_latency"] = latency if health["ewma_latency"] is None else (
+            alpha * latency + (1 - alpha) * health["ewma_latency"])
+        health["latencies"].append(latency)
+        health["successes"] += 1
+        health["consecutive_failures"] = 0
+        health["trial_started"] = None
+        if health["state"] != "closed":
+            logger.info(f"✅ {provider} circuit closed")
+        health["state"] = "closed"
+
+    def record_failure(self, provider: str, error: Exception):
+        """Count a failure; open the circuit on a rate limit or too many consecutive errors"""
+        health = self._state.get(provider)
+        if health is None:
+            return
+        status_code = getattr(error, "status_code", None)
+        retry_after = getattr(error, "retry_after", None)
+        health["trial_started"] = None
+        health["last_error"] = str(error)[:200]
+        if status_code is not None and 400 <= status_code < 500 and status_code not in (408, 429):
+            # The request itself was rejected (bad model name, prompt, key) - says nothing about the
+            # provider's health, and one user's bad request mustn't open the circuit for everyone
+            health["client_errors"] += 1
+            return
+        health["failures"] += 1
+        health["consecutive_failures"] += 1
+
+        if status_code == 429 or health["state"] == "half_open" or \
+                health["consecutive_failures"] >= config.CIRCUIT_FAILURE_THRESHOLD:
+            cooldown = retry_after if retry_after is not None else config.CIRCUIT_COOLDOWN_SECONDS
+            health["state"] = "open"
+            health["open_until"] = time.time() + cooldown
+            logger.warning(f"🚫 {provider} circuit open for {cooldown:.0f}s ({health['last_error']})")
+
+    def record_cancelled(self, provider: str):
+        """A request abandoned by hedging or a client disconnect is neither a success nor a failure"""
+        health = self._state.get(provider)
+        if health is not None:
+            health["trial_started"] = None
+
+    def hedge_delay(self, provider: str) -> float:
+        """How long to wait for the primary before firing a hedge request"""
+        health = self._state.get(provider)
+        if not health or len(health["latencies"]) < 10:
+            return config.LLM_HEDGE_DEFAULT_DELAY
+        return max(self.latency_percentile(provider, config.LLM_HEDGE_PERCENTILE), config.LLM_HEDGE_MIN_DELAY)
+
+    def latency_percentile(self, provider: str, percentile: float) -> Optional[float]:
+        """Recent time-to-first-byte percentile for a provider (None without samples)"""
+        health = self._state.get(provider)
+        if not health or not health["latencies"]:
+            return None
+        return float(np.percentile(list(health["latencies"]), percentile))
+
+    def status(self):
+        now = time.time()
+        return {
+            provider: {
+                "state": "open" if health["state"] == "open" and now < health["open_until"] else health["state"],
+                "retry_in": round(max(health["open_until"] - now, 0), 1) if health["state"] == "open" else 0,
+                "consecutive_failures": health["consecutive_failures"],
+                "ewma_latency": round(health["ewma_latency"], 3) if health["ewma_latency"] is not None else None,
+                "p95_latency": round(self.latency_percentile(provider, 95), 3) if health["latencies"] else None,
+                "successes": health["successes"],
+                "failures": health["failures"],
+                "client_errors": health["client_errors"],
+                "calls_last_minute": self._calls_last_minute(provider),
+                "rpm_limit": self._rpm_limit(provider) or None,
+                "last_error": health["last_error"]
+            }
+            for provider, health in self._state.items()
+        }
+
 # LLM Service Integration
 class LLMService:
     def __init__(self):
@@ -212,11 +937,107 @@ class LLMService:
             "gemini": self._call_gemini,
             "local": self._call_local
         }
+        self.stream_providers = {
+            "openrouter": self._stream_openrouter,
+            "gemini": self._stream_gemini,
+            "local": self._stream_local
+        }
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.response_cache = ResponseCache()
+        self.semantic_cache = SemanticCache()
+        self.health = ProviderHealth()
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+
+    def _create_client(self, provider: str) -> httpx.AsyncClient:
+        """Create a pooled keep-alive HTTP client for a remote provider"""
+        base_urls = {
+            "openrouter": config.OPENROUTER_BASE_URL,
+            "gemini": config.GEMINI_BASE_URL
+        }
+        max_connections = {
+            "openrouter": config.OPENROUTER_MAX_CONNECTIONS,
+            "gemini": config.GEMINI_MAX_CONNECTIONS
+        }
+
+        # HTTP/2 needs the optional h2 package
+        http2 = config.LLM_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                http2 = False
+
+        return httpx.AsyncClient(
+            base_url=base_urls[provider],
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections[provider],
+                max_keepalive_connections=config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(config.LLM_HTTP_TIMEOUT, connect=10.0)
+        )
+
+    def _get_client(self, provider: str) -> httpx.AsyncClient:
+        """Shared client for a provider (created on first use if startup hasn't run)"""
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._create_client(provider)
+            self._clients[provider] = client
+        return client
+
+    async def startup(self):
+        """Open the provider HTTP clients"""
+        for provider in ("openrouter", "gemini"):
+            self._get_client(provider)
+        logger.info(f"🌐 LLM HTTP clients ready: {', '.join(self._clients)}")
+
+    async def shutdown(self):
+        """Close the provider HTTP clients and their pooled connections"""
+        for provider, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"⚠️ Error closing {provider} HTTP client: {e}")
+        self._clients.clear()
+
+    async def _lookup_cache(self, provider: str, model: str, system_prompt: str, message: str,
+                            max_tokens: int, history: List[dict] = None):
+        """Check the exact and semantic caches.
+
+        Returns (cached answer or None, remember) where remember(response) stores a fresh answer.
+        """
+        key = self.response_cache.key(provider, model, system_prompt, message, max_tokens, history)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            logger.info(f"⚡ LLM response cache hit ({provider})")
+            return cached, lambda response: None
+
+        embedding = None
+        scope = None
+        # Semantic matches only make sense for context-free questions (FAQ-style first turns)
+        if not history and self.semantic_cache.enabled and provider != "local":
+            scope = self.semantic_cache.scope(provider, model, system_prompt, max_tokens)
+            embedding = await self.semantic_cache.embed(message)
+            cached = self.semantic_cache.lookup(embedding, scope)
+            if cached is not None:
+                self.response_cache.set(key, cached, provider, model)
+                return cached, lambda response: None
+
+        def remember(response: str):
+            self.response_cache.set(key, response, provider, model)
+            self.semantic_cache.add(embedding, scope, response)
+
+        return None, remember
     
     async def generate_response(self, message: str, provider: str = None, model: str = None,
-                               system_prompt: str = None, max_tokens: int = 500):
-        """Generate AI response using specified provider with fallback"""
+                               system_prompt: str = None, max_tokens: int = 500,
+                               history: List[dict] = None, hedge: bool = None):
+        """Generate AI response using the requested provider with health-aware fallback (history = earlier turns)"""
         try:
+            if hedge is None:
+                hedge = config.LLM_HEDGING == "all"
             provider = provider or config.DEFAULT_LLM_PROVIDER
             logger.info(f"🔄 Generating response with provider: {provider}, message: '{message[:50]}...'")
 
@@ -224,54 +1045,124 @@ class LLMService:
                 logger.warning(f"⚠️ Unsupported LLM provider: {provider}")
                 provider = config.DEFAULT_LLM_PROVIDER
 
-            # Try the requested provider first
-            try:
-                return await self.providers[provider](message, model, system_prompt, max_tokens)
-            except Exception as first_attempt_error:
-                logger.warning(f"⚠️ First attempt with {provider} failed: {str(first_attempt_error)}")
+            cached, remember = await self._lookup_cache(provider, model, system_prompt, message, max_tokens, history)
+            if cached is not None:
+                return cached
 
-                # If first attempt failed, try Gemini as fallback (more reliable)
-                if provider != "gemini":
-                    logger.info("🔄 Trying fallback to Gemini...")
-                    try:
-                        return await self.providers["gemini"](message, model, system_prompt, max_tokens)
-                    except Exception as gemini_error:
-                        logger.error(f"❌ Gemini fallback also failed: {str(gemini_error)}")
-                        raise Exception(f"Primary provider and Gemini fallback both failed") from gemini_error
-                else:
-                    raise first_attempt_error  # Gemini was the original choice, re-raise the error
+            # Requested provider first while its circuit is closed, then the healthiest alternative
+            candidates = self.health.route(provider)
+            if not candidates:
+                raise Exception("All LLM providers are temporarily unavailable (circuit open or rate limited)")
+
+            last_error = None
+            if hedge and len(candidates) > 1:
+                try:
+                    answered_by, response = await self._hedged_call(
+                        candidates[0], candidates[1], provider, message, model, system_prompt, max_tokens, history
+                    )
+                    if answered_by == provider:
+                        remember(response)
+                    return response
+                except Exception as e:
+                    last_error = e
+                    candidates = candidates[2:]
+
+            for candidate in candidates:
+                if candidate != provider:
+                    logger.info(f"🔄 Trying fallback to {candidate}...")
+                started = time.time()
+                self.health.record_call(candidate)
+                try:
+                    response = await self.providers[candidate](
+                        message, model if candidate == provider else None, system_prompt, max_tokens, history=history
+                    )
+                except Exception as e:
+                    self.health.record_failure(candidate, e)
+                    logger.warning(f"⚠️ Attempt with {candidate} failed: {str(e)}")
+                    last_error = e
+                    continue
+                except BaseException:
+                    # Cancelled mid-request - release a half-open trial slot
+                    self.health.record_cancelled(candidate)
+                    raise
+                self.health.record_success(candidate, time.time() - started)
+                # Only the requested provider/model's answer is cached under its key
+                if candidate == provider:
+                    remember(response)
+                return response
+
+            if len(candidates) > 1 or hedge:
+                raise Exception(f"Primary provider and fallback both failed") from last_error
+            raise last_error
 
         except Exception as e:
             logger.error(f"❌ LLM Service error: {str(e)}")
             logger.error(f"📄 Error details: {repr(e)}")
             return f"Desculpe, ocorreu um erro no processamento: {str(e)}. Tente novamente."
     
+    def _openrouter_request(self, message: str, model: str = None,
+                            system_prompt: str = None, max_tokens: int = 500,
+                            history: List[dict] = None):
+        """Build OpenRouter chat completion headers and payload"""
+        model = model or config.OPENROUTER_DEFAULT_MODEL
+        system_prompt = system_prompt or "Você é um assistente útil que responde em português brasileiro. Seja conciso e amigável."
+        
+        headers = {
+            "Authorization": f"Bearer {config.OPENROUTER_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        
+        messages = [{"role": "system", "content": system_prompt}]
+        for turn in history or []:
+            messages.append({"role": "user", "content": turn["user"]})
+            messages.append({"role": "assistant", "content": turn["assistant"]})
+        messages.append({"role": "user", "content": message})
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens
+        }
+        return headers, payload
+
+    def _gemini_request(self, message: str, system_prompt: str = None, max_tokens: int = 500,
+                        history: List[dict] = None):
+        """Build Gemini generateContent headers and payload"""
+        system_prompt = system_prompt or "Você é um assistente útil que responde em português brasileiro."
+
+        headers = {
+            "Content-Type": "application/json"
+        }
+
+        # Combine system prompt with user message
+        combined_message = f"{system_prompt}\n\nUsuário: {message}\n\nAssistente:"
+
+        contents = []
+        for turn in history or []:
+            contents.append({"role": "user", "parts": [{"text": turn["user"]}]})
+            contents.append({"role": "model", "parts": [{"text": turn["assistant"]}]})
+        contents.append({"role": "user", "parts": [{"text": combined_message}]})
+
+        payload = {
+            "contents": contents,
+            "generationConfig": {
+                "maxOutputTokens": max_tokens,
+                "temperature": 0.7
+            }
+        }
+        return headers, payload
+
     async def _call_openrouter(self, message: str, model: str = None, 
-                              system_prompt: str = None, max_tokens: int = 500):
+                              system_prompt: str = None, max_tokens: int = 500,
+                              history: List[dict] = None):
         """Call OpenRouter API"""
         try:
-            model = model or config.OPENROUTER_DEFAULT_MODEL
-            system_prompt = system_prompt or "Você é um assistente útil que responde em português brasileiro. Seja conciso e amigável."
+            headers, payload = self._openrouter_request(message, model, system_prompt, max_tokens, history)
             
-            headers = {
-                "Authorization": f"Bearer {config.OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message}
-                ],
-                "max_tokens": max_tokens
-            }
-            
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
+            response = await self._get_client("openrouter").post(
+                "/chat/completions",
                 headers=headers,
-                json=payload,
-                timeout=30
+                json=payload
             )
             
             if response.status_code == 200:
@@ -279,40 +1170,31 @@ class LLMService:
                 return data["choices"][0]["message"]["content"]
             else:
                 logger.error(f"OpenRouter API error: {response.status_code} - {response.text}")
-                raise Exception(f"OpenRouter API error: {response.status_code}")
+                raise LLMProviderError(
+                    f"OpenRouter API error: {response.status_code}",
+                    status_code=response.status_code,
+                    retry_after=parse_retry_after(response)
+                )
                 
         except Exception as e:
             logger.error(f"OpenRouter error: {e}")
             raise
     
     async def _call_gemini(self, message: str, model: str = None,
-                           system_prompt: str = None, max_tokens: int = 500):
+                           system_prompt: str = None, max_tokens: int = 500,
+                           history: List[dict] = None):
         """Call Google Gemini API with better error handling"""
         try:
             model = model or config.GEMINI_DEFAULT_MODEL
-            system_prompt = system_prompt or "Você é um assistente útil que responde em português brasileiro."
-
-            headers = {
-                "Content-Type": "application/json"
-            }
-
-            # Combine system prompt with user message
-            combined_message = f"{system_prompt}\n\nUsuário: {message}\n\nAssistente:"
-
-            payload = {
-                "contents": [{
-                    "parts": [{"text": combined_message}]
-                }],
-                "generationConfig": {
-                    "maxOutputTokens": max_tokens,
-                    "temperature": 0.7
-                }
-            }
-
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={config.GEMINI_API_KEY}"
+            headers, payload = self._gemini_request(message, system_prompt, max_tokens, history)
 
             logger.info(f"🌐 Calling Gemini API: {model}")
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = await self._get_client("gemini").post(
+                f"/models/{model}:generateContent",
+                params={"key": config.GEMINI_API_KEY},
+                headers=headers,
+                json=payload
+            )
 
             if response.status_code == 200:
                 data = response.json()
@@ -323,26 +1205,33 @@ class LLMService:
                 # Rate limit exceeded - provide helpful message with retry suggestions
                 error_msg = "API limit exceeded. wait and try again later."
                 logger.warning(f"🚫 Gemini rate limit: {response.text}")
-                raise Exception(f"429 - {error_msg}")
+                raise LLMProviderError(f"429 - {error_msg}", status_code=429, retry_after=parse_retry_after(response))
 
             elif response.status_code == 403:
                 error_msg = "API key invalid or quota exceeded. Please check your Google Cloud billing."
                 logger.error(f"🚫 Gemini authorization error: {response.text}")
-                raise Exception(f"403 - {error_msg}")
+                raise LLMProviderError(f"403 - {error_msg}", status_code=403)
 
             elif response.status_code == 400:
                 error_msg = f"Bad request to Gemini API: {response.text}"
                 logger.error(f"🚫 Gemini bad request: {error_msg}")
-                raise Exception(f"400 - Bad request")
+                raise LLMProviderError(f"400 - Bad request", status_code=400)
 
             else:
                 logger.error(f"🚫 Gemini API error {response.status_code}: {response.text}")
-                raise Exception(f"Gemini API error: {response.status_code}")
+                raise LLMProviderError(
+                    f"Gemini API error: {response.status_code}",
+                    status_code=response.status_code,
+                    retry_after=parse_retry_after(response)
+                )
 
-        except requests.exceptions.RequestException as e:
+        except httpx.RequestError as e:
             logger.error(f"🌐 Network error calling Gemini: {e}")
             raise Exception("Network connection error - check internet connection")
 
+        except LLMProviderError:
+            raise
+
         except Exception as e:
             logger.error(f"🚫 Gemini error: {e}")
             if "429" in str(e) or "rate limit" in str(e).lower():
@@ -352,8 +1241,307 @@ class LLMService:
             else:
                 raise
     
+    async def stream_response(self, message: str, provider: str = None, model: str = None,
+                              system_prompt: str = None, max_tokens: int = 500,
+                              history: List[dict] = None, hedge: bool = None):
+        """Stream AI response text deltas, falling back to another provider if nothing was streamed yet"""
+        if hedge is None:
+            hedge = config.LLM_HEDGING == "all"
+        provider = provider or config.DEFAULT_LLM_PROVIDER
+        if provider not in self.stream_providers:
+            logger.warning(f"⚠️ Unsupported LLM provider: {provider}")
+            provider = config.DEFAULT_LLM_PROVIDER
+
+        cached, remember = await self._lookup_cache(provider, model, system_prompt, message, max_tokens, history)
+        if cached is not None:
+            yield cached
+            return
+
+        logger.info(f"🔄 Streaming response with provider: {provider}, message: '{message[:50]}...'")
+        candidates = self.health.route(provider)
+        last_error = Exception("All LLM providers are temporarily unavailable (circuit open or rate limited)")
+        if hedge and len(candidates) > 1:
+            try:
+                async for delta in self._hedged_stream(
+                    candidates[0], candidates[1], provider, message, model, system_prompt, max_tokens, history, remember
+                ):
+                    yield delta
+                return
+            except Exception as e:
+                last_error = e
+                candidates = candidates[2:]
+
+        for candidate in candidates:
+            if candidate != provider:
+                logger.info(f"🔄 Trying streaming fallback to {candidate}...")
+            started = time.time()
+            time_to_first_token = None
+            chunks = []
+            self.health.record_call(candidate)
+            try:
+                async for delta in self.stream_providers[candidate](
+                    message, model if candidate == provider else None, system_prompt, max_tokens, history=history
+                ):
+                    if time_to_first_token is None:
+                        time_to_first_token = time.time() - started
+                    chunks.append(delta)
+                    yield delta
+            except Exception as e:
+                self.health.record_failure(candidate, e)
+                if chunks:
+                    # Part of the answer already reached the client - can't transparently switch provider
+                    logger.error(f"❌ Stream from {candidate} interrupted: {e}")
+                    return
+                logger.warning(f"⚠️ Streaming attempt with {candidate} failed: {e}")
+                last_error = e
+                continue
+            except BaseException:
+                # Client went away (GeneratorExit / CancelledError) - release a half-open trial slot
+                self.health.record_cancelled(candidate)
+                raise
+            self.health.record_success(candidate, time_to_first_token if time_to_first_token is not None else time.time() - started)
+            # Only the requested provider/model's answer is cached under its key
+            if candidate == provider:
+                remember("".join(chunks))
+            return
+
+        yield f"Desculpe, ocorreu um erro no processamento: {str(last_error)}. Tente novamente."
+
+    async def _hedged_call(self, primary: str, secondary: str, requested: str, message: str, model: str,
+                           system_prompt: str, max_tokens: int, history: List[dict] = None):
+        """Call primary; if it hasn't answered within the hedge delay, race secondary and keep the first answer.
+
+        Returns (provider that answered, response).
+        """
+        started = {}
+        tasks = {}
+
+        def launch(candidate: str):
+            self.health.record_call(candidate)
+            started[candidate] = time.time()
+            task = asyncio.ensure_future(self.providers[candidate](
+                message, model if candidate == requested else None, system_prompt, max_tokens, history=history
+            ))
+            tasks[task] = candidate
+
+        launch(primary)
+        delay = self.health.hedge_delay(primary)
+        last_error = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                logger.info(f"🏁 {primary} slower than {delay:.2f}s, hedging with {secondary}")
+                self.hedges_fired += 1
+                launch(secondary)
+            elif next(iter(done)).exception() is not None:
+                # Primary failed fast - fall back right away instead of giving up on the secondary
+                logger.info(f"🔄 {primary} failed within the hedge delay, falling back to {secondary}")
+                launch(secondary)
+
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    candidate = tasks.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        self.health.record_failure(candidate, e)
+                        logger.warning(f"⚠️ Attempt with {candidate} failed: {str(e)}")
+                        last_error = e
+                        continue
+                    self.health.record_success(candidate, time.time() - started[candidate])
+                    if candidate != primary:
+                        self.hedge_wins += 1
+                    return candidate, response
+        finally:
+            # Also runs if the caller is cancelled while we are still racing
+            await self._cancel_losers(tasks)
+        raise last_error
+
+    async def _cancel_losers(self, tasks: Dict[asyncio.Future, str], streams: Dict[str, Any] = None):
+        """Cancel the requests that lost a hedge race and close their streams"""
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for candidate in tasks.values():
+            self.health.record_cancelled(candidate)
+            if streams and candidate in streams:
+                try:
+                    await streams[candidate].aclose()
+                except Exception:
+                    pass
+
+    async def _hedged_stream(self, primary: str, secondary: str, requested: str, message: str, model: str,
+                             system_prompt: str, max_tokens: int, history: List[dict], remember):
+        """Stream from primary; if its first token is later than the hedge delay, race secondary and
+        continue with whichever stream produces a token first"""
+        started = {}
+        streams = {}
+        tasks = {}
+
+        def launch(candidate: str):
+            self.health.record_call(candidate)
+            started[candidate] = time.time()
+            streams[candidate] = self.stream_providers[candidate](
+                message, model if candidate == requested else None, system_prompt, max_tokens, history=history
+            )
+            tasks[asyncio.ensure_future(streams[candidate].__anext__())] = candidate
+
+        launch(primary)
+        delay = self.health.hedge_delay(primary)
+        winner = None
+        first_delta = None
+        last_error = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                logger.info(f"🏁 {primary} first token slower than {delay:.2f}s, hedging with {secondary}")
+                self.hedges_fired += 1
+                launch(secondary)
+            else:
+                error = next(iter(done)).exception()
+                if error is not None and not isinstance(error, StopAsyncIteration):
+                    # Primary failed fast - fall back right away instead of giving up on the secondary
+                    logger.info(f"🔄 {primary} failed within the hedge delay, falling back to {secondary}")
+                    launch(secondary)
+
+            while tasks and winner is None:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    candidate = tasks.pop(task)
+                    if winner is not None:
+                        # Finished in the same instant as the winner - treat as a loser
+                        tasks[task] = candidate
+                        continue
+                    try:
+                        first_delta = task.result()
+                        winner = candidate
+                    except StopAsyncIteration:
+                        winner = candidate  # empty answer, still an answer
+                    except Exception as e:
+                        self.health.record_failure(candidate, e)
+                        logger.warning(f"⚠️ Streaming attempt with {candidate} failed: {e}")
+                        last_error = e
+        finally:
+            # Also runs if the client disconnects while we are still racing
+            await self._cancel_losers(tasks, streams)
+
+        if winner is None:
+            raise last_error
+        if winner != primary:
+            self.hedge_wins += 1
+
+        time_to_first_token = time.time() - started[winner]
+        chunks = []
+        stream = streams[winner]
+        try:
+            if first_delta is not None:
+                chunks.append(first_delta)
+                yield first_delta
+                async for delta in stream:
+                    chunks.append(delta)
+                    yield delta
+        except Exception as e:
+            self.health.record_failure(winner, e)
+            # Part of the answer already reached the client - can't transparently switch provider
+            logger.error(f"❌ Stream from {winner} interrupted: {e}")
+            return
+        except BaseException:
+            self.health.record_cancelled(winner)
+            raise
+        finally:
+            await stream.aclose()
+        self.health.record_success(winner, time_to_first_token)
+        if winner == requested:
+            remember("".join(chunks))
+
+    def hedging_status(self):
+        return {
+            "mode": config.LLM_HEDGING,
+            "percentile": config.LLM_HEDGE_PERCENTILE,
+            "hedges_fired": self.hedges_fired,
+            "secondary_wins": self.hedge_wins
+        }
+
+    async def _stream_openrouter(self, message: str, model: str = None,
+                                 system_prompt: str = None, max_tokens: int = 500,
+                                 history: List[dict] = None):
+        """Stream an OpenRouter completion via server-sent events"""
+        headers, payload = self._openrouter_request(message, model, system_prompt, max_tokens, history)
+        payload["stream"] = True
+
+        async with self._get_client("openrouter").stream(
+            "POST", "/chat/completions", headers=headers, json=payload
+        ) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                logger.error(f"OpenRouter API error: {response.status_code} - {body[:500]!r}")
+                raise LLMProviderError(
+                    f"OpenRouter API error: {response.status_code}",
+                    status_code=response.status_code,
+                    retry_after=parse_retry_after(response)
+                )
+
+            async for line in response.aiter_lines():
+                # Skip keep-alive comments (": OPENROUTER PROCESSING") and blank separators
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                choices = chunk.get("choices") or []
+                delta = choices[0].get("delta", {}).get("content") if choices else None
+                if delta:
+                    yield delta
+
+    async def _stream_gemini(self, message: str, model: str = None,
+                             system_prompt: str = None, max_tokens: int = 500,
+                             history: List[dict] = None):
+        """Stream a Gemini completion via streamGenerateContent (SSE)"""
+        model = model or config.GEMINI_DEFAULT_MODEL
+        headers, payload = self._gemini_request(message, system_prompt, max_tokens, history)
+
+        logger.info(f"🌐 Streaming from Gemini API: {model}")
+        try:
+            async with self._get_client("gemini").stream(
+                "POST",
+                f"/models/{model}:streamGenerateContent",
+                params={"key": config.GEMINI_API_KEY, "alt": "sse"},
+                headers=headers,
+                json=payload
+            ) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    logger.error(f"🚫 Gemini API error {response.status_code}: {body[:500]!r}")
+                    raise LLMProviderError(
+                        f"{response.status_code} - Gemini API error",
+                        status_code=response.status_code,
+                        retry_after=parse_retry_after(response)
+                    )
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    chunk = json.loads(line[5:].strip())
+                    for candidate in chunk.get("candidates", [])[:1]:
+                        for part in candidate.get("content", {}).get("parts", []):
+                            if part.get("text"):
+                                yield part["text"]
+
+        except httpx.RequestError as e:
+            logger.error(f"🌐 Network error streaming from Gemini: {e}")
+            raise Exception("Network connection error - check internet connection")
+
+    async def _stream_local(self, message: str, model: str = None,
+                            system_prompt: str = None, max_tokens: int = 500,
+                            history: List[dict] = None):
+        """Local fallback has no incremental output - emit it as a single delta"""
+        yield await self._call_local(message, model, system_prompt, max_tokens)
+
     async def _call_local(self, message: str, model: str = None,
-                          system_prompt: str = None, max_tokens: int = 500):
+                          system_prompt: str = None, max_tokens: int = 500,
+                          history: List[dict] = None):
         """Enhanced local fallback response with contextual help"""
         # Provide helpful context about the API issue
         responses = [
@@ -368,9 +1556,202 @@ class LLMService:
         return random.choice(responses)
 
 
+class SQLiteConnectionManager:
+    """Keeps one tuned SQLite connection open per thread instead of reconnecting per query"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._generation = 0  # bumped by close_all() so threads reopen lazily
+
+    def open_connection(self) -> sqlite3.Connection:
+        """Open a new connection with WAL journaling and tuned pragmas (caller owns it)"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_MB * 1024}")
+        conn.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.generation != self._generation:
+            conn = self.open_connection()
+            self._local.conn = conn
+            self._local.generation = self._generation
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Run statements on this thread's connection and commit (or roll back) as one unit"""
+        conn = self.connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def close_all(self):
+        """Close every connection opened by the manager"""
+        with self._lock:
+            self._generation += 1
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.warning(f"⚠️ Error closing SQLite connection: {e}")
+
+def encode_cursor(*values) -> str:
+    """Opaque pagination cursor for a keyset position"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decode a cursor produced by encode_cursor, validating its shape"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid pagination cursor")
+    return values
+
+def build_fts_query(text: str) -> str:
+    """Turn free-form search text into a safe FTS5 query (all words, prefix match on the last one)"""
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
 class DatabaseService:
+    # Versioned schema changes applied on top of the base tables, in order.
+    # Each entry is (version, description, steps); a step is an SQL statement or the
+    # name of a DatabaseService method taking the connection (for data backfills).
+    MIGRATIONS = [
+        (1, "history indexes", [
+            "CREATE INDEX IF NOT EXISTS idx_conversation_logs_session_created ON conversation_logs (session_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_conversation_logs_created_at ON conversation_logs (created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_whatsapp_messages_from_processed ON whatsapp_messages (from_number, processed_at)",
+            "CREATE INDEX IF NOT EXISTS idx_whatsapp_messages_processed_at ON whatsapp_messages (processed_at)",
+        ]),
+        (2, "session summaries and aggregate stats", [
+            "ALTER TABLE conversation_logs ADD COLUMN source TEXT DEFAULT 'web'",
+            """CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                source TEXT NOT NULL DEFAULT 'web',
+                first_message TEXT,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                first_activity TIMESTAMP,
+                last_activity TIMESTAMP,
+                llm_provider TEXT,
+                total_processing_time REAL NOT NULL DEFAULT 0
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions (last_activity, session_id)",
+            """CREATE TABLE IF NOT EXISTS history_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                conversations INTEGER NOT NULL DEFAULT 0,
+                messages INTEGER NOT NULL DEFAULT 0,
+                whatsapp INTEGER NOT NULL DEFAULT 0,
+                timed_messages INTEGER NOT NULL DEFAULT 0,
+                total_processing_time REAL NOT NULL DEFAULT 0
+            )""",
+            """CREATE TABLE IF NOT EXISTS daily_stats (
+                day TEXT PRIMARY KEY,
+                messages INTEGER NOT NULL DEFAULT 0
+            )""",
+            "_migrate_backfill_session_summaries",
+            # Keep the summaries current on every insert
+            """CREATE TRIGGER IF NOT EXISTS trg_conversation_logs_summary
+            AFTER INSERT ON conversation_logs
+            BEGIN
+                UPDATE history_stats SET
+                    conversations = conversations + NOT EXISTS (SELECT 1 FROM sessions WHERE session_id = NEW.session_id),
+                    messages = messages + 1,
+                    timed_messages = timed_messages + (NEW.processing_time IS NOT NULL),
+                    total_processing_time = total_processing_time + COALESCE(NEW.processing_time, 0)
+                WHERE id = 1;
+                INSERT INTO sessions (session_id, source, first_message, message_count, first_activity,
+                                      last_activity, llm_provider, total_processing_time)
+                VALUES (NEW.session_id, COALESCE(NEW.source, 'web'), NEW.user_message, 1, NEW.created_at,
+                        NEW.created_at, NEW.llm_provider, COALESCE(NEW.processing_time, 0))
+                ON CONFLICT (session_id) DO UPDATE SET
+                    message_count = message_count + 1,
+                    first_message = CASE WHEN excluded.first_activity < first_activity
+                                         THEN excluded.first_message ELSE first_message END,
+                    first_activity = MIN(first_activity, excluded.first_activity),
+                    last_activity = MAX(last_activity, excluded.last_activity),
+                    llm_provider = COALESCE(excluded.llm_provider, llm_provider),
+                    total_processing_time = total_processing_time + excluded.total_processing_time;
+                INSERT INTO daily_stats (day, messages) VALUES (date(NEW.created_at), 1)
+                ON CONFLICT (day) DO UPDATE SET messages = messages + 1;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS trg_whatsapp_messages_summary
+            AFTER INSERT ON whatsapp_messages
+            BEGIN
+                UPDATE history_stats SET
+                    conversations = conversations + NOT EXISTS (
+                        SELECT 1 FROM sessions WHERE session_id = 'whatsapp:' || NEW.from_number),
+                    whatsapp = whatsapp + 1
+                WHERE id = 1;
+                INSERT INTO sessions (session_id, source, first_message, message_count, first_activity, last_activity)
+                VALUES ('whatsapp:' || NEW.from_number, 'whatsapp', NEW.message_text, 1,
+                        NEW.processed_at, NEW.processed_at)
+                ON CONFLICT (session_id) DO UPDATE SET
+                    message_count = message_count + 1,
+                    first_message = CASE WHEN excluded.first_activity < first_activity
+                                         THEN excluded.first_message ELSE first_message END,
+                    first_activity = MIN(first_activity, excluded.first_activity),
+                    last_activity = MAX(last_activity, excluded.last_activity);
+                INSERT INTO daily_stats (day, messages) VALUES (date(NEW.processed_at), 1)
+                ON CONFLICT (day) DO UPDATE SET messages = messages + 1;
+            END""",
+        ]),
+        (3, "history filter indexes", [
+            "CREATE INDEX IF NOT EXISTS idx_sessions_source_last_activity ON sessions (source, last_activity, session_id)",
+            "CREATE INDEX IF NOT EXISTS idx_sessions_provider_last_activity ON sessions (llm_provider, last_activity, session_id)",
+        ]),
+        (4, "full-text search index", [
+            "_migrate_full_text_search",
+        ]),
+        (5, "persistent LLM response cache", [
+            """CREATE TABLE IF NOT EXISTS llm_response_cache (
+                cache_key TEXT PRIMARY KEY,
+                provider TEXT,
+                model TEXT,
+                response TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_llm_response_cache_expires_at ON llm_response_cache (expires_at)",
+        ]),
+        (6, "purge by source index", [
+            # purge_history(source=...) filters on source, usually together with a created_at cutoff
+            "CREATE INDEX IF NOT EXISTS idx_conversation_logs_source_created ON conversation_logs (source, created_at)",
+        ]),
+    ]
+
+    # FTS5 external-content indexes over the log tables: (fts table, content table, indexed columns)
+    FTS_TABLES = [
+        ("conversation_logs_fts", "conversation_logs", ("user_message", "assistant_response")),
+        ("whatsapp_messages_fts", "whatsapp_messages", ("message_text", "response_text")),
+    ]
+
     def __init__(self, lazy_load=True):
         self.db_path = "agent_database.db"
+        self.db = SQLiteConnectionManager(self.db_path)
         self.initialized = False
         self.lazy_load = lazy_load
         
@@ -382,6 +1763,15 @@ class DatabaseService:
         """Ensure database is initialized before use (lazy loading)"""
         if not self.initialized:
             self.init_database()
+
+    def connection(self) -> sqlite3.Connection:
+        """Persistent connection for the calling thread"""
+        self.ensure_initialized()
+        return self.db.connection()
+
+    def close(self):
+        """Close all pooled connections"""
+        self.db.close_all()
     
     def init_database(self):
         """Initialize SQLite database with required tables"""
@@ -389,7 +1779,7 @@ class DatabaseService:
             return  # Already initialized
             
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.db.connection()
             cursor = conn.cursor()
             
             # System configuration table
@@ -431,7 +1821,10 @@ class DatabaseService:
             ''')
             
             conn.commit()
-            conn.close()
+
+            # Bring the schema up to date
+            self.apply_migrations(conn)
+            self.ensure_full_text_search(conn)
             
             self.initialized = True
             logger.info("✅ Database initialized successfully")
@@ -439,23 +1832,294 @@ class DatabaseService:
         except Exception as e:
             logger.error(f"Database initialization error: {e}")
     
+    def apply_migrations(self, conn: sqlite3.Connection):
+        """Apply pending schema migrations, recording each version in schema_migrations"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        current_version = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+        applied = 0
+        for version, description, steps in self.MIGRATIONS:
+            if version <= current_version:
+                continue
+            logger.info(f"🗄️ Applying database migration {version}: {description}")
+            conn.execute("BEGIN")
+            try:
+                for step in steps:
+                    if step.startswith("_migrate_"):
+                        getattr(self, step)(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                    (version, description)
+                )
+                conn.commit()
+                applied += 1
+            except Exception:
+                conn.rollback()
+                logger.error(f"❌ Database migration {version} failed")
+                raise
+
+        if applied:
+            # Refresh planner statistics for the new indexes
+            conn.execute("PRAGMA optimize")
+            logger.info(f"✅ Database schema at version {self.MIGRATIONS[-1][0]}")
+
+    def enable_incremental_vacuum(self) -> bool:
+        """Switch the file to auto_vacuum=INCREMENTAL so purges can hand pages back to the OS (blocking)
+
+        Only takes effect after a full VACUUM, a one-time rebuild of the whole file - run it off the
+        event loop. Returns True if the file was converted.
+        """
+        conn = self.connection()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        size_mb = os.path.getsize(self.db_path) / (1024 * 1024)
+        logger.info(f"🗄️ Enabling incremental vacuum: one-time VACUUM of {size_mb:.1f} MB "
+                    f"(writes are blocked meanwhile and up to {size_mb * 2:.1f} MB of free disk is needed)")
+        started = time.time()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        logger.info(f"✅ Incremental vacuum enabled in {time.time() - started:.1f}s")
+        return True
+
+    def _migrate_backfill_session_summaries(self, conn: sqlite3.Connection):
+        """Populate sessions, history_stats and daily_stats from existing log rows"""
+        conn.execute("DELETE FROM sessions")
+        conn.execute('''
+            INSERT INTO sessions (session_id, source, first_message, message_count, first_activity,
+                                  last_activity, llm_provider, total_processing_time)
+            SELECT
+                c.session_id,
+                (SELECT COALESCE(source, 'web') FROM conversation_logs f
+                 WHERE f.session_id = c.session_id ORDER BY f.created_at, f.id LIMIT 1),
+                (SELECT user_message FROM conversation_logs f
+                 WHERE f.session_id = c.session_id ORDER BY f.created_at, f.id LIMIT 1),
+                COUNT(*),
+                MIN(c.created_at),
+                MAX(c.created_at),
+                (SELECT llm_provider FROM conversation_logs l
+                 WHERE l.session_id = c.session_id ORDER BY l.created_at DESC, l.id DESC LIMIT 1),
+                COALESCE(SUM(c.processing_time), 0)
+            FROM conversation_logs c
+            GROUP BY c.session_id
+        ''')
+        conn.execute('''
+            INSERT INTO sessions (session_id, source, first_message, message_count, first_activity, last_activity)
+            SELECT
+                'whatsapp:' || w.from_number,
+                'whatsapp',
+                (SELECT message_text FROM whatsapp_messages f
+                 WHERE f.from_number = w.from_number ORDER BY f.processed_at, f.id LIMIT 1),
+                COUNT(*),
+                MIN(w.processed_at),
+                MAX(w.processed_at)
+            FROM whatsapp_messages w
+            GROUP BY w.from_number
+        ''')
+        conn.execute("DELETE FROM history_stats")
+        conn.execute('''
+            INSERT INTO history_stats (id, conversations, messages, whatsapp, timed_messages, total_processing_time)
+            VALUES (
+                1,
+                (SELECT COUNT(*) FROM sessions),
+                (SELECT COUNT(*) FROM conversation_logs),
+                (SELECT COUNT(*) FROM whatsapp_messages),
+                (SELECT COUNT(processing_time) FROM conversation_logs),
+                (SELECT COALESCE(SUM(processing_time), 0) FROM conversation_logs)
+            )
+        ''')
+        conn.execute("DELETE FROM daily_stats")
+        conn.execute('''
+            INSERT INTO daily_stats (day, messages)
+            SELECT day, SUM(messages) FROM (
+                SELECT date(created_at) AS day, COUNT(*) AS messages FROM conversation_logs GROUP BY day
+                UNION ALL
+                SELECT date(processed_at) AS day, COUNT(*) AS messages FROM whatsapp_messages GROUP BY day
+            )
+            GROUP BY day
+        ''')
+
+    def _migrate_full_text_search(self, conn: sqlite3.Connection):
+        """Create FTS5 indexes kept in sync with triggers, if this SQLite build has FTS5"""
+        try:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)")
+            conn.execute("DROP TABLE temp.fts5_probe")
+        except sqlite3.OperationalError:
+            logger.warning("⚠️ SQLite was built without FTS5, /api/history/search will be unavailable")
+            return
+
+        for fts_table, table, columns in self.FTS_TABLES:
+            column_list = ", ".join(columns)
+            new_values = ", ".join(f"new.{column}" for column in columns)
+            old_values = ", ".join(f"old.{column}" for column in columns)
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                    {column_list},
+                    content='{table}',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_insert AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});
+                END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_delete AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_update AFTER UPDATE ON {table} BEGIN
+                    INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                    INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});
+                END
+            """)
+            # Index the rows that already exist
+            conn.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+
+    def ensure_full_text_search(self, conn: sqlite3.Connection):
+        """Create the FTS5 indexes if they are missing (e.g. SQLite gained FTS5 after migration 4 ran)
+
+        Checked on every startup rather than recorded in schema_migrations, since migration 4 is a
+        no-op on builds without FTS5.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.FTS_TABLES[0][0],)
+        ).fetchone()
+        if exists:
+            return
+        conn.execute("BEGIN")
+        try:
+            self._migrate_full_text_search(conn)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"❌ Full-text search index creation failed: {e}")
+
+    def has_full_text_search(self) -> bool:
+        """Whether the FTS5 indexes exist"""
+        row = self.connection().execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conversation_logs_fts'"
+        ).fetchone()
+        return row is not None
+
+    def search_messages(self, query: str, limit: int = 20, offset: int = 0, source: str = None):
+        """Ranked full-text search over conversation and WhatsApp logs.
+
+        Returns (results, has_more); results carry a highlighted snippet and bm25 rank.
+        """
+        match = build_fts_query(query)
+        if not match:
+            return [], False
+
+        selects = []
+        params = []
+        if source != "whatsapp":
+            source_filter = ""
+            if source:
+                source_filter = "AND COALESCE(c.source, 'web') = ?"
+            selects.append(f"""
+                SELECT 'conversation', c.id, c.session_id, COALESCE(c.source, 'web'), c.created_at,
+                       c.llm_provider,
+                       snippet(conversation_logs_fts, 0, '<mark>', '</mark>', '…', 12),
+                       snippet(conversation_logs_fts, 1, '<mark>', '</mark>', '…', 12),
+                       bm25(conversation_logs_fts) AS rank
+                FROM conversation_logs_fts
+                JOIN conversation_logs c ON c.id = conversation_logs_fts.rowid
+                WHERE conversation_logs_fts MATCH ? {source_filter}
+            """)
+            params.append(match)
+            if source:
+                params.append(source)
+        if not source or source == "whatsapp":
+            selects.append("""
+                SELECT 'whatsapp', w.id, 'whatsapp:' || w.from_number, 'whatsapp', w.processed_at,
+                       NULL,
+                       snippet(whatsapp_messages_fts, 0, '<mark>', '</mark>', '…', 12),
+                       snippet(whatsapp_messages_fts, 1, '<mark>', '</mark>', '…', 12),
+                       bm25(whatsapp_messages_fts) AS rank
+                FROM whatsapp_messages_fts
+                JOIN whatsapp_messages w ON w.id = whatsapp_messages_fts.rowid
+                WHERE whatsapp_messages_fts MATCH ?
+            """)
+            params.append(match)
+
+        rows = self.connection().execute(
+            " UNION ALL ".join(selects) + " ORDER BY rank LIMIT ? OFFSET ?",
+            (*params, limit + 1, offset)
+        ).fetchall()
+
+        results = [
+            {
+                "type": row[0],
+                "id": row[1],
+                "session_id": row[2],
+                "source": row[3],
+                "timestamp": row[4],
+                "provider": row[5],
+                "user_snippet": row[6],
+                "assistant_snippet": row[7],
+                "rank": row[8]
+            }
+            for row in rows[:limit]
+        ]
+        return results, len(rows) > limit
+
+    def get_schema_version(self) -> int:
+        """Highest applied migration version"""
+        try:
+            return self.connection().execute(
+                "SELECT COALESCE(MAX(version), 0) FROM schema_migrations"
+            ).fetchone()[0]
+        except Exception as e:
+            logger.error(f"Error reading schema version: {e}")
+            return 0
+    
+    def save_cached_response(self, cache_key: str, provider: str, model: str, response: str, expires_at: float):
+        """Upsert one LLM response cache entry"""
+        try:
+            with self.db.transaction() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO llm_response_cache (cache_key, provider, model, response, expires_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (cache_key, provider, model, response, expires_at))
+        except Exception as e:
+            logger.error(f"Error saving cached LLM response: {e}")
+
+    def load_cached_responses(self, limit: int) -> List[tuple]:
+        """Drop expired cache entries and return the freshest (cache_key, response, expires_at) rows, oldest first"""
+        self.ensure_initialized()  # Lazy initialization
+        now = time.time()
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM llm_response_cache WHERE expires_at <= ?", (now,))
+            rows = conn.execute('''
+                SELECT cache_key, response, expires_at FROM llm_response_cache
+                ORDER BY expires_at DESC LIMIT ?
+            ''', (limit,)).fetchall()
+        return list(reversed(rows))
+
     def save_conversation(self, session_id: str, user_message: str, 
                          assistant_response: str, llm_provider: str = None, 
-                         llm_model: str = None, processing_time: float = None):
+                         llm_model: str = None, processing_time: float = None,
+                         source: str = "web"):
         """Save conversation to database"""
         self.ensure_initialized()  # Lazy initialization
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO conversation_logs 
-                (session_id, user_message, assistant_response, llm_provider, llm_model, processing_time)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (session_id, user_message, assistant_response, llm_provider, llm_model, processing_time))
-            
-            conn.commit()
-            conn.close()
+            with self.db.transaction() as conn:
+                conn.execute('''
+                    INSERT INTO conversation_logs 
+                    (session_id, user_message, assistant_response, llm_provider, llm_model, processing_time, source)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (session_id, user_message, assistant_response, llm_provider, llm_model, processing_time, source))
             
         except Exception as e:
             logger.error(f"Error saving conversation: {e}")
@@ -465,26 +2129,40 @@ class DatabaseService:
         """Save WhatsApp message to database"""
         self.ensure_initialized()  # Lazy initialization
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO whatsapp_messages (from_number, message_text, message_type, response_text)
-                VALUES (?, ?, ?, ?)
-            ''', (from_number, message_text, message_type, response_text))
-            
-            conn.commit()
-            conn.close()
+            with self.db.transaction() as conn:
+                conn.execute('''
+                    INSERT INTO whatsapp_messages (from_number, message_text, message_type, response_text)
+                    VALUES (?, ?, ?, ?)
+                ''', (from_number, message_text, message_type, response_text))
             
         except Exception as e:
             logger.error(f"Error saving WhatsApp message: {e}")
     
+    def save_batch(self, conversations: List[tuple] = None, whatsapp_messages: List[tuple] = None):
+        """Insert many log rows in a single transaction.
+
+        conversations: (session_id, user_message, assistant_response, llm_provider, llm_model, processing_time, source, created_at)
+        whatsapp_messages: (from_number, message_text, message_type, response_text, processed_at)
+        """
+        self.ensure_initialized()  # Lazy initialization
+        with self.db.transaction() as conn:
+            if conversations:
+                conn.executemany('''
+                    INSERT INTO conversation_logs 
+                    (session_id, user_message, assistant_response, llm_provider, llm_model, processing_time, source, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', conversations)
+            if whatsapp_messages:
+                conn.executemany('''
+                    INSERT INTO whatsapp_messages (from_number, message_text, message_type, response_text, processed_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', whatsapp_messages)
+    
     def get_conversation_history(self, session_id: str, limit: int = 10):
         """Get conversation history for a session"""
         self.ensure_initialized()  # Lazy initialization
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self.db.connection().cursor()
             
             cursor.execute('''
                 SELECT user_message, assistant_response, created_at
@@ -495,7 +2173,6 @@ class DatabaseService:
             ''', (session_id, limit))
             
             rows = cursor.fetchall()
-            conn.close()
             
             return [{"user": row[0], "assistant": row[1], "timestamp": row[2]} for row in rows]
             
@@ -503,34 +2180,224 @@ class DatabaseService:
             logger.error(f"Error getting conversation history: {e}")
             return []
     
+    def get_recent_turns(self, session_id: str, limit: int = 10) -> List[dict]:
+        """Latest completed turns of a session in chronological order (WhatsApp sessions are 'whatsapp:<number>')"""
+        self.ensure_initialized()  # Lazy initialization
+        if session_id.startswith("whatsapp:"):
+            rows = self.db.connection().execute('''
+                SELECT message_text, response_text FROM whatsapp_messages
+                WHERE from_number = ? AND response_text IS NOT NULL
+                ORDER BY processed_at DESC, id DESC
+                LIMIT ?
+            ''', (session_id[len("whatsapp:"):], limit)).fetchall()
+        else:
+            rows = self.db.connection().execute('''
+                SELECT user_message, assistant_response FROM conversation_logs
+                WHERE session_id = ? AND assistant_response IS NOT NULL
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', (session_id, limit)).fetchall()
+        return [{"user": user, "assistant": assistant} for user, assistant in reversed(rows) if user]
+
+    def list_sessions(self, limit: int = 50, cursor: str = None, date_start: str = None,
+                      date_end: str = None, provider: str = None, source: str = None):
+        """Page through session summaries, newest first, using a (last_activity, session_id) keyset.
+
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        """
+        conditions = []
+        params = []
+        if source:
+            conditions.append("source = ?")
+            params.append(source)
+        if provider:
+            conditions.append("llm_provider = ?")
+            params.append(provider)
+        if date_start:
+            conditions.append("last_activity >= ?")
+            params.append(date_start)
+        if date_end:
+            # Inclusive end date: everything before the following midnight
+            conditions.append("last_activity < date(?, '+1 day')")
+            params.append(date_end)
+        if cursor:
+            last_activity, session_id = decode_cursor(cursor, 2)
+            conditions.append("(last_activity, session_id) < (?, ?)")
+            params.extend([last_activity, session_id])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.connection().execute(f'''
+            SELECT session_id, first_message, message_count, first_activity, last_activity, source, llm_provider
+            FROM sessions
+            {where}
+            ORDER BY last_activity DESC, session_id DESC
+            LIMIT ?
+        ''', (*params, limit + 1)).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][4], rows[-1][0])
+        return rows, next_cursor
+
+    def get_session(self, session_id: str):
+        """Summary row for a single session"""
+        return self.connection().execute('''
+            SELECT session_id, first_message, message_count, first_activity, last_activity, source, llm_provider
+            FROM sessions WHERE session_id = ?
+        ''', (session_id,)).fetchone()
+
+    def get_session_messages(self, session_id: str, limit: int = 100, cursor: str = None):
+        """Page through a session's messages in chronological order using a (timestamp, id) keyset.
+
+        Rows are (user_message, assistant_response, timestamp, llm_provider, llm_model, id).
+        Returns (rows, next_cursor).
+        """
+        if session_id.startswith("whatsapp:"):
+            query = '''
+                SELECT message_text, response_text, processed_at, NULL, NULL, id
+                FROM whatsapp_messages
+                WHERE from_number = ? {keyset}
+                ORDER BY processed_at ASC, id ASC
+                LIMIT ?
+            '''
+            keyset = "AND (processed_at, id) > (?, ?)"
+            params = [session_id[len("whatsapp:"):]]
+        else:
+            query = '''
+                SELECT user_message, assistant_response, created_at, llm_provider, llm_model, id
+                FROM conversation_logs 
+                WHERE session_id = ? {keyset}
+                ORDER BY created_at ASC, id ASC
+                LIMIT ?
+            '''
+            keyset = "AND (created_at, id) > (?, ?)"
+            params = [session_id]
+
+        if cursor:
+            params.extend(decode_cursor(cursor, 2))
+        else:
+            keyset = ""
+
+        rows = self.connection().execute(query.format(keyset=keyset), (*params, limit + 1)).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][2], rows[-1][5])
+        return rows, next_cursor
+
+    # Column order shared by every export format
+    EXPORT_COLUMNS = [
+        "type", "id", "session_id", "source", "from_number", "user_message", "assistant_response",
+        "llm_provider", "llm_model", "message_type", "processing_time", "created_at"
+    ]
+
+    def iter_export_rows(self, date_start: str = None, date_end: str = None,
+                         source: str = None, batch_size: int = 500):
+        """Yield conversation and WhatsApp log rows as dicts, streaming from a server-side cursor.
+
+        Uses its own connection so the generator can be consumed from any thread.
+        """
+        self.ensure_initialized()  # Lazy initialization
+        conn = self.db.open_connection()
+        try:
+            def date_conditions(column):
+                conditions, params = [], []
+                if date_start:
+                    conditions.append(f"{column} >= ?")
+                    params.append(date_start)
+                if date_end:
+                    conditions.append(f"{column} < date(?, '+1 day')")
+                    params.append(date_end)
+                return conditions, params
+
+            if source != "whatsapp":
+                conditions, params = date_conditions("created_at")
+                if source:
+                    conditions.append("source = ?")
+                    params.append(source)
+                where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+                cursor = conn.execute(f'''
+                    SELECT id, session_id, COALESCE(source, 'web'), user_message, assistant_response,
+                           llm_provider, llm_model, processing_time, created_at
+                    FROM conversation_logs {where}
+                    ORDER BY created_at, id
+                ''', params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield {
+                            "type": "conversation",
+                            "id": row[0],
+                            "session_id": row[1],
+                            "source": row[2],
+                            "from_number": None,
+                            "user_message": row[3],
+                            "assistant_response": row[4],
+                            "llm_provider": row[5],
+                            "llm_model": row[6],
+                            "message_type": "text",
+                            "processing_time": row[7],
+                            "created_at": row[8]
+                        }
+
+            if not source or source == "whatsapp":
+                conditions, params = date_conditions("processed_at")
+                where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+                cursor = conn.execute(f'''
+                    SELECT id, from_number, message_text, response_text, message_type, processed_at
+                    FROM whatsapp_messages {where}
+                    ORDER BY processed_at, id
+                ''', params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield {
+                            "type": "whatsapp",
+                            "id": row[0],
+                            "session_id": f"whatsapp:{row[1]}",
+                            "source": "whatsapp",
+                            "from_number": row[1],
+                            "user_message": row[2],
+                            "assistant_response": row[3],
+                            "llm_provider": None,
+                            "llm_model": None,
+                            "message_type": row[4],
+                            "processing_time": None,
+                            "created_at": row[5]
+                        }
+        finally:
+            conn.close()
+
     def get_stats(self):
-        """Get database statistics"""
+        """Get database statistics from the incrementally maintained aggregates"""
         self.ensure_initialized()  # Lazy initialization
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Get conversation count
-            cursor.execute("SELECT COUNT(DISTINCT session_id) FROM conversation_logs")
-            conversations = cursor.fetchone()[0]
-            
-            # Get message count
-            cursor.execute("SELECT COUNT(*) FROM conversation_logs")
-            messages = cursor.fetchone()[0]
-            
-            # Get WhatsApp message count
-            cursor.execute("SELECT COUNT(*) FROM whatsapp_messages")
-            whatsapp = cursor.fetchone()[0]
+            conn = self.db.connection()
+            row = conn.execute('''
+                SELECT conversations, messages, whatsapp, timed_messages, total_processing_time
+                FROM history_stats WHERE id = 1
+            ''').fetchone()
+            conversations, messages, whatsapp, timed_messages, total_processing_time = row or (0, 0, 0, 0, 0)
+
+            today = conn.execute(
+                "SELECT messages FROM daily_stats WHERE day = date('now')"
+            ).fetchone()
             
             # Get database size
             db_size = os.path.getsize(self.db_path) / (1024 * 1024)  # MB
             
-            conn.close()
-            
             return {
                 "conversations": conversations,
                 "messages": messages,
                 "whatsapp": whatsapp,
+                "avg_response_time": round(total_processing_time / timed_messages, 2) if timed_messages else 0,
+                "today_messages": today[0] if today else 0,
                 "db_size": round(db_size, 2)
             }
             
@@ -540,12 +2407,701 @@ class DatabaseService:
                 "conversations": 0,
                 "messages": 0,
                 "whatsapp": 0,
+                "avg_response_time": 0,
+                "today_messages": 0,
                 "db_size": 0
             }
 
+    # Purgeable log tables: (table, session id expression, timestamp column, processing time expression)
+    PURGE_TABLES = {
+        "conversation_logs": ("conversation_logs", "session_id", "created_at", "processing_time"),
+        "whatsapp_messages": ("whatsapp_messages", "'whatsapp:' || from_number", "processed_at", "NULL"),
+    }
+
+    def purge_history(self, session_id: str = None, before: str = None, source: str = None,
+                      tables: List[str] = None, chunk_size: int = None) -> Dict[str, int]:
+        """Delete log rows matching the filters in short chunked transactions.
+
+        before is a timestamp/date (rows strictly older are removed); source "whatsapp"
+        targets whatsapp_messages, any other value filters conversation_logs.source.
+        Summary tables are corrected chunk by chunk. Returns deleted row counts per table.
+        """
+        self.ensure_initialized()  # Lazy initialization
+        chunk_size = max(chunk_size or config.PURGE_CHUNK_SIZE, 1)
+        tables = tables or list(self.PURGE_TABLES)
+        deleted = {}
+        for table in tables:
+            conditions = self._purge_conditions(table, session_id, before, source)
+            if conditions is None:
+                continue
+            where = " AND ".join(conditions[0]) or "1"
+            total = 0
+            while True:
+                # Each chunk is its own transaction so the write lock is released in between
+                with self.db.transaction() as conn:
+                    count = self._purge_chunk(conn, table, where, conditions[1], chunk_size)
+                total += count
+                if count < chunk_size:
+                    break
+                time.sleep(0)
+            if total:
+                logger.info(f"🧹 Purged {total} rows from {table}")
+            deleted[table] = total
+        return deleted
+
+    def _purge_conditions(self, table: str, session_id: str = None, before: str = None, source: str = None):
+        """WHERE clauses and params selecting the rows to purge, or None if the table is excluded by the filters"""
+        _, session_expr, ts_column, _ = self.PURGE_TABLES[table]
+        conditions = []
+        params = []
+        if table == "whatsapp_messages":
+            if source and source != "whatsapp":
+                return None
+            if session_id:
+                if not session_id.startswith("whatsapp:"):
+                    return None
+                conditions.append("from_number = ?")
+                params.append(session_id[len("whatsapp:"):])
+        else:
+            if source == "whatsapp":
+                return None
+            if source:
+                conditions.append("source = ?")
+                params.append(source)
+            if session_id:
+                conditions.append("session_id = ?")
+                params.append(session_id)
+        if before:
+            conditions.append(f"{ts_column} < ?")
+            params.append(before)
+        return conditions, params
+
+    def _purge_chunk(self, conn: sqlite3.Connection, table: str, where: str, params: list, chunk_size: int) -> int:
+        """Delete up to chunk_size matching rows and adjust the summary tables accordingly"""
+        _, session_expr, ts_column, time_expr = self.PURGE_TABLES[table]
+        rows = conn.execute(f'''
+            SELECT id, {session_expr}, date({ts_column}), {time_expr}
+            FROM {table} WHERE {where} LIMIT ?
+        ''', (*params, chunk_size)).fetchall()
+        if not rows:
+            return 0
+
+        conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(row[0],) for row in rows])
+
+        days = Counter(row[2] for row in rows)
+        conn.executemany(
+            "UPDATE daily_stats SET messages = messages - ? WHERE day = ?",
+            [(count, day) for day, count in days.items()]
+        )
+        conn.execute("DELETE FROM daily_stats WHERE messages <= 0")
+
+        removed_sessions = self._refresh_sessions(conn, table, {row[1] for row in rows})
+        if table == "whatsapp_messages":
+            conn.execute('''
+                UPDATE history_stats SET whatsapp = whatsapp - ?, conversations = conversations - ?
+                WHERE id = 1
+            ''', (len(rows), removed_sessions))
+        else:
+            timings = [row[3] for row in rows if row[3] is not None]
+            conn.execute('''
+                UPDATE history_stats SET
+                    messages = messages - ?,
+                    timed_messages = timed_messages - ?,
+                    total_processing_time = total_processing_time - ?,
+                    conversations = conversations - ?
+                WHERE id = 1
+            ''', (len(rows), len(timings), sum(timings), removed_sessions))
+        return len(rows)
+
+    def _refresh_sessions(self, conn: sqlite3.Connection, table: str, session_ids) -> int:
+        """Recompute session summaries from their remaining rows; returns how many sessions became empty"""
+        if table == "whatsapp_messages":
+            for session_id in session_ids:
+                conn.execute('''
+                    UPDATE sessions SET
+                        message_count = (SELECT COUNT(*) FROM whatsapp_messages WHERE from_number = :number),
+                        first_activity = (SELECT MIN(processed_at) FROM whatsapp_messages WHERE from_number = :number),
+                        last_activity = (SELECT MAX(processed_at) FROM whatsapp_messages WHERE from_number = :number),
+                        first_message = (SELECT message_text FROM whatsapp_messages WHERE from_number = :number
+                                         ORDER BY processed_at, id LIMIT 1)
+                    WHERE session_id = :session_id
+                ''', {"number": session_id[len("whatsapp:"):], "session_id": session_id})
+        else:
+            for session_id in session_ids:
+                conn.execute('''
+                    UPDATE sessions SET
+                        message_count = (SELECT COUNT(*) FROM conversation_logs WHERE session_id = :session_id),
+                        first_activity = (SELECT MIN(created_at) FROM conversation_logs WHERE session_id = :session_id),
+                        last_activity = (SELECT MAX(created_at) FROM conversation_logs WHERE session_id = :session_id),
+                        first_message = (SELECT user_message FROM conversation_logs WHERE session_id = :session_id
+                                         ORDER BY created_at, id LIMIT 1),
+                        total_processing_time = (SELECT COALESCE(SUM(processing_time), 0)
+                                                 FROM conversation_logs WHERE session_id = :session_id)
+                    WHERE session_id = :session_id
+                ''', {"session_id": session_id})
+        return conn.execute("DELETE FROM sessions WHERE message_count = 0").rowcount
+
+    def reclaim_space(self, max_pages: int = 0) -> Dict[str, Any]:
+        """Return free pages to the filesystem (incremental vacuum) and truncate the WAL"""
+        self.ensure_initialized()  # Lazy initialization
+        conn = self.db.connection()
+        freelist_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            # executescript steps the pragma to completion (execute() would free a single page)
+            conn.executescript(f"PRAGMA incremental_vacuum({max_pages});" if max_pages else "PRAGMA incremental_vacuum;")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        freelist_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return {
+            "pages_reclaimed": freelist_before - freelist_after,
+            "free_pages": freelist_after,
+            "db_size": round(os.path.getsize(self.db_path) / (1024 * 1024), 2)
+        }
+
+class SessionContextCache:
+    """LRU cache of each recent session's last turns, fed by the log writer so context needs no DB read per turn"""
+
+    def __init__(self, db: DatabaseService):
+        self.db = db
+        self._sessions: "OrderedDict[str, deque]" = OrderedDict()
+        # Sessions whose deque holds their full recent history; the others only hold turns
+        # recorded since they were first seen, until their history has been read from SQLite
+        self._loaded = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return config.CONTEXT_MAX_TURNS > 0
+
+    async def get_context(self, session_id: str) -> List[dict]:
+        """Earlier turns to send with the next message, trimmed to the token budget"""
+        if not self.enabled or not session_id:
+            return []
+        with self._lock:
+            turns = self._seed(session_id)
+            if session_id in self._loaded:
+                self.hits += 1
+                return self._fit_budget(list(turns))
+        self.misses += 1
+        try:
+            stored = await asyncio.to_thread(self.db.get_recent_turns, session_id, config.CONTEXT_MAX_TURNS)
+        except Exception as e:
+            logger.error(f"Error loading context for session {session_id}: {e}")
+            return self._fit_budget(list(turns))
+        with self._lock:
+            # Turns recorded while the read ran (or still queued in the write-behind logger) are kept;
+            # a session dropped in the meantime (history deleted) isn't cached again from this read
+            merged = self._merge(stored, list(turns))
+            if self._sessions.get(session_id) is turns:
+                turns.clear()
+                turns.extend(merged)
+                self._loaded.add(session_id)
+        return self._fit_budget(merged)
+
+    def record_turn(self, session_id: str, user_message: str, assistant_response: str):
+        """Append a finished turn to the session's cached turns (seeding them if the session is new)"""
+        if not self.enabled or not session_id or not user_message or not assistant_response:
+            return
+        with self._lock:
+            self._seed(session_id).append({"user": user_message, "assistant": assistant_response})
+
+    def invalidate(self, session_id: str = None):
+        """Drop one session (or every session) after its history was deleted"""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+                self._loaded.clear()
+            else:
+                self._sessions.pop(session_id, None)
+                self._loaded.discard(session_id)
+
+    def _seed(self, session_id: str) -> deque:
+        """The session's cached turns, created empty on first sight (call with the lock held)"""
+        turns = self._sessions.get(session_id)
+        if turns is None:
+            turns = self._sessions[session_id] = deque(maxlen=config.CONTEXT_MAX_TURNS)
+            while len(self._sessions) > config.CONTEXT_CACHE_SESSIONS:
+                evicted, _ = self._sessions.popitem(last=False)
+                self._loaded.discard(evicted)
+        self._sessions.move_to_end(session_id)
+        return turns
+
+    @staticmethod
+    def _merge(stored: List[dict], recorded: List[dict]) -> List[dict]:
+        """Stored turns followed by the recorded ones SQLite doesn't have yet.
+
+        Recorded turns already flushed are the newest stored rows, so the longest suffix of
+        `stored` that is a prefix of `recorded` is the overlap.
+        """
+        for overlap in range(min(len(stored), len(recorded)), 0, -1):
+            if stored[-overlap:] == recorded[:overlap]:
+                return (stored + recorded[overlap:])[-config.CONTEXT_MAX_TURNS:]
+        return (stored + recorded)[-config.CONTEXT_MAX_TURNS:]
+
+    def _fit_budget(self, turns: List[dict]) -> List[dict]:
+        """Keep the newest turns whose estimated size fits CONTEXT_MAX_TOKENS"""
+        selected = []
+        budget = config.CONTEXT_MAX_TOKENS
+        for turn in reversed(turns):
+            # Rough estimate (~4 characters per token) - no tokenizer dependency
+            cost = (len(turn["user"]) + len(turn["assistant"])) // 4 + 8
+            if cost > budget:
+                break
+            budget -= cost
+            selected.append(turn)
+        selected.reverse()
+        return selected
+
+    def status(self):
+        total = self.hits + self.misses
+        return {
+            "max_turns": config.CONTEXT_MAX_TURNS,
+            "max_tokens": config.CONTEXT_MAX_TOKENS,
+            "cached_sessions": len(self._sessions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0
+        }
+
+class HistoryRetention:
+    """Periodically purges log rows older than the configured per-table TTLs"""
+
+    def __init__(self, db: DatabaseService, context: SessionContextCache = None):
+        self.db = db
+        self.context = context
+        self._task: Optional[asyncio.Task] = None
+        self._vacuum_task: Optional[asyncio.Task] = None
+        self.last_run: Optional[str] = None
+        self.last_result: Dict[str, Any] = {}
+
+    def policies(self) -> Dict[str, int]:
+        """Retention in days per table (tables kept forever are omitted)"""
+        days = {
+            "conversation_logs": config.RETENTION_CONVERSATION_DAYS,
+            "whatsapp_messages": config.RETENTION_WHATSAPP_DAYS,
+        }
+        return {table: value for table, value in days.items() if value > 0}
+
+    async def start(self):
+        """Start the periodic retention task if any TTL is configured"""
+        if config.SQLITE_INCREMENTAL_VACUUM:
+            # One-time file conversion in the background so startup and requests aren't held up
+            self._vacuum_task = asyncio.create_task(self._enable_incremental_vacuum())
+        if not self.policies():
+            logger.info("🧹 History retention disabled (keeping all rows)")
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"🧹 History retention started: {self.policies()} days, every {config.RETENTION_INTERVAL_HOURS}h")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def run_once(self) -> Dict[str, Any]:
+        """Apply every TTL and reclaim the freed space (blocking)"""
+        deleted = {}
+        for table, days in self.policies().items():
+            cutoff = (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+            deleted.update(self.db.purge_history(before=cutoff, tables=[table]))
+        result = {"deleted": deleted}
+        if any(deleted.values()):
+            if self.context:
+                self.context.invalidate()
+            result["vacuum"] = self.db.reclaim_space()
+        self.last_run = datetime.now().isoformat()
+        self.last_result = result
+        return result
+
+    async def _enable_incremental_vacuum(self):
+        try:
+            await asyncio.to_thread(self.db.enable_incremental_vacuum)
+        except Exception as e:
+            logger.error(f"Incremental vacuum conversion error: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"History retention error: {e}")
+            await asyncio.sleep(config.RETENTION_INTERVAL_HOURS * 3600)
+
+    def status(self):
+        return {
+            "policies_days": self.policies(),
+            "running": self._task is not None and not self._task.done(),
+            "last_run": self.last_run,
+            "last_result": self.last_result
+        }
+
+class DatabaseWriteBehind:
+    """Accepts log records immediately and flushes them to SQLite in batched transactions"""
+
+    def __init__(self, db: DatabaseService, context: SessionContextCache = None):
+        self.db = db
+        self.context = context
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Single writer thread, so batches never contend with each other for the write lock
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._spill_lock = threading.Lock()
+        self.records_flushed = 0
+        self.batches_flushed = 0
+        self.flush_errors = 0
+        self.records_spilled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return config.DB_DURABILITY != "sync" and self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Start the background flush task"""
+        if config.DB_DURABILITY == "sync":
+            logger.info("💾 Database durability mode: sync (write-behind disabled)")
+            return
+        self._queue = asyncio.Queue(maxsize=config.DB_WRITE_QUEUE_MAX)
+        self._task = asyncio.create_task(self._run())
+        # Records spilled by an earlier run that couldn't reach the database
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._replay_spill)
+        logger.info(f"💾 Database write-behind started (every {config.DB_FLUSH_INTERVAL_MS}ms / {config.DB_FLUSH_BATCH_SIZE} records)")
+
+    async def stop(self):
+        """Flush everything still queued and stop the background task"""
+        if self._task is not None and not self._task.done():
+            await self._queue.put(None)  # sentinel: flush and exit
+            await self._task
+        self._task = None
+        self._executor.shutdown(wait=True)
+
+    def save_conversation(self, session_id: str, user_message: str,
+                          assistant_response: str, llm_provider: str = None,
+                          llm_model: str = None, processing_time: float = None,
+                          source: str = "web"):
+        """Queue a conversation log record"""
+        if self.context:
+            self.context.record_turn(session_id, user_message, assistant_response)
+        self._enqueue("conversation", (
+            session_id, user_message, assistant_response, llm_provider, llm_model, processing_time, source, self._now()
+        ))
+
+    def save_whatsapp_message(self, from_number: str, message_text: str,
+                              response_text: str = None, message_type: str = "text"):
+        """Queue a WhatsApp message log record"""
+        if self.context:
+            self.context.record_turn(f"whatsapp:{from_number}", message_text, response_text)
+        self._enqueue("whatsapp", (from_number, message_text, message_type, response_text, self._now()))
+
+    def _now(self) -> str:
+        # Same format as SQLite CURRENT_TIMESTAMP, captured when the record is accepted
+        return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+    def _enqueue(self, kind: str, row: tuple):
+        if self.enabled:
+            try:
+                self._queue.put_nowait((kind, row))
+                return
+            except asyncio.QueueFull:
+                logger.warning("⚠️ Database write queue full, writing synchronously")
+        # On the event loop: no backoff sleeps, spill straight away if the write fails
+        self._write([(kind, row)], retries=0)
+
+    def _write(self, batch: List[tuple], retries: int = None):
+        """Write a batch in one transaction (blocking), retrying with backoff (e.g. SQLITE_BUSY
+        during a vacuum or purge) and spilling it to disk if the database stays unavailable"""
+        conversations = [row for kind, row in batch if kind == "conversation"]
+        whatsapp_messages = [row for kind, row in batch if kind == "whatsapp"]
+        retries = config.DB_FLUSH_RETRIES if retries is None else retries
+        delay = 0.1
+        for attempt in range(retries + 1):
+            try:
+                self.db.save_batch(conversations, whatsapp_messages)
+                break
+            except Exception as e:
+                if attempt < retries:
+                    logger.warning(f"⚠️ Flushing {len(batch)} log records failed ({e}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    delay = min(delay * 2, 5.0)
+                    continue
+                self.flush_errors += 1
+                logger.error(f"Error flushing {len(batch)} log records: {e}")
+                self._spill(batch)
+                return
+        self.records_flushed += len(batch)
+        self.batches_flushed += 1
+        self._replay_spill()
+
+    def _spill(self, batch: List[tuple]):
+        """Append records that couldn't be written to the spill file"""
+        try:
+            with self._spill_lock, open(config.DB_SPILL_PATH, "a", encoding="utf-8") as f:
+                for kind, row in batch:
+                    f.write(json.dumps([kind, row], ensure_ascii=False) + "\n")
+            self.records_spilled += len(batch)
+            logger.warning(f"💾 Spilled {len(batch)} log records to {config.DB_SPILL_PATH}")
+        except Exception as e:
+            logger.error(f"❌ Could not spill {len(batch)} log records, they are lost: {e}")
+
+    def _replay_spill(self):
+        """Write spilled records back to the database and remove the spill file (blocking)"""
+        with self._spill_lock:
+            if not os.path.exists(config.DB_SPILL_PATH):
+                return
+            try:
+                with open(config.DB_SPILL_PATH, "r", encoding="utf-8") as f:
+                    batch = [json.loads(line) for line in f if line.strip()]
+                self.db.save_batch(
+                    [tuple(row) for kind, row in batch if kind == "conversation"],
+                    [tuple(row) for kind, row in batch if kind == "whatsapp"]
+                )
+                os.remove(config.DB_SPILL_PATH)
+            except Exception as e:
+                logger.warning(f"⚠️ Spilled log records not replayed yet: {e}")
+                return
+        self.records_flushed += len(batch)
+        logger.info(f"💾 Replayed {len(batch)} spilled log records")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        interval = config.DB_FLUSH_INTERVAL_MS / 1000
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + interval
+            while len(batch) < config.DB_FLUSH_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await loop.run_in_executor(self._executor, self._write, batch)
+
+        # Drain anything enqueued behind the sentinel
+        remaining_items = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                remaining_items.append(item)
+        if remaining_items:
+            await loop.run_in_executor(self._executor, self._write, remaining_items)
+        logger.info(f"💾 Database write-behind stopped ({self.records_flushed} records flushed)")
+
+    def status(self):
+        """Write-behind queue state"""
+        return {
+            "mode": config.DB_DURABILITY,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "records_flushed": self.records_flushed,
+            "batches_flushed": self.batches_flushed,
+            "flush_errors": self.flush_errors,
+            "records_spilled": self.records_spilled,
+            "spill_pending": os.path.exists(config.DB_SPILL_PATH)
+        }
+
+class TTSAudioCache:
+    """Content-addressed cache of synthesized audio files with a persisted, size-bounded LRU index"""
+
+    INDEX_SAVE_INTERVAL = 10  # seconds between index writes (flushed on shutdown)
+    WORK_FILE_MAX_AGE = 3600  # seconds before an unfinished *.part* file counts as abandoned
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "tts_cache_index.json")
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._file_hashes: Dict[str, tuple] = {}  # path -> (mtime, size, sha256)
+        self._last_saved = 0.0
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+        self.sweep_work_files()
+
+    def key(self, text: str, model_name: str, language_code: str, speaker_hash: Optional[str],
+            format: str, params: dict = None) -> str:
+        """Hash of everything that determines the synthesized audio"""
+        normalized = " ".join(text.split())
+        parts = [normalized, model_name, language_code, speaker_hash, format, params or {}]
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def filename(self, key: str, format: str) -> str:
+        return f"tts_{key[:32]}.{format}"
+
+    def hash_file(self, path: Optional[str]) -> Optional[str]:
+        """Content hash of a reference WAV, memoized by mtime and size"""
+        if not path or not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        cached = self._file_hashes.get(path)
+        if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._file_hashes[path] = (stat.st_mtime, stat.st_size, digest)
+        return digest
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the cached artifact for a key, if it is still on disk"""
+        if not config.TTS_CACHE_ENABLED:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            path = os.path.join(self.directory, entry["filename"]) if entry else None
+            if entry and os.path.exists(path):
+                self._entries.move_to_end(key)
+                entry["hits"] += 1
+                entry["last_used"] = time.time()
+                self.hits += 1
+                self._dirty = True
+                self._save_index()
+                return path
+            if entry:
+                del self._entries[key]
+                self._dirty = True
+            self.misses += 1
+            return None
+
+    def put(self, key: str, path: str):
+        """Register a finished artifact (already stored under its content-addressed name)"""
+        if not config.TTS_CACHE_ENABLED:
+            return
+        with self._lock:
+            self._entries[key] = {
+                "filename": os.path.basename(path),
+                "size": os.path.getsize(path),
+                "created_at": time.time(),
+                "last_used": time.time(),
+                "hits": 0
+            }
+            self._entries.move_to_end(key)
+            self._evict()
+            self._dirty = True
+            self._save_index()
+
+    def _evict(self):
+        """Delete least recently used artifacts until the cache fits its size and count limits"""
+        max_bytes = config.TTS_CACHE_MAX_MB * 1024 * 1024
+        total = sum(entry["size"] for entry in self._entries.values())
+        while len(self._entries) > 1 and (total > max_bytes or len(self._entries) > config.TTS_CACHE_MAX_ENTRIES):
+            _, entry = self._entries.popitem(last=False)
+            total -= entry["size"]
+            try:
+                os.remove(os.path.join(self.directory, entry["filename"]))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"⚠️ Could not delete cached audio {entry['filename']}: {e}")
+
+    def _load_index(self):
+        try:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+                # Stored oldest first; drop entries whose file disappeared
+                for key, entry in entries:
+                    if os.path.exists(os.path.join(self.directory, entry["filename"])):
+                        self._entries[key] = entry
+                logger.info(f"🔊 TTS audio cache index loaded ({len(self._entries)} entries)")
+        except Exception as e:
+            logger.error(f"Error loading TTS cache index: {e}")
+            self._entries.clear()
+
+    def _save_index(self, force: bool = False):
+        """Write the index atomically, at most every INDEX_SAVE_INTERVAL seconds unless forced"""
+        if not self._dirty or (not force and time.time() - self._last_saved < self.INDEX_SAVE_INTERVAL):
+            return
+        try:
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self._entries.items()), f)
+            os.replace(tmp_path, self.index_path)
+            self._last_saved = time.time()
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"Error saving TTS cache index: {e}")
+
+    def flush(self):
+        with self._lock:
+            self._save_index(force=True)
+
+    def sweep_work_files(self):
+        """Delete work files abandoned by a crash or failed synthesis"""
+        cutoff = time.time() - self.WORK_FILE_MAX_AGE
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if ".part" in name and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info(f"🧹 Removed {removed} abandoned TTS work files")
+
+    def status(self):
+        with self._lock:
+            size = sum(entry["size"] for entry in self._entries.values())
+        total = self.hits + self.misses
+        return {
+            "enabled": config.TTS_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "size_mb": round(size / (1024 * 1024), 2),
+            "max_mb": config.TTS_CACHE_MAX_MB,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0
+        }
+
 class TTSService:
+    # Multi-speaker models that accept a speaker_wav reference and a language code
+    VOICE_CLONING_MODELS = [
+        'tts_models/multilingual/multi-dataset/xtts_v2',
+        'tts_models/multilingual/multi-dataset/your_tts',
+        'tts_models/multilingual/multi-dataset/bark'
+    ]
+
     def __init__(self):
         self.tts = None
+
+        # Resident model registry: (model name, device) -> loaded Coqui model, in LRU order
+        self._models = OrderedDict()
+        self._models_lock = threading.Lock()
+        self._model_load_lock = threading.Lock()
+
+        # XTTS speaker conditioning latents: (reference hash, device) -> tensors, in LRU order
+        self._latents = OrderedDict()
+        self._latents_lock = threading.Lock()
+        self._last_reference_gc = 0.0
+        # Reference ingestion, profile deletion and the reference GC touch the same files
+        self._reference_lock = threading.RLock()
+        self._precompute_task: Optional[asyncio.Task] = None
+
+        # Dedicated pool so synthesis never runs on the event loop
+        self.worker_pool = WorkerPool(
+            "tts",
+            max_workers=config.TTS_WORKERS or physical_cpu_count(),
+            max_queue=config.TTS_MAX_QUEUE,
+            timeout=config.TTS_REQUEST_TIMEOUT
+        )
+        # The workers share the resident models: one inference at a time per model (torch modules
+        # aren't safe to run from several threads) and torch threads split between concurrent inferences
+        self._inference_locks = weakref.WeakKeyDictionary()
+        self._torch_default_threads = None
         self.profiles_path = os.path.join(os.getcwd(), "tts_profiles.json")
         self.audios_path = os.path.join(os.getcwd(), "generated_audios")
         self.reference_audios_path = os.path.join(os.getcwd(), "reference_audios")
@@ -554,6 +3110,9 @@ class TTSService:
         os.makedirs(self.audios_path, exist_ok=True)
         os.makedirs(self.reference_audios_path, exist_ok=True)
 
+        # Repeat phrases are served from previously synthesized files
+        self.audio_cache = TTSAudioCache(self.audios_path)
+
         # Create default speaker WAV if it doesn't exist
         self.default_speaker_path = os.path.join(self.reference_audios_path, "default_speaker.wav")
         self._ensure_default_speaker()
@@ -561,6 +3120,38 @@ class TTSService:
         # Load available profiles
         self.load_profiles()
 
+    def _model_lock(self, tts) -> threading.RLock:
+        """Lock serializing inference on one resident model instance"""
+        with self._models_lock:
+            lock = self._inference_locks.get(tts)
+            if lock is None:
+                lock = self._inference_locks[tts] = threading.RLock()
+            return lock
+
+    def _configure_torch_threads(self):
+        """Cap torch intra-op threads so models running on different workers don't oversubscribe the cores
+
+        Re-run whenever the set of resident models changes.
+        """
+        try:
+            import torch
+        except ImportError:
+            return
+        if self._torch_default_threads is None:
+            self._torch_default_threads = torch.get_num_threads()
+        if config.TTS_TORCH_THREADS:
+            threads = config.TTS_TORCH_THREADS
+        else:
+            # Per-model locks mean at most min(workers, resident models) inferences run at once;
+            # a single one keeps torch's default and uses every core
+            with self._models_lock:
+                resident = len(self._models)
+            concurrent = min(self.worker_pool.max_workers, max(resident, 1))
+            threads = self._torch_default_threads if concurrent <= 1 else max(physical_cpu_count() // concurrent, 1)
+        if threads != torch.get_num_threads():
+            torch.set_num_threads(threads)
+            logger.info(f"🧵 torch intra-op threads per inference: {threads}")
+
     def _ensure_default_speaker(self):
         """Ensure default speaker WAV exists"""
         if not os.path.exists(self.default_speaker_path):
@@ -591,6 +3182,111 @@ class TTSService:
                 # Fallback without scipy - use existing default files
                 logger.info("💡 Default speaker will be generated on first use")
 
+    def get_model(self, model_name: str, device: str = "cpu"):
+        """Return a resident TTS model, loading it on first use and evicting LRU models"""
+        key = (model_name, device.lower())
+
+        with self._models_lock:
+            entry = self._models.get(key)
+            if entry:
+                self._models.move_to_end(key)
+                entry["hits"] += 1
+                return entry["model"]
+
+        # Serialize loads so concurrent requests don't deserialize the same model twice
+        with self._model_load_lock:
+            with self._models_lock:
+                entry = self._models.get(key)
+                if entry:
+                    self._models.move_to_end(key)
+                    entry["hits"] += 1
+                    return entry["model"]
+
+            os.environ["COQUI_TOS_AGREED"] = "1"
+            from TTS.api import TTS
+
+            use_gpu = key[1] == "gpu"
+            logger.info(f"📦 Loading TTS model '{model_name}' on {key[1]}...")
+            load_start = time.time()
+            tts = TTS(model_name, gpu=use_gpu).to("cuda" if use_gpu else key[1])
+            size_mb = self._estimate_model_size_mb(tts)
+            logger.info(f"✅ TTS model '{model_name}' loaded in {time.time() - load_start:.2f}s (~{size_mb:.0f} MB)")
+
+            with self._models_lock:
+                self._models[key] = {
+                    "model": tts,
+                    "size_mb": size_mb,
+                    "loaded_at": datetime.now().isoformat(),
+                    "hits": 0
+                }
+                self._evict_models()
+            self._configure_torch_threads()
+
+            return tts
+
+    def _estimate_model_size_mb(self, tts) -> float:
+        """Estimate the resident size of a loaded model from its parameters and buffers"""
+        try:
+            total_bytes = sum(p.numel() * p.element_size() for p in tts.parameters())
+            total_bytes += sum(b.numel() * b.element_size() for b in tts.buffers())
+            return total_bytes / (1024 * 1024)
+        except Exception:
+            return 0.0
+
+    def _evict_models(self):
+        """Evict least recently used models until the registry fits its count and memory budget"""
+        def over_budget():
+            total_mb = sum(entry["size_mb"] for entry in self._models.values())
+            return (len(self._models) > max(config.TTS_MODEL_CACHE_SIZE, 1)
+                    or total_mb > config.TTS_MODEL_MEMORY_BUDGET_MB)
+
+        evicted = False
+        # Always keep the most recently used model, even if it alone exceeds the budget
+        while len(self._models) > 1 and over_budget():
+            (model_name, device), entry = self._models.popitem(last=False)
+            logger.info(f"♻️ Evicting TTS model '{model_name}' ({device}, ~{entry['size_mb']:.0f} MB)")
+            evicted = True
+
+        if evicted:
+            gc.collect()
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+
+    def prewarm_default_model(self):
+        """Load the configured default TTS model so the first request doesn't pay for it"""
+        if not config.TTS_PREWARM_DEFAULT_MODEL:
+            return
+        try:
+            self.get_model(config.TTS_DEFAULT_MODEL, config.TTS_DEFAULT_DEVICE)
+        except ImportError as e:
+            logger.warning(f"⚠️ TTS library not available, skipping pre-warm: {e}")
+        except Exception as e:
+            logger.error(f"❌ Failed to pre-warm TTS model '{config.TTS_DEFAULT_MODEL}': {e}")
+
+    def get_model_registry_status(self):
+        """Describe the models currently resident in the registry"""
+        with self._models_lock:
+            models = [
+                {
+                    "model": model_name,
+                    "device": device,
+                    "size_mb": round(entry["size_mb"], 1),
+                    "loaded_at": entry["loaded_at"],
+                    "hits": entry["hits"]
+                }
+                for (model_name, device), entry in self._models.items()
+            ]
+        return {
+            "loaded_models": models,
+            "max_models": config.TTS_MODEL_CACHE_SIZE,
+            "memory_budget_mb": config.TTS_MODEL_MEMORY_BUDGET_MB,
+            "memory_used_mb": round(sum(m["size_mb"] for m in models), 1)
+        }
+
     def load_profiles(self):
         """Load voice profiles from JSON file"""
         try:
@@ -667,14 +3363,39 @@ class TTSService:
     async def generate_speech(self, text: str, language: str, format: str = "wav",
                             device: str = "cpu", reference_audio: bytes = None,
                             profile_id: str = None):
-        """Generate speech using TTS engine"""
+        """Generate speech on the TTS worker pool (long texts are split and synthesized segment by segment)"""
         try:
-            # Set up environment for CoquiTTS
-            os.environ["COQUI_TOS_AGREED"] = "1"
-
-            # Import TTS library
-            from TTS.api import TTS
+            reference_wav_path = self.get_profile_reference(profile_id)
+            if config.TTS_SEGMENT_MAX_CHARS > 0 and text and len(text.strip()) > config.TTS_SEGMENT_MAX_CHARS:
+                segments = SentenceChunker.split(text.strip(), config.TTS_SEGMENT_MAX_CHARS)
+                if len(segments) > 1:
+                    return await self._generate_long_speech(
+                        text, segments, language, format, device, reference_audio, reference_wav_path
+                    )
+            return await self.worker_pool.run(
+                self._generate_speech_sync, text, language, format, device, reference_audio,
+                reference_wav_path
+            )
+        except WorkerPoolSaturated as e:
+            logger.warning(f"🚦 TTS pool saturated: {e}")
+            return {
+                "success": False,
+                "error": "TTS server is busy, please retry shortly",
+                "status_code": 503
+            }
+        except asyncio.TimeoutError:
+            logger.error(f"⏱️ TTS generation timed out after {config.TTS_REQUEST_TIMEOUT}s")
+            return {
+                "success": False,
+                "error": f"TTS generation timed out after {config.TTS_REQUEST_TIMEOUT:.0f}s",
+                "status_code": 504
+            }
 
+    def _generate_speech_sync(self, text: str, language: str, format: str = "wav",
+                              device: str = "cpu", reference_audio: bytes = None,
+                              reference_wav_path: str = None):
+        """Generate speech using TTS engine (blocking, runs on a worker thread)"""
+        try:
             logger.info(f"🎵 Starting TTS generation with model: {language}")
 
             # Validate input text
@@ -684,17 +3405,29 @@ class TTSService:
                     "error": "Text cannot be empty"
                 }
 
-            # Truncate text if too long to prevent TTS issues
-            max_chars = 5000  # Adjust based on model capabilities
-            if len(text) > max_chars:
-                logger.warning(f"Text too long ({len(text)} chars), truncating to {max_chars}")
-                text = text[:max_chars] + "..."
-                logger.info(f"Text truncated to {len(text)} chars")
+            # An uploaded voice sample overrides the profile reference (stored once per content hash)
+            if reference_audio:
+                try:
+                    reference_wav_path = self.ingest_reference_audio(reference_audio)
+                except Exception as e:
+                    logger.error(f"❌ Error processing reference audio: {e}")
+                    reference_wav_path = None
+
+            # Serve repeat phrases from the audio cache without touching the model
+            lang_code = self._get_language_code(language)
+            cache_key = self.audio_cache.key(
+                text, language, lang_code, self._speaker_hash(language, reference_wav_path), format
+            )
+            cached_path = self.audio_cache.get(cache_key)
+            if cached_path:
+                logger.info(f"⚡ TTS cache hit: {os.path.basename(cached_path)}")
+                return self._speech_result(cached_path, language, format, cached=True)
 
-            # Create TTS instance with specified model
-            use_gpu = device.lower() == "gpu"
+            # Get resident TTS model (loaded once, reused across requests)
             try:
-                tts = TTS(language, gpu=use_gpu).to(device)
+                tts = self.get_model(language, device)
+            except ImportError:
+                raise
             except Exception as init_error:
                 logger.error(f"Failed to initialize TTS model '{language}': {init_error}")
                 return {
@@ -702,143 +3435,160 @@ class TTSService:
                     "error": f"Failed to load TTS model '{language}': {str(init_error)}"
                 }
 
-            # Generate unique filename
-            filename = f"tts_{uuid.uuid4().hex}.{format}"
-            output_path = os.path.join(self.audios_path, filename)
+            # Synthesize into a private work file; it is moved to its final name when complete
+            work_id = uuid.uuid4().hex
+            output_path = os.path.join(self.audios_path, f"tts_{work_id}.part.wav")
 
-            # Handle voice cloning/reference audio
-            reference_wav_path = None
-            if reference_audio:
-                # Save uploaded reference audio
-                ref_filename = f"ref_{uuid.uuid4().hex}.wav"
-                reference_wav_path = os.path.join(self.reference_audios_path, ref_filename)
+            try:
+                # Synthesis holds the model's inference lock (other requests on this model wait their turn)
+                with self._model_lock(tts):
+                    error = self._synthesize_to_file(tts, language, lang_code, text, output_path, reference_wav_path)
+                if error:
+                    return error
 
-                # Convert to WAV if needed
-                try:
-                    from pydub import AudioSegment
-                    import io
-
-                    # Load audio from bytes
-                    audio = AudioSegment.from_file(io.BytesIO(reference_audio))
-                    audio.export(reference_wav_path, format="wav")
-                    logger.info(f"✅ Reference audio saved: {ref_filename}")
-                except ImportError:
-                    logger.warning("⚠️ pydub not available for audio conversion")
-                except Exception as e:
-                    logger.error(f"❌ Error processing reference audio: {e}")
-                    reference_wav_path = None
+                return self._publish_speech(output_path, work_id, cache_key, language, format)
+            finally:
+                # Published audio has been moved away; anything left is a failed attempt
+                remove_file(output_path)
+
+        except ImportError as e:
+            logger.error(f"❌ TTS library not available: {e}")
+            return {
+                "success": False,
+                "error": "CoquiTTS não está instalado. Execute: pip install TTS pydub ffmpeg-python"
+            }
 
-            # Enhanced speech generation with better error handling
+        except Exception as e:
+            logger.error(f"❌ TTS generation error: {e}")
+            return {
+                "success": False,
+                "error": f"Erro na síntese: {str(e)}"
+            }
+
+    def _synthesize_to_file(self, tts, language: str, lang_code: str, text: str, output_path: str,
+                            reference_wav_path: str = None) -> Optional[dict]:
+        """Synthesize text into a WAV file with a loaded model; returns an error result if every attempt failed"""
+        # Precomputed speaker latents make cloned synthesis skip the reference processing
+        latents = self._speaker_latents(tts, language, reference_wav_path)
+        if latents is not None:
             try:
-                lang_code = self._get_language_code(language)
-
-                if reference_wav_path and language in [
-                    'tts_models/multilingual/multi-dataset/xtts_v2',
-                    'tts_models/multilingual/multi-dataset/your_tts',
-                    'tts_models/multilingual/multi-dataset/bark'
-                ]:
-                    # Voice cloning synthesis
-                    logger.info(f"🎭 Using voice cloning with reference: {os.path.basename(reference_wav_path)}")
+                logger.info("🎭 Using precomputed speaker conditioning latents")
+                samples = self._xtts_inference(tts, language, text, latents)
+                with open(output_path, "wb") as f:
+                    f.write(encode_wav(samples, self._output_sample_rate(tts)))
+                return None
+            except Exception as e:
+                # Keep the cloned voice: retry through speaker_wav rather than the generic fallbacks
+                logger.warning(f"⚠️ Inference with conditioning latents failed, retrying with speaker_wav: {e}")
+
+        # Enhanced speech generation with better error handling
+        try:
+            if reference_wav_path and language in self.VOICE_CLONING_MODELS:
+                # Voice cloning synthesis
+                logger.info(f"🎭 Using voice cloning with reference: {os.path.basename(reference_wav_path)}")
+                tts.tts_to_file(
+                    text=text,
+                    file_path=output_path,
+                    speaker_wav=[reference_wav_path],
+                    language=lang_code
+                )
+            elif language in self.VOICE_CLONING_MODELS:
+                # Multi-speaker models with default reference
+                logger.info("🎭 Using multi-speaker model with default reference")
+
+                # First try with default speaker reference if available
+                if os.path.exists(self.default_speaker_path):
+                    logger.info("📋 Using default speaker reference")
+                    tts.tts_to_file(
+                        text=text,
+                        file_path=output_path,
+                        speaker_wav=[self.default_speaker_path],
+                        language=lang_code
+                    )
+                else:
+                    # Generate without speaker reference (uses random speaker)
+                    logger.info("🔀 Using random speaker (no reference available)")
                     tts.tts_to_file(
                         text=text,
                         file_path=output_path,
-                        speaker_wav=[reference_wav_path],
                         language=lang_code
                     )
-                elif language in [
-                    'tts_models/multilingual/multi-dataset/xtts_v2',
-                    'tts_models/multilingual/multi-dataset/your_tts',
-                    'tts_models/multilingual/multi-dataset/bark'
-                ]:
-                    # Multi-speaker models with default reference
-                    logger.info("🎭 Using multi-speaker model with default reference")
-
-                    # First try with default speaker reference if available
-                    if os.path.exists(self.default_speaker_path):
-                        logger.info("📋 Using default speaker reference")
-                        tts.tts_to_file(
-                            text=text,
-                            file_path=output_path,
-                            speaker_wav=[self.default_speaker_path],
-                            language=lang_code
-                        )
-                    else:
-                        # Generate without speaker reference (uses random speaker)
-                        logger.info("🔀 Using random speaker (no reference available)")
-                        tts.tts_to_file(
-                            text=text,
-                            file_path=output_path,
-                            language=lang_code
-                        )
-                else:
-                    # Standard single-speaker models
-                    logger.info("🎵 Using standard TTS synthesis")
-                    tts.tts_to_file(text=text, file_path=output_path)
+            else:
+                # Standard single-speaker models
+                logger.info("🎵 Using standard TTS synthesis")
+                tts.tts_to_file(text=text, file_path=output_path)
+
+        except Exception as model_error:
+            logger.warning(f"Primary generation failed: {model_error}")
+            # Try fallback methods
 
-            except Exception as model_error:
-                logger.warning(f"Primary generation failed: {model_error}")
-                # Try fallback methods
+            if "speaker" in str(model_error).lower() or "multi-speaker" in str(model_error).lower():
+                # Fallback 1: Try without speaker_wav parameter
+                try:
+                    logger.info("🔄 Fallback: Generating without speaker_wav")
+                    tts.tts_to_file(text=text, file_path=output_path)
+                    logger.info("✅ Fallback generation successful")
+                except Exception as fallback1_error:
+                    logger.warning(f"Fallback 1 failed: {fallback1_error}")
 
-                if "speaker" in str(model_error).lower() or "multi-speaker" in str(model_error).lower():
-                    # Fallback 1: Try without speaker_wav parameter
+                    # Fallback 2: Try with minimal parameters only
                     try:
-                        logger.info("🔄 Fallback: Generating without speaker_wav")
-                        tts.tts_to_file(text=text, file_path=output_path)
-                        logger.info("✅ Fallback generation successful")
-                    except Exception as fallback1_error:
-                        logger.warning(f"Fallback 1 failed: {fallback1_error}")
-
-                        # Fallback 2: Try with minimal parameters only
-                        try:
-                            logger.info("🔄 Fallback 2: Minimal parameters")
-                            if hasattr(tts, 'tts_to_file') and callable(tts.tts_to_file):
-                                # Try with just text and file_path
-                                tts.tts_to_file(text, output_path)
-                                logger.info("✅ Minimal fallback generation successful")
-                            else:
-                                raise Exception("TTS method not available")
-                        except Exception as fallback2_error:
-                            logger.error(f"❌ All TTS generation attempts failed: {fallback2_error}")
-                            return {
-                                "success": False,
-                                "error": f"Failed to generate speech after multiple attempts. Last error: {str(fallback2_error)}"
-                            }
-                else:
-                    # Re-raise the original error if it's not speaker-related
-                    raise model_error
+                        logger.info("🔄 Fallback 2: Minimal parameters")
+                        if hasattr(tts, 'tts_to_file') and callable(tts.tts_to_file):
+                            # Try with just text and file_path
+                            tts.tts_to_file(text, output_path)
+                            logger.info("✅ Minimal fallback generation successful")
+                        else:
+                            raise Exception("TTS method not available")
+                    except Exception as fallback2_error:
+                        logger.error(f"❌ All TTS generation attempts failed: {fallback2_error}")
+                        return {
+                            "success": False,
+                            "error": f"Failed to generate speech after multiple attempts. Last error: {str(fallback2_error)}"
+                        }
+            else:
+                # Re-raise the original error if it's not speaker-related
+                raise model_error
 
-            # Convert format if needed
-            if format != "wav":
+        return None
+
+    async def _generate_long_speech(self, text: str, segments: List[str], language: str, format: str,
+                                    device: str, reference_audio: bytes = None, reference_wav_path: str = None):
+        """Synthesize a long text segment by segment on the worker pool and crossfade the results"""
+        try:
+            if reference_audio:
                 try:
-                    from pydub import AudioSegment
-                    audio = AudioSegment.from_wav(output_path)
-                    converted_path = output_path.replace('.wav', f'.{format}')
-                    audio.export(converted_path, format=format)
-                    output_path = converted_path
-                    logger.info(f"✅ Audio converted to {format}")
-
-                except ImportError:
-                    logger.warning(f"⚠️ pydub not available, returning WAV format")
+                    reference_wav_path = await self.worker_pool.run(self.ingest_reference_audio, reference_audio)
+                except (WorkerPoolSaturated, asyncio.TimeoutError):
+                    raise
                 except Exception as e:
-                    logger.error(f"❌ Format conversion error: {e}")
+                    logger.error(f"❌ Error processing reference audio: {e}")
+                    reference_wav_path = None
 
-            logger.info(f"✅ TTS generation completed: {filename}")
-            return {
-                "success": True,
-                "filename": filename,
-                "filepath": output_path,
-                "url": f"/api/tts/audio/{filename}",
-                "model_used": language,
-                "format": format
-            }
+            cache_key = self.audio_cache.key(
+                text, language, self._get_language_code(language),
+                self._speaker_hash(language, reference_wav_path), format
+            )
+            cached_path = self.audio_cache.get(cache_key)
+            if cached_path:
+                logger.info(f"⚡ TTS cache hit: {os.path.basename(cached_path)}")
+                return self._speech_result(cached_path, language, format, cached=True)
+
+            logger.info(f"✂️ Long text ({len(text)} chars) split into {len(segments)} segments")
+            started = time.perf_counter()
+            parts = [wav async for _, wav in self.synthesize_segments(segments, language, device, reference_wav_path)]
+            result = await self.worker_pool.run(self._assemble_speech_sync, parts, cache_key, language, format)
+            logger.info(f"✅ {len(segments)} segments synthesized in {time.perf_counter() - started:.1f}s")
+            return result
 
+        except (WorkerPoolSaturated, asyncio.TimeoutError):
+            raise
         except ImportError as e:
             logger.error(f"❌ TTS library not available: {e}")
             return {
                 "success": False,
                 "error": "CoquiTTS não está instalado. Execute: pip install TTS pydub ffmpeg-python"
             }
-
         except Exception as e:
             logger.error(f"❌ TTS generation error: {e}")
             return {
@@ -846,6 +3596,509 @@ class TTSService:
                 "error": f"Erro na síntese: {str(e)}"
             }
 
+    async def stream_speech(self, text: str, model_name: str = None, device: str = None,
+                            reference_audio: bytes = None, profile_id: str = None):
+        """Yield (samples, sample_rate) pieces of speech as soon as each is synthesized
+
+        XTTS voices with conditioning latents stream straight from inference_stream; other models
+        are synthesized segment by segment (as in generate_speech) and crossfaded on the fly.
+        """
+        if not text or not text.strip():
+            raise ValueError("Text cannot be empty")
+        model_name = model_name or config.TTS_DEFAULT_MODEL
+        device = device or config.TTS_DEFAULT_DEVICE
+        reference_wav_path = self.get_profile_reference(profile_id)
+        if reference_audio:
+            try:
+                reference_wav_path = await self.worker_pool.run(self.ingest_reference_audio, reference_audio)
+            except (WorkerPoolSaturated, asyncio.TimeoutError):
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error processing reference audio: {e}")
+
+        # A previously generated WAV for the same text and voice is replayed as-is
+        cached_path = self.audio_cache.get(self.audio_cache.key(
+            text, model_name, self._get_language_code(model_name),
+            self._speaker_hash(model_name, reference_wav_path), "wav"
+        ))
+        if cached_path:
+            logger.info(f"⚡ TTS cache hit: {os.path.basename(cached_path)}")
+            with open(cached_path, "rb") as f:
+                yield decode_wav(f.read())
+            return
+
+        text = text.strip()
+        segments = SentenceChunker.split(text, config.TTS_SEGMENT_MAX_CHARS) if config.TTS_SEGMENT_MAX_CHARS > 0 else [text]
+        tts, latents = await self.worker_pool.run(self._stream_setup_sync, model_name, device, reference_wav_path)
+
+        if latents is not None and hasattr(self._xtts_model(tts), "inference_stream"):
+            logger.info(f"🌊 Streaming XTTS inference ({len(segments)} segments)")
+            sample_rate = self._output_sample_rate(tts)
+            async for samples in self._xtts_stream(tts, model_name, segments, latents):
+                yield samples, sample_rate
+            return
+
+        # Chunk-wise fallback: hold back the crossfade tail of each segment until the next one is ready
+        tail = None
+        async for _, wav_bytes in self.synthesize_segments(segments, model_name, device, reference_wav_path):
+            samples, sample_rate = decode_wav(wav_bytes)
+            overlap = int(sample_rate * config.TTS_CROSSFADE_MS / 1000)
+            if tail is not None:
+                samples = crossfade_concat([tail, samples], overlap)
+            cut = max(len(samples) - overlap, 0)
+            if cut:
+                yield samples[:cut], sample_rate
+            tail = samples[cut:]
+        if tail is not None and len(tail):
+            yield tail, sample_rate
+
+    def _stream_setup_sync(self, model_name: str, device: str, reference_wav_path: str = None):
+        """Resident model and speaker latents for a streaming request (blocking)"""
+        tts = self.get_model(model_name, device)
+        return tts, self._speaker_latents(tts, model_name, reference_wav_path)
+
+    async def _xtts_stream(self, tts, model_name: str, segments: List[str], latents):
+        """Run XTTS inference_stream on a worker thread and yield its audio chunks on the event loop"""
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        stop = threading.Event()
+
+        def produce():
+            gpt_cond_latent, speaker_embedding = latents
+            xtts = self._xtts_model(tts)
+            for segment in segments:
+                # Held per segment so other requests can interleave on the same model
+                with self._model_lock(tts):
+                    for chunk in xtts.inference_stream(
+                        segment, self._get_language_code(model_name), gpt_cond_latent, speaker_embedding
+                    ):
+                        if stop.is_set():
+                            return  # consumer went away
+                        if hasattr(chunk, "cpu"):
+                            chunk = chunk.cpu().numpy()
+                        loop.call_soon_threadsafe(chunks.put_nowait, np.asarray(chunk, dtype=np.float32).squeeze())
+
+        # A stream holds its worker for the whole text: bound it by the stream limit, and each
+        # chunk by the per-request timeout
+        job = asyncio.ensure_future(self.worker_pool.run(produce, timeout=config.TTS_STREAM_TIMEOUT))
+        job.add_done_callback(lambda _: chunks.put_nowait(None))
+        try:
+            while True:
+                samples = await asyncio.wait_for(chunks.get(), config.TTS_REQUEST_TIMEOUT)
+                if samples is None:
+                    break
+                yield samples
+            await job  # surface inference errors
+        finally:
+            stop.set()
+            if not job.done():
+                job.cancel()
+
+    async def synthesize_segments(self, segments: List[str], model_name: str = None, device: str = None,
+                                  reference_wav_path: str = None):
+        """Synthesize segments on the worker pool, yielding (index, wav_bytes) in text order
+
+        All segments run on the same resident model, whose inference lock lets one through at a time,
+        so a single text is synthesized segment after segment rather than in parallel (a model replica
+        per worker would multiply its memory). Each segment is yielded as soon as it and all earlier
+        ones are done, so callers can start delivering audio before the whole text has been synthesized.
+        """
+        # Keep one segment queued behind the running one instead of parking every worker on the model lock
+        limit = asyncio.Semaphore(min(self.worker_pool.max_workers, 2))
+        # Fragments of a longer text would only crowd real repeat phrases out of the audio cache
+        cache = len(segments) == 1
+
+        async def synthesize(segment):
+            async with limit:
+                return await self.synthesize_segment(segment, model_name, device, reference_wav_path, cache=cache)
+
+        tasks = [asyncio.create_task(synthesize(segment)) for segment in segments]
+        try:
+            for index, task in enumerate(tasks):
+                yield index, await task
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # mark as retrieved; the first failure was already raised
+
+    def _assemble_speech_sync(self, parts: List[bytes], cache_key: str, language: str, format: str):
+        """Crossfade synthesized WAV segments into one output file (blocking)"""
+        decoded = [decode_wav(part) for part in parts]
+        sample_rate = decoded[0][1]
+        samples = crossfade_concat(
+            [samples for samples, _ in decoded], int(sample_rate * config.TTS_CROSSFADE_MS / 1000)
+        )
+        work_id = uuid.uuid4().hex
+        output_path = os.path.join(self.audios_path, f"tts_{work_id}.part.wav")
+        try:
+            with open(output_path, "wb") as f:
+                f.write(encode_wav(samples, sample_rate))
+            return self._publish_speech(output_path, work_id, cache_key, language, format)
+        finally:
+            remove_file(output_path)
+
+    def _publish_speech(self, output_path: str, work_id: str, cache_key: str, language: str, format: str):
+        """Convert a finished WAV work file to the requested format and move it to its final name"""
+        produced_format = "wav"
+        if format != "wav":
+            try:
+                from pydub import AudioSegment
+                audio = AudioSegment.from_wav(output_path)
+                converted_path = output_path.replace('.wav', f'.{format}')
+                audio.export(converted_path, format=format)
+                os.remove(output_path)
+                output_path = converted_path
+                produced_format = format
+                logger.info(f"✅ Audio converted to {format}")
+
+            except ImportError:
+                logger.warning(f"⚠️ pydub not available, returning WAV format")
+            except Exception as e:
+                logger.error(f"❌ Format conversion error: {e}")
+                remove_file(output_path.replace('.wav', f'.{format}'))
+
+        # Publish under the content-addressed name (only if the requested format was produced)
+        cacheable = config.TTS_CACHE_ENABLED and produced_format == format
+        filename = self.audio_cache.filename(cache_key, format) if cacheable else f"tts_{work_id}.{format}"
+        final_path = os.path.join(self.audios_path, filename)
+        os.replace(output_path, final_path)
+        if cacheable:
+            self.audio_cache.put(cache_key, final_path)
+
+        logger.info(f"✅ TTS generation completed: {filename}")
+        return self._speech_result(final_path, language, format)
+
+    def _speech_result(self, path: str, language: str, format: str, cached: bool = False):
+        result = {
+            "success": True,
+            "filename": os.path.basename(path),
+            "filepath": path,
+            "url": f"/api/tts/audio/{os.path.basename(path)}",
+            "model_used": language,
+            "format": format
+        }
+        if cached:
+            result["cached"] = True
+        return result
+
+    async def synthesize_segment(self, text: str, model_name: str = None, device: str = None,
+                                 reference_wav_path: str = None, cache: bool = True) -> bytes:
+        """Synthesize a short text segment to in-memory WAV bytes on the worker pool"""
+        return await self.worker_pool.run(
+            self._synthesize_wav_sync,
+            text,
+            model_name or config.TTS_DEFAULT_MODEL,
+            device or config.TTS_DEFAULT_DEVICE,
+            reference_wav_path,
+            cache
+        )
+
+    def _synthesize_wav_sync(self, text: str, model_name: str, device: str,
+                             reference_wav_path: str = None, cache: bool = True) -> bytes:
+        """Synthesize text with a resident model and encode it as WAV (blocking)
+
+        cache=False still reuses a cached result but doesn't store a new one.
+        """
+        cache_key = self.audio_cache.key(
+            text, model_name, self._get_language_code(model_name),
+            self._speaker_hash(model_name, reference_wav_path), "wav"
+        )
+        cached_path = self.audio_cache.get(cache_key)
+        if cached_path:
+            with open(cached_path, "rb") as f:
+                return f.read()
+
+        tts = self.get_model(model_name, device)
+        with self._model_lock(tts):
+            latents = self._speaker_latents(tts, model_name, reference_wav_path)
+            samples = None
+            if latents is not None:
+                try:
+                    samples = self._xtts_inference(tts, model_name, text, latents)
+                except Exception as e:
+                    logger.warning(f"⚠️ Inference with conditioning latents failed, retrying with speaker_wav: {e}")
+            if samples is None:
+                samples = tts.tts(text=text, **self._speaker_kwargs(model_name, reference_wav_path))
+        wav_bytes = encode_wav(samples, self._output_sample_rate(tts))
+
+        if cache and config.TTS_CACHE_ENABLED:
+            path = os.path.join(self.audios_path, self.audio_cache.filename(cache_key, "wav"))
+            tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+            with open(tmp_path, "wb") as f:
+                f.write(wav_bytes)
+            os.replace(tmp_path, path)
+            self.audio_cache.put(cache_key, path)
+        return wav_bytes
+
+    def _speaker_kwargs(self, model_name: str, reference_wav_path: str = None) -> dict:
+        """Speaker/language arguments for a synthesis call"""
+        if model_name not in self.VOICE_CLONING_MODELS:
+            return {}
+        kwargs = {"language": self._get_language_code(model_name)}
+        speaker_wav = reference_wav_path or (
+            self.default_speaker_path if os.path.exists(self.default_speaker_path) else None
+        )
+        if speaker_wav:
+            kwargs["speaker_wav"] = [speaker_wav]
+        return kwargs
+
+    def _output_sample_rate(self, tts) -> int:
+        """Output sample rate of a loaded Coqui model"""
+        try:
+            return int(tts.synthesizer.output_sample_rate)
+        except Exception:
+            return 22050
+
+    def _xtts_model(self, tts):
+        """Underlying XTTS model if this Coqui model supports precomputed conditioning latents"""
+        model = getattr(getattr(tts, "synthesizer", None), "tts_model", None)
+        if model is not None and hasattr(model, "get_conditioning_latents") and hasattr(model, "inference"):
+            return model
+        return None
+
+    def _latents_path(self, digest: str) -> str:
+        return os.path.join(self.reference_audios_path, f"latents_{digest[:32]}.npz")
+
+    def get_conditioning_latents(self, tts, reference_wav_path: str = None):
+        """(gpt_cond_latent, speaker_embedding) for a reference WAV: memory, then disk, then computed once"""
+        xtts = self._xtts_model(tts)
+        if xtts is None or not reference_wav_path or not os.path.exists(reference_wav_path):
+            return None
+        digest = self.audio_cache.hash_file(reference_wav_path)
+        key = (digest, str(getattr(xtts, "device", "cpu")))
+
+        with self._latents_lock:
+            latents = self._latents.get(key)
+            if latents is not None:
+                self._latents.move_to_end(key)
+                return latents
+
+        latents = self._load_latents(xtts, digest)
+        if latents is None:
+            with self._model_lock(tts):
+                latents = self._compute_latents(xtts, reference_wav_path, digest)
+        with self._latents_lock:
+            self._latents[key] = latents
+            self._latents.move_to_end(key)
+            while len(self._latents) > max(config.TTS_LATENT_CACHE_SIZE, 1):
+                self._latents.popitem(last=False)
+        return latents
+
+    def _load_latents(self, xtts, digest: str):
+        path = self._latents_path(digest)
+        if not os.path.exists(path):
+            return None
+        try:
+            import torch
+            with np.load(path) as data:
+                if str(data["reference_sha256"]) != digest:
+                    return None
+                device = getattr(xtts, "device", "cpu")
+                return (
+                    torch.from_numpy(data["gpt_cond_latent"]).to(device),
+                    torch.from_numpy(data["speaker_embedding"]).to(device)
+                )
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load conditioning latents {os.path.basename(path)}: {e}")
+            return None
+
+    def _compute_latents(self, xtts, reference_wav_path: str, digest: str):
+        """Run the XTTS speaker encoder once and persist the result as a small .npz"""
+        start = time.time()
+        gpt_cond_latent, speaker_embedding = xtts.get_conditioning_latents(audio_path=[reference_wav_path])
+        path = self._latents_path(digest)
+        try:
+            tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    gpt_cond_latent=gpt_cond_latent.detach().cpu().numpy(),
+                    speaker_embedding=speaker_embedding.detach().cpu().numpy(),
+                    reference_sha256=np.array(digest)
+                )
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not persist conditioning latents: {e}")
+        logger.info(f"🎭 Conditioning latents computed for {os.path.basename(reference_wav_path)} in {time.time() - start:.2f}s")
+        return gpt_cond_latent, speaker_embedding
+
+    def _xtts_inference(self, tts, model_name: str, text: str, latents) -> np.ndarray:
+        """Synthesize with precomputed latents, skipping the per-call reference processing"""
+        gpt_cond_latent, speaker_embedding = latents
+        out = self._xtts_model(tts).inference(
+            text, self._get_language_code(model_name), gpt_cond_latent, speaker_embedding,
+            enable_text_splitting=True
+        )
+        wav = out["wav"]
+        if hasattr(wav, "cpu"):
+            wav = wav.cpu().numpy()
+        return np.asarray(wav).squeeze()
+
+    def _speaker_latents(self, tts, model_name: str, reference_wav_path: str = None):
+        """Latents for the voice a call will use, or None to fall back to speaker_wav synthesis"""
+        if model_name not in self.VOICE_CLONING_MODELS:
+            return None
+        speaker_wav = reference_wav_path or (
+            self.default_speaker_path if os.path.exists(self.default_speaker_path) else None
+        )
+        try:
+            return self.get_conditioning_latents(tts, speaker_wav)
+        except Exception as e:
+            logger.warning(f"⚠️ Conditioning latents unavailable, using speaker_wav: {e}")
+            return None
+
+    def start_latents_precompute(self):
+        """Precompute profile latents on a background thread (may load each profile's model)"""
+        self._precompute_task = asyncio.create_task(asyncio.to_thread(self.precompute_profile_latents))
+
+    def precompute_profile_latents(self, profiles: List[dict] = None):
+        """Compute and persist conditioning latents for profiles with reference audio (blocking)"""
+        updated = False
+        for profile in profiles if profiles is not None else self.profiles:
+            reference = profile.get("reference_audio")
+            model_name = profile.get("modelo") or config.TTS_DEFAULT_MODEL
+            if not reference or not os.path.exists(reference) or model_name not in self.VOICE_CLONING_MODELS:
+                continue
+            try:
+                tts = self.get_model(model_name, config.TTS_DEFAULT_DEVICE)
+                if self.get_conditioning_latents(tts, reference) is None:
+                    continue
+                latents_file = os.path.basename(self._latents_path(self.audio_cache.hash_file(reference)))
+                if profile.get("conditioning_latents") != latents_file:
+                    profile["conditioning_latents"] = latents_file
+                    updated = True
+            except ImportError:
+                return
+            except Exception as e:
+                logger.error(f"❌ Could not precompute latents for profile '{profile.get('nome')}': {e}")
+        if updated:
+            self.save_profiles()
+
+    def ingest_reference_audio(self, data: bytes) -> Optional[str]:
+        """Store an uploaded voice sample once per content hash as normalized WAV and return its path.
+
+        Repeat uploads reuse the stored file (and, through its hash, its conditioning latents).
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.reference_audios_path, f"ref_{digest[:32]}.wav")
+        with self._reference_lock:
+            if os.path.exists(path):
+                os.utime(path)  # recently used - keep it past the garbage collector's grace period
+                logger.info(f"♻️ Reusing stored reference audio: {os.path.basename(path)}")
+                return path
+
+        try:
+            from pydub import AudioSegment
+            from pydub.silence import detect_leading_silence
+        except ImportError:
+            logger.warning("⚠️ pydub not available for audio conversion")
+            return None
+
+        # Normalize: mono, fixed sample rate, leading/trailing silence trimmed, bounded length
+        audio = AudioSegment.from_file(io.BytesIO(data))
+        audio = audio.set_channels(1).set_frame_rate(config.TTS_REFERENCE_SAMPLE_RATE)
+        start = detect_leading_silence(audio, silence_threshold=-45.0)
+        end = len(audio) - detect_leading_silence(audio.reverse(), silence_threshold=-45.0)
+        if end - start > 500:
+            audio = audio[start:end]
+        audio = audio[:config.TTS_REFERENCE_MAX_SECONDS * 1000]
+
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        audio.export(tmp_path, format="wav")
+        with self._reference_lock:
+            os.replace(tmp_path, path)
+        logger.info(f"✅ Reference audio stored: {os.path.basename(path)} ({len(audio) / 1000:.1f}s)")
+
+        if time.time() - self._last_reference_gc > config.TTS_REFERENCE_GC_INTERVAL_HOURS * 3600:
+            self.collect_reference_garbage()
+        return path
+
+    def collect_reference_garbage(self) -> Dict[str, int]:
+        """Delete uploaded reference WAVs no profile uses (after a grace period) and orphaned latents"""
+        with self._reference_lock:
+            self._last_reference_gc = time.time()
+            grace = config.TTS_REFERENCE_TTL_HOURS * 3600
+            referenced = {os.path.abspath(p["reference_audio"]) for p in self.profiles if p.get("reference_audio")}
+            referenced.add(os.path.abspath(self.default_speaker_path))
+
+            removed = {"reference_audios": 0, "latents": 0}
+            live_hashes = set()
+            try:
+                names = os.listdir(self.reference_audios_path)
+            except OSError as e:
+                logger.error(f"Error collecting reference audio garbage: {e}")
+                return removed
+
+            for name in names:
+                path = os.path.join(self.reference_audios_path, name)
+                try:
+                    age = self._last_reference_gc - os.path.getmtime(path)
+                    if name.endswith(".part") and age > 3600:
+                        os.remove(path)  # abandoned partial write
+                    elif name.startswith("ref_") and name.endswith(".wav") and \
+                            os.path.abspath(path) not in referenced and age > grace:
+                        os.remove(path)
+                        removed["reference_audios"] += 1
+                    elif name.endswith(".wav"):
+                        live_hashes.add(self.audio_cache.hash_file(path))
+                except OSError:
+                    continue  # removed by someone else meanwhile
+
+            # Profiles may still point at legacy files outside reference_audios/
+            for path in referenced:
+                try:
+                    live_hashes.add(self.audio_cache.hash_file(path))
+                except OSError:
+                    continue
+            live_hashes = {digest[:32] for digest in live_hashes if digest}
+
+            for name in names:
+                if name.startswith("latents_") and name.endswith(".npz") and \
+                        name[len("latents_"):-len(".npz")] not in live_hashes:
+                    try:
+                        os.remove(os.path.join(self.reference_audios_path, name))
+                        removed["latents"] += 1
+                    except OSError:
+                        continue
+
+        if any(removed.values()):
+            logger.info(f"🧹 Removed {removed['reference_audios']} unused reference audios and {removed['latents']} latents files")
+        return removed
+
+    def delete_profile(self, profile_id: str) -> bool:
+        """Remove a profile and any reference audio / latents only it was using"""
+        with self._reference_lock:
+            profile = next((p for p in self.profiles if p["id"] == profile_id), None)
+            if profile is None:
+                return False
+            self.profiles.remove(profile)
+            self.save_profiles()
+
+            reference = profile.get("reference_audio")
+            if reference and os.path.exists(reference) and \
+                    os.path.dirname(os.path.abspath(reference)) == os.path.abspath(self.reference_audios_path) and \
+                    not any(p.get("reference_audio") == reference for p in self.profiles):
+                os.remove(reference)
+            self.collect_reference_garbage()
+        return True
+
+    def _speaker_hash(self, model_name: str, reference_wav_path: str = None) -> Optional[str]:
+        """Identity of the voice a synthesis call will use (part of the audio cache key)"""
+        if model_name not in self.VOICE_CLONING_MODELS:
+            return None
+        return self.audio_cache.hash_file(reference_wav_path or self.default_speaker_path)
+
+    def get_profile_reference(self, profile_id: str = None):
+        """Reference audio path of a voice profile, if it has one"""
+        if not profile_id:
+            return None
+        for profile in self.profiles:
+            if profile["id"] == profile_id and profile.get("reference_audio"):
+                return profile["reference_audio"]
+        return None
+
     def _get_language_code(self, model_name: str) -> str:
         """Convert model name to language code with enhanced mapping"""
         model_to_lang = {
@@ -926,18 +4179,12 @@ class TTSService:
                 "ativo": True
             }
 
-            # Save reference audio if provided
+            # Save reference audio if provided (shared with identical earlier uploads)
             if reference_audio:
-                ref_filename = f"profile_{profile['id']}.wav"
-                ref_path = os.path.join(self.reference_audios_path, ref_filename)
-
                 try:
-                    from pydub import AudioSegment
-                    import io
-
-                    audio = AudioSegment.from_file(io.BytesIO(reference_audio))
-                    audio.export(ref_path, format="wav")
-                    profile["reference_audio"] = ref_path
+                    ref_path = self.ingest_reference_audio(reference_audio)
+                    if ref_path:
+                        profile["reference_audio"] = ref_path
                 except Exception as e:
                     logger.error(f"Error saving reference audio: {e}")
 
@@ -957,7 +4204,16 @@ class TTSService:
 # Initialize services
 llm_service = LLMService()
 db_service = DatabaseService(lazy_load=True)
+session_context = SessionContextCache(db_service)
+db_writer = DatabaseWriteBehind(db_service, session_context)
+history_retention = HistoryRetention(db_service, session_context)
 tts_service = TTSService()
+stt_pool = WorkerPool(
+    "stt",
+    max_workers=config.STT_WORKERS,
+    max_queue=config.STT_MAX_QUEUE,
+    timeout=config.STT_REQUEST_TIMEOUT
+)
 
 # Create FastAPI app
 app = FastAPI(
@@ -987,13 +4243,45 @@ async def startup_event():
         
         # Load Whisper models
         logger.info("🔄 Loading faster-whisper model...")
-        faster_whisper_model = WhisperModel("base", device="cpu", compute_type="int8")
+        # One faster-whisper worker per STT pool thread so concurrent transcriptions run in parallel
+        cpu_threads = config.STT_CPU_THREADS or max(physical_cpu_count() // max(config.STT_WORKERS, 1), 1)
+        faster_whisper_model = WhisperModel(
+            "base",
+            device="cpu",
+            compute_type="int8",
+            cpu_threads=cpu_threads,
+            num_workers=max(config.STT_WORKERS, 1)
+        )
         logger.info("✅ faster-whisper model loaded")
         
         logger.info("🔄 Loading openai-whisper fallback...")
         whisper_model = whisper.load_model("base")
         logger.info("✅ openai-whisper loaded")
+
+        # Pre-warm the default TTS model
+        logger.info(f"🔄 Pre-warming TTS model: {config.TTS_DEFAULT_MODEL}")
+        tts_service.prewarm_default_model()
+        if config.TTS_PREWARM_DEFAULT_MODEL:
+            tts_service.start_latents_precompute()
+        tts_service.collect_reference_garbage()
         
+        # Open pooled LLM HTTP clients
+        await llm_service.startup()
+
+        # Restore persisted LLM responses
+        if config.LLM_CACHE_ENABLED and config.LLM_CACHE_PERSIST:
+            await asyncio.to_thread(llm_service.response_cache.attach, db_service)
+
+        # Load the semantic cache embedding model
+        if config.SEMANTIC_CACHE_ENABLED:
+            await asyncio.to_thread(llm_service.semantic_cache.load)
+
+        # Start batched database logging
+        await db_writer.start()
+
+        # Start periodic history retention
+        await history_retention.start()
+
         # Test services
         logger.info("🔄 Testing services...")
         test_result = await llm_service.generate_response("Hello test", "local")
@@ -1004,6 +4292,18 @@ async def startup_event():
     except Exception as e:
         logger.error(f"❌ Startup error: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release worker pools and other long-lived resources"""
+    logger.info("🛑 Shutting down Enhanced WhatsApp Voice Agent V2")
+    tts_service.worker_pool.shutdown()
+    tts_service.audio_cache.flush()
+    stt_pool.shutdown()
+    await llm_service.shutdown()
+    await history_retention.stop()
+    await db_writer.stop()
+    db_service.close()
+
 # Enhanced API Endpoints
 
 # Root endpoint - serve enhanced interface
@@ -1088,7 +4388,8 @@ async def health_check():
             "database": {
                 "status": "healthy",
                 "type": "sqlite",
-                "path": db_service.db_path
+                "path": db_service.db_path,
+                "schema_version": db_service.get_schema_version()
             }
         },
         "configuration": {
@@ -1100,6 +4401,87 @@ async def health_check():
     
     return health_status
 
+def detect_audio_format(audio_data: bytes, request_id: str):
+    """Detect the container of uploaded audio from its header"""
+    audio_header = audio_data[:32]
+    if audio_header.startswith(b'RIFF'):
+        return 'wav', '.wav'
+    elif audio_header.startswith(b'OggS'):
+        return 'ogg', '.ogg'
+    elif audio_header.startswith(b'\x1a\x45\xdf\xa3') or b'webm' in audio_header[:100]:
+        return 'webm', '.webm'
+    logger.warning(f"⚠️ [{request_id}] Unknown format, assuming WebM")
+    return 'webm', '.webm'
+
+def decode_audio_in_memory(audio_data: bytes) -> np.ndarray:
+    """Decode uploaded audio bytes to a mono float32 16 kHz array without touching disk"""
+    from faster_whisper import decode_audio
+    return decode_audio(io.BytesIO(audio_data), sampling_rate=16000)
+
+def write_temp_audio(audio_data: bytes, file_extension: str) -> str:
+    """Write audio to temp_audio/ for containers PyAV can't decode from a stream"""
+    temp_dir = os.path.join(os.getcwd(), "temp_audio")
+    os.makedirs(temp_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(suffix=file_extension, delete=False, dir=temp_dir) as temp_file:
+        temp_file.write(audio_data)
+    return os.path.normpath(temp_file.name)
+
+def transcribe_audio(audio_data: bytes, file_extension: str, detected_format: str, request_id: str):
+    """Decode and transcribe audio with faster-whisper, falling back to openai-whisper (blocking)"""
+    temp_path = None
+    try:
+        # Decode straight from memory; only spill to disk if the container can't be streamed
+        try:
+            audio_input = decode_audio_in_memory(audio_data)
+            audio_source = "memory"
+        except Exception as decode_error:
+            logger.warning(f"⚠️ [{request_id}] In-memory decode failed ({decode_error}), using temp file")
+            temp_path = write_temp_audio(audio_data, file_extension)
+            audio_input = temp_path
+            audio_source = "disk"
+
+        try:
+            if faster_whisper_model:
+                segments, info = faster_whisper_model.transcribe(
+                    audio_input, 
+                    language="pt"
+                )
+                
+                # Segments are lazy - materialise them here, on the worker thread
+                text_segments = list(segments)
+                transcribed_text = " ".join([segment.text for segment in text_segments]).strip()
+                
+                result = {
+                    "text": transcribed_text,
+                    "language": info.language,
+                    "language_probability": info.language_probability,
+                    "duration": info.duration,
+                    "audio_source": audio_source
+                }
+                
+                logger.info(f"✅ [{request_id}] Transcription successful ({audio_source} decode)")
+                return result, f"faster_whisper_{detected_format}"
+                
+            else:
+                raise Exception("faster-whisper model not available")
+        
+        except Exception as e:
+            logger.warning(f"⚠️ [{request_id}] Trying fallback method")
+            if isinstance(audio_input, np.ndarray):
+                audio_np = audio_input
+            else:
+                audio_np, sr = librosa.load(audio_input, sr=16000)
+            result = whisper_model.transcribe(audio_np, language="pt", fp16=False)
+            result["audio_source"] = audio_source
+            return result, f"librosa_fallback_{detected_format}"
+
+    finally:
+        if temp_path:
+            try:
+                os.unlink(temp_path)
+            except Exception as e:
+                logger.warning(f"Cleanup error: {e}")
+
 # STT endpoint (from original main_simple.py)
 @app.post("/api/stt")
 async def speech_to_text(audio: UploadFile = File(...)):
@@ -1107,8 +4489,6 @@ async def speech_to_text(audio: UploadFile = File(...)):
     request_id = str(uuid.uuid4())[:8]
     logger.info(f"\n🎤 [{request_id}] STT Request started")
     
-    temp_file = None
-    
     try:
         if not faster_whisper_model and not whisper_model:
             logger.error(f"❌ [{request_id}] No Whisper models loaded")
@@ -1122,71 +4502,23 @@ async def speech_to_text(audio: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="Empty audio file")
         
         # Detect format
-        audio_header = audio_data[:32]
-        if audio_header.startswith(b'RIFF'):
-            detected_format = 'wav'
-            file_extension = '.wav'
-        elif audio_header.startswith(b'OggS'):
-            detected_format = 'ogg'
-            file_extension = '.ogg'
-        elif audio_header.startswith(b'\x1a\x45\xdf\xa3') or b'webm' in audio_header[:100]:
-            detected_format = 'webm'
-            file_extension = '.webm'
-        else:
-            detected_format = 'webm'
-            file_extension = '.webm'
-            logger.warning(f"⚠️ [{request_id}] Unknown format, assuming WebM")
-        
-        # Create temp file
-        import tempfile
-        temp_file = tempfile.NamedTemporaryFile(
-            suffix=file_extension, 
-            delete=False,
-            dir=os.path.join(os.getcwd(), "temp_audio")
-        )
-        
-        os.makedirs(os.path.dirname(temp_file.name), exist_ok=True)
-        temp_file.write(audio_data)
-        temp_file.flush()
-        os.fsync(temp_file.fileno())
-        temp_file.close()
-        
-        temp_path = temp_file.name
-        normalized_path = os.path.normpath(temp_path)
+        detected_format, file_extension = detect_audio_format(audio_data, request_id)
         
-        # Transcribe
+        # Transcribe on the STT worker pool
         logger.info(f"🎤 [{request_id}] Starting transcription")
         start_time = time.time()
         
         try:
-            if faster_whisper_model:
-                segments, info = faster_whisper_model.transcribe(
-                    normalized_path, 
-                    language="pt"
-                )
-                
-                text_segments = list(segments)
-                transcribed_text = " ".join([segment.text for segment in text_segments]).strip()
-                
-                result = {
-                    "text": transcribed_text,
-                    "language": info.language,
-                    "language_probability": info.language_probability,
-                    "duration": info.duration
-                }
-                
-                transcription_method = f"faster_whisper_{detected_format}"
-                logger.info(f"✅ [{request_id}] Transcription successful")
-                
-            else:
-                raise Exception("faster-whisper model not available")
-        
-        except Exception as e:
-            logger.warning(f"⚠️ [{request_id}] Trying fallback method")
-            import librosa
-            audio_np, sr = librosa.load(normalized_path, sr=16000)
-            result = whisper_model.transcribe(audio_np, language="pt", fp16=False)
-            transcription_method = f"librosa_fallback_{detected_format}"
+            (result, transcription_method), timings = await stt_pool.run_timed(
+                transcribe_audio, audio_data, file_extension, detected_format, request_id
+            )
+        except WorkerPoolSaturated as e:
+            logger.warning(f"🚦 [{request_id}] STT pool saturated: {e}")
+            raise HTTPException(status_code=503, detail="STT server is busy, please retry shortly",
+                                headers={"Retry-After": "2"})
+        except asyncio.TimeoutError:
+            logger.error(f"⏱️ [{request_id}] Transcription timed out")
+            raise HTTPException(status_code=504, detail=f"Transcription timed out after {config.STT_REQUEST_TIMEOUT:.0f}s")
         
         processing_time = time.time() - start_time
         text = result["text"].strip() if result and "text" in result else ""
@@ -1199,6 +4531,9 @@ async def speech_to_text(audio: UploadFile = File(...)):
             "text": text,
             "confidence": 0.95,
             "processing_time": processing_time,
+            "queue_wait_time": timings["queue_wait_time"],
+            "inference_time": timings["inference_time"],
+            "audio_decode": result.get("audio_source", "memory"),
             "transcription_method": transcription_method,
             "request_id": request_id,
             "timestamp": datetime.now().isoformat()
@@ -1212,14 +4547,6 @@ async def speech_to_text(audio: UploadFile = File(...)):
     except Exception as e:
         logger.error(f"💥 [{request_id}] STT Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"STT processing failed: {str(e)}")
-    
-    finally:
-        if 'temp_file' in locals() and temp_file and hasattr(temp_file, 'name'):
-            try:
-                if os.path.exists(temp_file.name):
-                    os.unlink(temp_file.name)
-            except Exception as e:
-                logger.warning(f"Cleanup error: {e}")
 
 
 
@@ -1285,17 +4612,19 @@ async def chat(request: ChatMessage):
         session_id = request.session_id or str(uuid.uuid4())
         start_time = time.time()
 
-        # Generate AI response
+        # Generate AI response with the session's earlier turns as context
+        history = await session_context.get_context(session_id) if request.session_id else []
         response_text = await llm_service.generate_response(
             message=request.message,
             provider=request.llm_provider,
-            model=request.llm_model
+            model=request.llm_model,
+            history=history
         )
 
         processing_time = time.time() - start_time
 
         # Save to database
-        db_service.save_conversation(
+        db_writer.save_conversation(
             session_id=session_id,
             user_message=request.message,
             assistant_response=response_text,
@@ -1319,6 +4648,210 @@ async def chat(request: ChatMessage):
         logger.error(f"LLM Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(data: dict) -> str:
+    """Format a dict as a server-sent event"""
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# Streaming chat endpoint (server-sent events)
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatMessage):
+    """Chat endpoint that streams the answer as SSE delta events"""
+    session_id = request.session_id or str(uuid.uuid4())
+    start_time = time.time()
+
+    async def event_stream():
+        chunks = []
+        time_to_first_token = None
+
+        history = await session_context.get_context(session_id) if request.session_id else []
+        async for delta in llm_service.stream_response(
+            message=request.message,
+            provider=request.llm_provider,
+            model=request.llm_model,
+            history=history
+        ):
+            if time_to_first_token is None:
+                time_to_first_token = time.time() - start_time
+            chunks.append(delta)
+            yield sse_event({"type": "delta", "delta": delta})
+
+        response_text = "".join(chunks)
+        processing_time = time.time() - start_time
+
+        # Save to database
+        db_writer.save_conversation(
+            session_id=session_id,
+            user_message=request.message,
+            assistant_response=response_text,
+            llm_provider=request.llm_provider or config.DEFAULT_LLM_PROVIDER,
+            llm_model=request.llm_model,
+            processing_time=processing_time
+        )
+
+        yield sse_event({
+            "type": "done",
+            "session_id": session_id,
+            "bot_response": response_text,
+            "processing_time": processing_time,
+            "time_to_first_token": time_to_first_token,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def run_voice_turn(audio_data: bytes, session_id: str, provider: str = None,
+                         tts_model: str = None, device: str = None, profile_id: str = None):
+    """Pipelined voice turn: STT -> streamed LLM answer -> sentence-by-sentence TTS.
+
+    Yields event dicts: transcript, delta, audio (base64 WAV per sentence), error and done.
+    """
+    request_id = str(uuid.uuid4())[:8]
+    start_time = time.time()
+    provider = provider or config.DEFAULT_LLM_PROVIDER
+    reference_wav_path = tts_service.get_profile_reference(profile_id)
+
+    # 1. Transcribe
+    detected_format, file_extension = detect_audio_format(audio_data, request_id)
+    try:
+        (stt_result, _), _ = await stt_pool.run_timed(
+            transcribe_audio, audio_data, file_extension, detected_format, request_id
+        )
+    except WorkerPoolSaturated:
+        yield {"type": "error", "stage": "stt", "error": "STT server is busy, please retry shortly"}
+        return
+    except asyncio.TimeoutError:
+        yield {"type": "error", "stage": "stt", "error": "Transcription timed out"}
+        return
+    except Exception as e:
+        logger.error(f"💥 [{request_id}] Voice turn STT error: {e}")
+        yield {"type": "error", "stage": "stt", "error": str(e)}
+        return
+
+    user_message = (stt_result.get("text") or "").strip()
+    yield {"type": "transcript", "text": user_message, "stt_time": time.time() - start_time}
+    if not user_message:
+        yield {"type": "error", "stage": "stt", "error": "Áudio não foi reconhecido como fala"}
+        return
+
+    # 2./3. Stream the answer and synthesize each sentence as soon as it is complete
+    events = asyncio.Queue()
+    sentences = asyncio.Queue()
+    chunks = []
+    timings = {}
+
+    async def produce_text():
+        chunker = SentenceChunker()
+        try:
+            history = await session_context.get_context(session_id)
+            async for delta in llm_service.stream_response(
+                message=user_message,
+                provider=provider,
+                history=history,
+                hedge=config.LLM_HEDGING != "off"
+            ):
+                timings.setdefault("time_to_first_token", time.time() - start_time)
+                chunks.append(delta)
+                await events.put({"type": "delta", "delta": delta})
+                for sentence in chunker.feed(delta):
+                    await sentences.put(sentence)
+            for sentence in chunker.flush():
+                await sentences.put(sentence)
+        finally:
+            await sentences.put(None)
+
+    async def produce_audio():
+        index = 0
+        try:
+            while True:
+                sentence = await sentences.get()
+                if sentence is None:
+                    break
+                try:
+                    wav_bytes = await tts_service.synthesize_segment(
+                        sentence, tts_model, device, reference_wav_path
+                    )
+                    timings.setdefault("time_to_first_audio", time.time() - start_time)
+                    await events.put({
+                        "type": "audio",
+                        "index": index,
+                        "text": sentence,
+                        "format": "wav",
+                        "audio": base64.b64encode(wav_bytes).decode("ascii")
+                    })
+                except Exception as e:
+                    logger.error(f"❌ [{request_id}] Voice turn TTS error on sentence {index}: {e}")
+                    await events.put({"type": "error", "stage": "tts", "index": index, "error": str(e) or type(e).__name__})
+                index += 1
+        finally:
+            await events.put(None)
+
+    text_task = asyncio.create_task(produce_text())
+    audio_task = asyncio.create_task(produce_audio())
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+    finally:
+        # Client went away mid-turn - stop generating
+        for task in (text_task, audio_task):
+            if not task.done():
+                task.cancel()
+
+    response_text = "".join(chunks)
+    processing_time = time.time() - start_time
+
+    # Save to database
+    db_writer.save_conversation(
+        session_id=session_id,
+        user_message=user_message,
+        assistant_response=response_text,
+        llm_provider=provider,
+        processing_time=processing_time
+    )
+
+    yield {
+        "type": "done",
+        "session_id": session_id,
+        "user_message": user_message,
+        "bot_response": response_text,
+        "processing_time": processing_time,
+        "time_to_first_token": timings.get("time_to_first_token"),
+        "time_to_first_audio": timings.get("time_to_first_audio"),
+        "timestamp": datetime.now().isoformat()
+    }
+
+# Pipelined voice turn endpoint (newline-delimited JSON events)
+@app.post("/api/voice/turn")
+async def voice_turn(
+    audio: UploadFile = File(...),
+    session_id: Optional[str] = Form(None),
+    provider: Optional[str] = Form(None),
+    tts_model: Optional[str] = Form(None),
+    device: Optional[str] = Form(None),
+    profile_id: Optional[str] = Form(None)
+):
+    """Transcribe, answer and speak in a single streamed round trip"""
+    audio_data = await audio.read()
+    if len(audio_data) == 0:
+        raise HTTPException(status_code=400, detail="Empty audio file")
+    session_id = session_id or str(uuid.uuid4())
+
+    async def event_stream():
+        async for event in run_voice_turn(audio_data, session_id, provider, tts_model, device, profile_id):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Gemini test endpoint for manual verification
 @app.post("/api/test/gemini")
 async def test_gemini_endpoint():
@@ -1385,14 +4918,16 @@ async def whatsapp_webhook(message: WhatsAppMessage):
     try:
         logger.info(f"📱 WhatsApp from {message.from_number}: {message.message}")
         
-        # Generate AI response
+        # Generate AI response, continuing this number's conversation
+        history = await session_context.get_context(f"whatsapp:{message.from_number}")
         response_text = await llm_service.generate_response(
             message=message.message,
-            system_prompt="Você é um assistente WhatsApp inteligente. Responda de forma útil e concisa em português brasileiro."
+            system_prompt="Você é um assistente WhatsApp inteligente. Responda de forma útil e concisa em português brasileiro.",
+            history=history
         )
         
         # Save to database
-        db_service.save_whatsapp_message(
+        db_writer.save_whatsapp_message(
             from_number=message.from_number,
             message_text=message.message,
             response_text=response_text,
@@ -1443,36 +4978,34 @@ async def get_conversation_history(session_id: str, limit: int = 10):
 
 # History API endpoints
 @app.get("/api/history/conversations")
-async def get_all_conversations():
-    """Get all conversations with stats"""
+async def get_all_conversations(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    date_start: Optional[str] = None,
+    date_end: Optional[str] = None,
+    provider: Optional[str] = None,
+    source: Optional[str] = None
+):
+    """Get conversations page by page (keyset cursor) with filters and stats"""
     try:
         # Get basic stats
         stats = db_service.get_stats()
         
-        # Get real conversations from database
-        conn = sqlite3.connect(db_service.db_path)
-        cursor = conn.cursor()
-        
-        # Get unique sessions with conversation info
-        cursor.execute("""
-            SELECT 
-                session_id,
-                MIN(user_message) as first_message,
-                COUNT(*) as message_count,
-                MIN(created_at) as created_at,
-                MAX(created_at) as last_activity
-            FROM conversation_logs 
-            GROUP BY session_id 
-            ORDER BY last_activity DESC
-            LIMIT 50
-        """)
-        
-        rows = cursor.fetchall()
-        conn.close()
+        # Sessions from the maintained summary table (index range scan)
+        limit = max(1, min(limit, 200))
+        rows, next_cursor = db_service.list_sessions(
+            limit=limit,
+            cursor=cursor,
+            date_start=date_start,
+            date_end=date_end,
+            provider=provider,
+            source=source
+        )
         
         conversations = []
         for row in rows:
-            session_id, first_message, msg_count, created_at, last_activity = row
+            session_id, first_message, msg_count, created_at, last_activity, session_source, session_provider = row
+            first_message = first_message or ""
             # Create a meaningful title from the first message
             title = (first_message[:30] + "...") if len(first_message) > 30 else first_message
             
@@ -1481,20 +5014,25 @@ async def get_all_conversations():
                 "title": title or "Conversa sem título",
                 "created_at": created_at,
                 "last_activity": last_activity,
-                "source": "web",
+                "source": session_source,
+                "provider": session_provider,
                 "message_count": msg_count
             })
         
         return {
             "success": True,
             "conversations": conversations,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
             "stats": {
                 "total": stats.get("conversations", 0),
-                "total_messages": stats.get("messages", 0),
-                "avg_response_time": 1.2,
-                "today_messages": 0
+                "total_messages": stats.get("messages", 0) + stats.get("whatsapp", 0),
+                "avg_response_time": stats.get("avg_response_time", 0),
+                "today_messages": stats.get("today_messages", 0)
             }
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"History error: {e}")
         return {
@@ -1505,36 +5043,24 @@ async def get_all_conversations():
         }
 
 @app.get("/api/history/conversation/{conversation_id}")
-async def get_conversation_detail(conversation_id: str):
-    """Get detailed conversation data"""
+async def get_conversation_detail(conversation_id: str, limit: int = 100, cursor: Optional[str] = None):
+    """Get detailed conversation data, one page of messages at a time"""
     try:
-        # Get real conversation from database
-        conn = sqlite3.connect(db_service.db_path)
-        cursor = conn.cursor()
-        
-        # Get conversation messages
-        cursor.execute("""
-            SELECT user_message, assistant_response, created_at, llm_provider, llm_model
-            FROM conversation_logs 
-            WHERE session_id = ?
-            ORDER BY created_at ASC
-        """, (conversation_id,))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        if not rows:
+        session = db_service.get_session(conversation_id)
+        if not session:
             raise HTTPException(status_code=404, detail="Conversation not found")
+        _, first_message, message_count, first_activity, _, source, _ = session
+
+        # Get a page of conversation messages
+        limit = max(1, min(limit, 500))
+        rows, next_cursor = db_service.get_session_messages(conversation_id, limit=limit, cursor=cursor)
         
         # Build conversation messages
         messages = []
-        title = "Conversa"
+        first_message = first_message or ""
+        title = ((first_message[:30] + "...") if len(first_message) > 30 else first_message) or "Conversa"
         
-        for i, (user_msg, assistant_msg, created_at, provider, model) in enumerate(rows):
-            if i == 0 and user_msg:
-                # Use first user message as title
-                title = (user_msg[:30] + "...") if len(user_msg) > 30 else user_msg
-            
+        for user_msg, assistant_msg, created_at, provider, model, _ in rows:
             # Add user message
             if user_msg:
                 messages.append({
@@ -1556,15 +5082,20 @@ async def get_conversation_detail(conversation_id: str):
         conversation = {
             "id": conversation_id,
             "title": title,
-            "created_at": rows[0][2] if rows else datetime.now().isoformat(),
-            "source": "web",
+            "created_at": first_activity,
+            "source": source,
+            "message_count": message_count,
             "messages": messages
         }
         
         return {
             "success": True,
-            "conversation": conversation
+            "conversation": conversation,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Conversation detail error: {e}")
         return {
@@ -1572,29 +5103,144 @@ async def get_conversation_detail(conversation_id: str):
             "error": str(e)
         }
 
+def export_chunks(rows, format: str):
+    """Serialize export rows incrementally as NDJSON, CSV or a JSON document"""
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=DatabaseService.EXPORT_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    elif format == "json":
+        # Same top-level shape the UI downloads, written without materializing the list
+        yield f'{{"export_date": {json.dumps(datetime.now().isoformat())}, "conversations": ['
+        count = 0
+        for row in rows:
+            yield ("," if count else "") + json.dumps(row, ensure_ascii=False)
+            count += 1
+        yield f'], "total_conversations": {count}}}'
+
+    else:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+def gzip_chunks(chunks):
+    """Gzip-compress a stream of text chunks on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+async def stream_export(chunks, rows):
+    """Iterate export chunks in the threadpool (SQLite reads stay off the event loop) and always
+    close the row generator - and with it its SQLite connection - even if the client disconnects"""
+    try:
+        async for chunk in iterate_in_threadpool(chunks):
+            yield chunk
+    finally:
+        rows.close()
+
 @app.get("/api/history/export")
-async def export_history():
-    """Export conversation history"""
+async def export_history(
+    format: str = "ndjson",
+    compress: bool = False,
+    date_start: Optional[str] = None,
+    date_end: Optional[str] = None,
+    source: Optional[str] = None
+):
+    """Stream conversation and WhatsApp history as NDJSON, CSV or JSON (optionally gzipped)"""
+    format = format.lower()
+    media_types = {
+        "ndjson": "application/x-ndjson",
+        "csv": "text/csv; charset=utf-8",
+        "json": "application/json"
+    }
+    if format not in media_types:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+
+    rows = db_service.iter_export_rows(date_start=date_start, date_end=date_end, source=source)
+    chunks = export_chunks(rows, format)
+    filename = f"conversation_history_{datetime.now().strftime('%Y-%m-%d')}.{format}"
+    media_type = media_types[format]
+
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    logger.info(f"📤 History export started: format={format}, compress={compress}, source={source or 'all'}")
+    return StreamingResponse(
+        stream_export(chunks, rows),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/history/search")
+async def search_history(q: str, limit: int = 20, offset: int = 0, source: Optional[str] = None):
+    """Full-text search over conversation history with ranking, snippets and pagination"""
     try:
-        # Mock export data
-        export_data = {
-            "export_date": datetime.now().isoformat(),
-            "conversations": [],
-            "total_conversations": 0
+        if not db_service.has_full_text_search():
+            raise HTTPException(status_code=503, detail="Full-text search is not available in this SQLite build")
+
+        limit = max(1, min(limit, 100))
+        offset = max(offset, 0)
+        results, has_more = db_service.search_messages(q, limit=limit, offset=offset, source=source)
+
+        return {
+            "success": True,
+            "query": q,
+            "results": results,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": offset + limit if has_more else None,
+            "has_more": has_more
         }
-        
-        return export_data
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Export error: {e}")
-        return {"success": False, "error": str(e)}
+        logger.error(f"History search error: {e}")
+        return {"success": False, "error": str(e), "results": []}
 
 @app.delete("/api/history/clear")
-async def clear_history():
-    """Clear conversation history"""
+async def clear_history(
+    session_id: Optional[str] = None,
+    older_than_days: Optional[int] = None,
+    before: Optional[str] = None,
+    source: Optional[str] = None
+):
+    """Clear conversation history (everything, or only rows matching the filters)"""
     try:
-        # Mock clear operation
-        logger.info("History clear requested")
-        return {"success": True, "message": "History cleared"}
+        if older_than_days is not None:
+            if older_than_days < 0:
+                raise HTTPException(status_code=400, detail="older_than_days must be >= 0")
+            cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).strftime("%Y-%m-%d %H:%M:%S")
+            before = min(before, cutoff) if before else cutoff
+
+        logger.info(f"History clear requested (session={session_id}, before={before}, source={source})")
+        deleted = await asyncio.to_thread(
+            db_service.purge_history,
+            session_id=session_id,
+            before=before,
+            source=source
+        )
+        session_context.invalidate(session_id)
+        vacuum = await asyncio.to_thread(db_service.reclaim_space)
+        return {
+            "success": True,
+            "message": "History cleared",
+            "deleted": deleted,
+            "vacuum": vacuum
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Clear history error: {e}")
         return {"success": False, "error": str(e)}
@@ -1626,14 +5272,29 @@ async def websocket_endpoint(websocket: WebSocket):
             if message_data["type"] == "chat":
                 user_message = message_data["message"]
                 provider = message_data.get("provider", config.DEFAULT_LLM_PROVIDER)
+                start_time = time.time()
+                time_to_first_token = None
 
-                response = await llm_service.generate_response(
+                # Stream incremental deltas, then send the full response frame
+                chunks = []
+                history = await session_context.get_context(session_id)
+                async for delta in llm_service.stream_response(
                     message=user_message,
-                    provider=provider
-                )
+                    provider=provider,
+                    history=history
+                ):
+                    if time_to_first_token is None:
+                        time_to_first_token = time.time() - start_time
+                    chunks.append(delta)
+                    await websocket.send_text(json.dumps({
+                        "type": "delta",
+                        "delta": delta,
+                        "provider": provider
+                    }))
+                response = "".join(chunks)
 
                 # Save to database
-                db_service.save_conversation(
+                db_writer.save_conversation(
                     session_id=session_id,
                     user_message=user_message,
                     assistant_response=response,
@@ -1645,12 +5306,59 @@ async def websocket_endpoint(websocket: WebSocket):
                     "type": "response",
                     "message": response,
                     "provider": provider,
+                    "processing_time": time.time() - start_time,
+                    "time_to_first_token": time_to_first_token,
                     "timestamp": datetime.now().isoformat()
                 }
 
                 await websocket.send_text(json.dumps(response_data))
                 
                 logger.info(f"🔌 WebSocket chat processed: {user_message[:30]}...")
+
+            elif message_data["type"] == "voice_turn":
+                # Base64 encoded recording in, streamed transcript/delta/audio frames out
+                audio_data = base64.b64decode(message_data["audio"])
+                async for event in run_voice_turn(
+                    audio_data,
+                    session_id,
+                    provider=message_data.get("provider"),
+                    tts_model=message_data.get("tts_model"),
+                    device=message_data.get("device"),
+                    profile_id=message_data.get("profile_id")
+                ):
+                    await websocket.send_text(json.dumps(event, ensure_ascii=False))
+
+                logger.info(f"🔌 WebSocket voice turn processed: {session_id}")
+
+            elif message_data["type"] == "tts_stream":
+                # Text in, raw PCM binary frames out between tts_start / tts_end text frames
+                reference_data = base64.b64decode(message_data["voice_sample"]) if message_data.get("voice_sample") else None
+                frames = 0
+                try:
+                    async for samples, sample_rate in tts_service.stream_speech(
+                        message_data.get("text", ""),
+                        model_name=message_data.get("tts_model"),
+                        device=message_data.get("device"),
+                        reference_audio=reference_data,
+                        profile_id=message_data.get("profile_id")
+                    ):
+                        if frames == 0:
+                            await websocket.send_text(json.dumps({
+                                "type": "tts_start",
+                                "format": "pcm_s16le",
+                                "channels": 1,
+                                "sample_rate": sample_rate
+                            }))
+                        await websocket.send_bytes(pcm16(samples))
+                        frames += 1
+                    await websocket.send_text(json.dumps({"type": "tts_end", "frames": frames}))
+                except WebSocketDisconnect:
+                    raise
+                except Exception as e:
+                    logger.error(f"❌ WebSocket TTS stream error: {e}")
+                    await websocket.send_text(json.dumps({"type": "error", "stage": "tts", "error": str(e) or type(e).__name__}))
+
+                logger.info(f"🔌 WebSocket TTS stream processed: {frames} frames")
                 
     except WebSocketDisconnect:
         active_connections.remove(websocket)
@@ -1668,7 +5376,18 @@ async def get_system_status():
         "services": {
             "whisper_stt": "loaded" if whisper_model and faster_whisper_model else "error",
             "llm_service": "ready",
-            "database": "ready"
+            "database": "ready",
+            "database_writer": db_writer.status(),
+            "history_retention": history_retention.status(),
+            "session_context": session_context.status(),
+            "llm_response_cache": llm_service.response_cache.status(),
+            "llm_semantic_cache": llm_service.semantic_cache.status(),
+            "llm_providers": llm_service.health.status(),
+            "llm_hedging": llm_service.hedging_status(),
+            "tts": tts_service.get_model_registry_status(),
+            "tts_audio_cache": tts_service.audio_cache.status(),
+            "tts_pool": tts_service.worker_pool.status(),
+            "stt_pool": stt_pool.status()
         },
         "configuration": {
             "default_llm_provider": config.DEFAULT_LLM_PROVIDER,
@@ -1721,9 +5440,10 @@ async def generate_tts_audio(
     format: str = Form("wav", alias="format"),
     device: str = Form("cpu", alias="device"),
     profile_id: Optional[str] = Form(None, alias="profile_id"),
-    voice_sample: Optional[UploadFile] = File(None, alias="voice_sample")
+    voice_sample: Optional[UploadFile] = File(None, alias="voice_sample"),
+    stream: bool = Form(False, alias="stream")
 ):
-    """Generate TTS audio with voice cloning support"""
+    """Generate TTS audio with voice cloning support (stream=true returns the audio itself as chunked WAV)"""
     try:
         logger.info(f"🎵 TTS Request: {len(text)} chars, model: {language}")
 
@@ -1733,13 +5453,11 @@ async def generate_tts_audio(
             reference_data = await voice_sample.read()
             logger.info(f"🎤 Voice sample uploaded: {voice_sample.filename}")
 
+        if stream:
+            return await stream_tts_audio(text, language, format, device, reference_data, profile_id)
+
         # Find profile if profile_id is provided
-        reference_audio_path = None
-        if profile_id:
-            for profile in tts_service.profiles:
-                if profile["id"] == profile_id and profile.get("reference_audio"):
-                    reference_audio_path = profile["reference_audio"]
-                    break
+        reference_audio_path = tts_service.get_profile_reference(profile_id)
 
         # Generate audio
         result = await tts_service.generate_speech(
@@ -1747,7 +5465,8 @@ async def generate_tts_audio(
             language=language,
             format=format,
             device=device,
-            reference_audio=reference_data or reference_audio_path
+            reference_audio=reference_data,
+            profile_id=profile_id
         )
 
         if result["success"]:
@@ -1758,7 +5477,8 @@ async def generate_tts_audio(
                 "model_used": result["model_used"],
                 "format": result["format"],
                 "language_used": tts_service._get_language_code(language),
-                "generation_time": datetime.now().isoformat()
+                "generation_time": datetime.now().isoformat(),
+                "cached": result.get("cached", False)
             }
 
             # Add reference info if used
@@ -1782,12 +5502,56 @@ async def generate_tts_audio(
             elif "text" in error_detail.lower() and ("empty" in error_detail.lower() or "none" in error_detail.lower()):
                 error_detail = "The text to synthesize cannot be empty. Please provide text to convert to speech."
 
-            raise HTTPException(status_code=500, detail=error_detail)
+            status_code = result.get("status_code", 500)
+            headers = {"Retry-After": "5"} if status_code == 503 else None
+            raise HTTPException(status_code=status_code, detail=error_detail, headers=headers)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"TTS API error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def stream_tts_audio(text: str, language: str, format: str, device: str, reference_data: bytes = None,
+                           profile_id: str = None):
+    """Chunked WAV response that starts playing as soon as the first audio chunk is synthesized"""
+    if format != "wav":
+        raise HTTPException(status_code=400, detail=f"Streaming only supports WAV output (requested '{format}')")
+    if not text or not text.strip():
+        raise HTTPException(status_code=400, detail="The text to synthesize cannot be empty. Please provide text to convert to speech.")
+
+    pieces = tts_service.stream_speech(text, language, device, reference_data, profile_id)
+    try:
+        first_samples, sample_rate = await pieces.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=500, detail="TTS produced no audio")
+    except WorkerPoolSaturated as e:
+        logger.warning(f"🚦 TTS pool saturated: {e}")
+        raise HTTPException(status_code=503, detail="TTS server is busy, please retry shortly", headers={"Retry-After": "5"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"TTS generation timed out after {config.TTS_REQUEST_TIMEOUT:.0f}s")
+
+    async def body():
+        total = len(first_samples)
+        try:
+            yield wav_stream_header(sample_rate)
+            yield pcm16(first_samples)
+            async for samples, _ in pieces:
+                total += len(samples)
+                yield pcm16(samples)
+            logger.info(f"✅ TTS stream completed: {total / sample_rate:.1f}s of audio")
+        except Exception as e:
+            # Headers are already sent - end the stream early
+            logger.error(f"❌ TTS stream error: {e}")
+        finally:
+            await pieces.aclose()
+
+    return StreamingResponse(body(), media_type="audio/wav", headers={
+        "Cache-Control": "no-cache",
+        "X-TTS-Model": language,
+        "X-Sample-Rate": str(sample_rate)
+    })
+
 @app.get("/api/tts/audio/{filename}")
 async def get_tts_audio(filename: str):
     """Serve generated TTS audio files"""
@@ -1833,6 +5597,12 @@ async def save_tts_profile(
         )
 
         if result["success"]:
+            # Compute the voice's conditioning latents once, up front (otherwise done on first use)
+            if result["profile"].get("reference_audio"):
+                try:
+                    await tts_service.worker_pool.run(tts_service.precompute_profile_latents, [result["profile"]])
+                except (WorkerPoolSaturated, asyncio.TimeoutError) as e:
+                    logger.warning(f"⚠️ Deferring conditioning latents for new profile: {e!r}")
             return result
         else:
             raise HTTPException(status_code=500, detail=result["error"])
@@ -1845,21 +5615,8 @@ async def save_tts_profile(
 async def delete_tts_profile(profile_id: str):
     """Delete a voice profile"""
     try:
-        # Find and remove profile
-        profile_to_remove = None
-        for profile in tts_service.profiles:
-            if profile["id"] == profile_id:
-                profile_to_remove = profile
-                break
-
-        if profile_to_remove:
-            # Remove reference audio file if exists
-            if profile_to_remove.get("reference_audio") and os.path.exists(profile_to_remove["reference_audio"]):
-                os.remove(profile_to_remove["reference_audio"])
-
-            tts_service.profiles.remove(profile_to_remove)
-            tts_service.save_profiles()
-
+        # Remove the profile and any reference audio / latents no other profile shares
+        if tts_service.delete_profile(profile_id):
             return {"success": True, "message": "Profile deleted"}
         else:
             raise HTTPException(status_code=404, detail="Profile not found")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Stub HTTP server standing in for the OpenRouter and Gemini APIs.
+
+Serves /openrouter/chat/completions and /gemini/models/<model>:generateContent /
+:streamGenerateContent (regular JSON and server-sent events) so LLMService can be
+exercised locally without API keys. Point the backend at it with
+
+    OPENROUTER_BASE_URL=http://127.0.0.1:8090/openrouter
+    GEMINI_BASE_URL=http://127.0.0.1:8090/gemini
+
+and run `python llm_stub_server.py --port 8090`. The test scripts start it in-process
+and change each provider's behaviour (status, delay, answer, Retry-After) per scenario.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROVIDERS = ("openrouter", "gemini")
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse by the client is observable
+
+    def do_POST(self):
+        provider = self.path.strip("/").split("/")[0]
+        if provider not in PROVIDERS:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        behaviour = self.server.record(provider, self)
+        time.sleep(behaviour["delay"])
+
+        try:
+            if behaviour["status"] != 200:
+                headers = {}
+                if behaviour["retry_after"] is not None:
+                    headers["Retry-After"] = str(behaviour["retry_after"])
+                self._send_json(behaviour["status"], {"error": {"message": "stub failure"}}, headers)
+                return
+
+            text = behaviour["text"]
+            words = [word + " " for word in text.split(" ")]
+            words[-1] = words[-1].rstrip()
+            if provider == "openrouter":
+                chunks = [{"choices": [{"delta": {"content": word}}]} for word in words]
+                answer = {"choices": [{"message": {"content": text}}]}
+            else:
+                chunks = [{"candidates": [{"content": {"parts": [{"text": word}]}}]} for word in words]
+                answer = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+            if not (payload.get("stream") or ":streamGenerateContent" in self.path):
+                self._send_json(200, answer)
+                return
+
+            # Server-sent events; the body ends when the connection closes
+            self.close_connection = True
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for chunk in chunks:
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(behaviour["chunk_delay"])
+            if provider == "openrouter":
+                self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client cancelled the request (e.g. a hedge loser)
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """Threaded stub server with per-provider behaviour and request bookkeeping"""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), StubProviderHandler)
+        self._lock = threading.Lock()
+        self.reset()
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def reset(self):
+        """Healthy providers with default answers and cleared counters"""
+        self.behaviour = {}
+        for provider in PROVIDERS:
+            self.set_behaviour(provider)
+        self.calls = {provider: 0 for provider in PROVIDERS}
+        self.connections = {provider: set() for provider in PROVIDERS}
+        self.last_request = {}
+
+    def set_behaviour(self, provider, status=200, delay=0.0, text=None, retry_after=None, chunk_delay=0.01):
+        self.behaviour[provider] = {
+            "status": status,
+            "delay": delay,
+            "text": text or f"Resposta do {provider} para o teste",
+            "retry_after": retry_after,
+            "chunk_delay": chunk_delay
+        }
+
+    def answer(self, provider):
+        return self.behaviour[provider]["text"]
+
+    def record(self, provider, handler):
+        with self._lock:
+            self.calls[provider] += 1
+            self.connections[provider].add(handler.client_address)
+            self.last_request[provider] = {"path": handler.path, "headers": dict(handler.headers)}
+            return dict(self.behaviour[provider])
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub OpenRouter/Gemini API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+    server = StubLLMServer(args.host, args.port)
+    print(f"🧪 Stub LLM providers on {server.url}/openrouter and {server.url}/gemini")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
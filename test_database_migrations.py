@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for the versioned database schema migrations.
+
+Works on a throwaway database in a temporary directory that starts with the legacy
+(pre-migration) tables. Importing main_enhanced runs its port cleanup, so stop the
+server before running this.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# DatabaseService always opens agent_database.db in the working directory
+os.chdir(tempfile.mkdtemp(prefix="db_migrations_"))
+
+from main_enhanced import DatabaseService
+
+failures = []
+VERSIONS = [version for version, _, _ in DatabaseService.MIGRATIONS]
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+def create_legacy_database():
+    """Base tables as created before the migration ledger existed, with some history"""
+    conn = sqlite3.connect("agent_database.db")
+    conn.executescript('''
+        CREATE TABLE conversation_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            user_message TEXT,
+            assistant_response TEXT,
+            llm_provider TEXT,
+            llm_model TEXT,
+            processing_time REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE whatsapp_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_number TEXT NOT NULL,
+            message_text TEXT NOT NULL,
+            message_type TEXT DEFAULT 'text',
+            response_text TEXT,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    conn.executemany('''
+        INSERT INTO conversation_logs (session_id, user_message, assistant_response, llm_provider, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(f"session-{i % 3}", f"Pergunta {i}", f"Resposta {i}", "gemini", f"2024-01-10 12:{i:02d}:00")
+          for i in range(9)])
+    conn.execute('''
+        INSERT INTO whatsapp_messages (from_number, message_text, response_text, processed_at)
+        VALUES ('5511999900001', 'Oi', 'Olá', '2024-01-10 08:00:00')
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def indexes(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_upgrade():
+    print("\n📋 Test 1: A legacy database is upgraded in order")
+    create_legacy_database()
+    db = DatabaseService(lazy_load=False)
+    conn = db.connection()
+    rows = conn.execute("SELECT version, description FROM schema_migrations ORDER BY version").fetchall()
+    check("every migration recorded", [row[0] for row in rows] == VERSIONS, rows)
+    check("descriptions recorded", [row[1] for row in rows] == [d for _, d, _ in DatabaseService.MIGRATIONS], rows)
+    check("schema version is the latest", db.get_schema_version() == VERSIONS[-1], db.get_schema_version())
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(conversation_logs)")]
+    check("source column added", "source" in columns, columns)
+    check("existing rows default to web",
+          conn.execute("SELECT COUNT(*) FROM conversation_logs WHERE source = 'web'").fetchone()[0] == 9)
+    expected = {
+        "idx_conversation_logs_session_created", "idx_conversation_logs_created_at",
+        "idx_whatsapp_messages_from_processed", "idx_whatsapp_messages_processed_at",
+        "idx_sessions_last_activity", "idx_conversation_logs_source_created",
+    }
+    check("indexes created", expected <= indexes(conn), expected - indexes(conn))
+    check("existing history kept", db.get_stats()["messages"] == 9, db.get_stats())
+    plan = " ".join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM conversation_logs WHERE session_id = ? ORDER BY created_at", ("session-1",)
+    ))
+    check("session history uses its index", "idx_conversation_logs_session_created" in plan, plan)
+    db.close()
+
+
+def test_reopen():
+    print("\n📋 Test 2: Reopening applies nothing twice")
+    db = DatabaseService(lazy_load=False)
+    conn = db.connection()
+    versions = [row[0] for row in conn.execute("SELECT version FROM schema_migrations ORDER BY version")]
+    check("ledger unchanged", versions == VERSIONS, versions)
+    check("summaries not backfilled twice", db.get_stats()["messages"] == 9, db.get_stats())
+    db.close()
+
+
+def test_fresh_database():
+    print("\n📋 Test 3: A new database gets the same schema")
+    os.chdir(tempfile.mkdtemp(prefix="db_migrations_fresh_"))
+    db = DatabaseService(lazy_load=False)
+    check("fresh database at the latest version", db.get_schema_version() == VERSIONS[-1], db.get_schema_version())
+    db.save_conversation("session-fresh", "Olá", "Oi", "gemini", "test-model", 0.1)
+    session = db.get_session("session-fresh")
+    check("writes work on the new schema", session is not None and session[2] == 1, session)
+    db.close()
+
+
+def main():
+    print("🗄️ Testing database migrations...")
+    test_upgrade()
+    test_reopen()
+    test_fresh_database()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All database migration tests passed")
+
+
+if __name__ == "__main__":
+    main()
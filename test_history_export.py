@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Test script for the streamed history export (/api/history/export).
+
+Works on a throwaway database in a temporary directory and calls the app in-process.
+Importing main_enhanced runs its port cleanup, so stop the server before running this.
+"""
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+import httpx
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# DatabaseService always opens agent_database.db in the working directory
+os.chdir(tempfile.mkdtemp(prefix="history_export_"))
+
+from main_enhanced import app, db_service, export_chunks, stream_export
+
+failures = []
+opened = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+def track_connections():
+    """Record the dedicated connections opened for exports"""
+    open_connection = db_service.db.open_connection
+
+    def tracked():
+        conn = open_connection()
+        opened.append(conn)
+        return conn
+
+    db_service.db.open_connection = tracked
+
+
+def is_closed(conn):
+    try:
+        conn.execute("SELECT 1")
+        return False
+    except sqlite3.ProgrammingError:
+        return True
+
+
+def fill_history():
+    db_service.save_batch(
+        conversations=[
+            (f"session-{i % 3}", f"Pergunta {i}", f"Resposta {i}", "gemini", "test-model", 0.5,
+             "api" if i % 3 == 2 else "web", f"2024-03-0{1 + i % 5} 10:00:{i:02d}")
+            for i in range(30)
+        ],
+        whatsapp_messages=[
+            ("5511999900001", f"Mensagem {i}", "text", f"Resposta {i}", f"2024-03-0{1 + i % 5} 11:00:00")
+            for i in range(10)
+        ]
+    )
+
+
+async def test_formats(client):
+    print("\n📋 Test 1: Every format exports the whole history")
+    response = await client.get("/api/history/export")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    check("ndjson has every row", len(rows) == 40, len(rows))
+    check("conversations ordered by time", [row["created_at"] for row in rows[:30]]
+          == sorted(row["created_at"] for row in rows[:30]))
+
+    response = await client.get("/api/history/export", params={"format": "csv"})
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    check("csv has every row", len(rows) == 40, len(rows))
+    check("csv is served as text/csv", response.headers["content-type"].startswith("text/csv"))
+
+    response = await client.get("/api/history/export", params={"format": "json"})
+    document = json.loads(response.text)
+    check("json document is complete", document["total_conversations"] == 40
+          and len(document["conversations"]) == 40, document.get("total_conversations"))
+
+    response = await client.get("/api/history/export", params={"compress": "true"})
+    rows = gzip.decompress(response.content).decode("utf-8").splitlines()
+    check("gzip export decompresses", len(rows) == 40, len(rows))
+
+    response = await client.get("/api/history/export", params={"source": "whatsapp", "date_end": "2024-03-02"})
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    check("filters applied", len(rows) == 4 and all(row["type"] == "whatsapp" for row in rows), len(rows))
+
+    response = await client.get("/api/history/export", params={"format": "xml"})
+    check("unknown format rejected", response.status_code == 400, response.status_code)
+    check("finished exports close their connection", len(opened) == 5 and all(is_closed(conn) for conn in opened),
+          [is_closed(conn) for conn in opened])
+
+
+async def test_disconnect():
+    print("\n📋 Test 2: Abandoned exports close their connection")
+    opened.clear()
+    rows = db_service.iter_export_rows(batch_size=2)
+    stream = stream_export(export_chunks(rows, "ndjson"), rows)
+    first = await stream.__anext__()
+    check("export started", json.loads(first)["type"] == "conversation")
+    check("connection open while streaming", len(opened) == 1 and not is_closed(opened[0]))
+    await stream.aclose()
+    check("closing the stream closes the connection", is_closed(opened[0]))
+
+    rows = db_service.iter_export_rows(batch_size=2)
+    stream = stream_export(export_chunks(rows, "csv"), rows)
+
+    async def slow_client():
+        async for _ in stream:
+            await asyncio.sleep(0.05)
+
+    task = asyncio.ensure_future(slow_client())
+    await asyncio.sleep(0.1)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    check("cancelled response closes the connection", len(opened) == 2 and is_closed(opened[1]))
+
+
+async def main():
+    fill_history()
+    track_connections()
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await test_formats(client)
+        await test_disconnect()
+    finally:
+        db_service.close()
+
+
+if __name__ == "__main__":
+    print("📤 Testing the streamed history export...")
+    asyncio.run(main())
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All history export tests passed")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test script for keyset pagination of the session list and a session's messages.
+
+Works on a throwaway database in a temporary directory. Importing main_enhanced runs
+its port cleanup, so stop the server before running this.
+"""
+import os
+import sys
+import tempfile
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# DatabaseService always opens agent_database.db in the working directory
+os.chdir(tempfile.mkdtemp(prefix="history_pagination_"))
+
+from main_enhanced import DatabaseService, encode_cursor
+
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+def fill_history(db):
+    """Sessions sharing last_activity timestamps, so the session_id tie-breaker matters"""
+    db.save_batch(
+        conversations=[
+            (f"session-{session}", f"Pergunta {turn}", "Resposta", "gemini" if session % 2 else "openrouter",
+             None, None, "web", f"2024-01-{10 + min(session, 3):02d} 12:{turn:02d}:00")
+            for session in range(7) for turn in range(3)
+        ] + [
+            ("session-ties", f"Mensagem {i}", "Ok", "gemini", None, None, "web", "2024-02-01 10:00:00")
+            for i in range(7)
+        ],
+        whatsapp_messages=[
+            (f"55119999000{number}", f"Mensagem {i}", "text", "Ok", "2024-01-20 08:00:00")
+            for number in range(3) for i in range(4)
+        ]
+    )
+
+
+def page_all(fetch, limit):
+    """Follow next_cursor until the last page, returning every row and the page count"""
+    rows, pages, cursor = [], 0, None
+    while True:
+        page, cursor = fetch(limit=limit, cursor=cursor)
+        rows.extend(page)
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+def test_list_sessions(db):
+    print("\n📋 Test 1: Session list pages without gaps or duplicates")
+    expected = [row[0] for row in db.connection().execute(
+        "SELECT session_id FROM sessions ORDER BY last_activity DESC, session_id DESC"
+    )]
+    for limit in (1, 2, 3, 50):
+        rows, pages = page_all(db.list_sessions, limit)
+        check(f"pages of {limit} cover every session", [row[0] for row in rows] == expected,
+              [row[0] for row in rows])
+    _, pages = page_all(db.list_sessions, 2)
+    check("paging stops at the last page", pages == (len(expected) + 1) // 2, pages)
+
+    rows, cursor = db.list_sessions(limit=50, source="whatsapp")
+    check("source filter", len(rows) == 3 and all(row[5] == "whatsapp" for row in rows) and cursor is None, rows)
+    rows, _ = page_all(lambda **kwargs: db.list_sessions(provider="gemini", **kwargs), 2)
+    check("provider filter pages", sorted(row[0] for row in rows) == ["session-1", "session-3", "session-5", "session-ties"],
+          [row[0] for row in rows])
+    rows, _ = db.list_sessions(limit=50, date_start="2024-01-13", date_end="2024-01-13")
+    check("inclusive date range", sorted(row[0] for row in rows) == ["session-3", "session-4", "session-5", "session-6"],
+          [row[0] for row in rows])
+
+
+def test_session_messages(db):
+    print("\n📋 Test 2: Messages with equal timestamps page in order")
+    rows, _ = page_all(lambda **kwargs: db.get_session_messages("session-ties", **kwargs), 3)
+    check("conversation messages in insertion order", [row[0] for row in rows] == [f"Mensagem {i}" for i in range(7)],
+          [row[0] for row in rows])
+    rows, _ = page_all(lambda **kwargs: db.get_session_messages("whatsapp:551199990001", **kwargs), 3)
+    check("whatsapp messages in insertion order", [row[0] for row in rows] == [f"Mensagem {i}" for i in range(4)],
+          [row[0] for row in rows])
+    rows, cursor = db.get_session_messages("session-missing")
+    check("unknown session is empty", rows == [] and cursor is None)
+
+
+def test_invalid_cursor(db):
+    print("\n📋 Test 3: Malformed cursors are rejected")
+    for cursor in ("not-a-cursor", encode_cursor("2024-01-10"), encode_cursor("a", "b", "c")):
+        for fetch in (db.list_sessions, lambda cursor: db.get_session_messages("session-1", cursor=cursor)):
+            try:
+                fetch(cursor=cursor)
+                check(f"invalid cursor {cursor!r} rejected", False)
+            except ValueError:
+                check(f"invalid cursor {cursor!r} rejected", True)
+
+
+def main():
+    print("📜 Testing history pagination...")
+    db = DatabaseService(lazy_load=False)
+    try:
+        fill_history(db)
+        test_list_sessions(db)
+        test_session_messages(db)
+        test_invalid_cursor(db)
+    finally:
+        db.close()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All history pagination tests passed")
+
+
+if __name__ == "__main__":
+    main()
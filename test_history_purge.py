@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test script for chunked history purges and the summary tables they correct.
+
+Works on a throwaway database in a temporary directory. Importing main_enhanced runs
+its port cleanup, so stop the server before running this.
+"""
+import os
+import sys
+import tempfile
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# DatabaseService always opens agent_database.db in the working directory
+os.chdir(tempfile.mkdtemp(prefix="history_purge_"))
+
+from main_enhanced import DatabaseService
+
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+def fill_history(db):
+    """Six web/API sessions of five turns and three WhatsApp numbers with four messages each"""
+    db.save_batch(
+        conversations=[
+            (f"session-{session}", f"Pergunta {turn} da sessão {session}", f"Resposta {turn}",
+             "gemini" if session % 2 else "openrouter", "test-model", 0.5 if turn % 2 else None,
+             "api" if session == 5 else "web", f"2024-01-{10 + min(session, 3):02d} 12:{turn:02d}:00")
+            for session in range(6) for turn in range(5)
+        ],
+        whatsapp_messages=[
+            (f"55119999000{number}", f"Mensagem {turn} do WhatsApp", "text", f"Resposta {turn}",
+             f"2024-01-1{turn} 08:00:00")
+            for number in range(3) for turn in range(4)
+        ]
+    )
+
+
+def summaries(db):
+    """Current contents of the incrementally maintained summary tables"""
+    conn = db.connection()
+    return (
+        conn.execute("SELECT * FROM sessions ORDER BY session_id").fetchall(),
+        conn.execute("SELECT * FROM history_stats").fetchall(),
+        conn.execute("SELECT * FROM daily_stats ORDER BY day").fetchall(),
+    )
+
+
+def rebuilt_summaries(db):
+    """Summary tables recomputed from scratch by the backfill migration (rolled back afterwards)"""
+    conn = db.connection()
+    try:
+        db._migrate_backfill_session_summaries(conn)
+        return summaries(db)
+    finally:
+        conn.rollback()
+
+
+def check_summaries(db, name):
+    current = summaries(db)
+    expected = rebuilt_summaries(db)
+    check(name, current == expected, f"\n     current:  {current}\n     expected: {expected}")
+
+
+def test_session_purge(db):
+    print("\n📋 Test 1: Purging one session")
+    deleted = db.purge_history(session_id="session-0")
+    check("session purge deletes its rows", deleted == {"conversation_logs": 5}, deleted)
+    check("purged session removed", db.get_session("session-0") is None)
+    deleted = db.purge_history(session_id="whatsapp:551199990002")
+    check("whatsapp session purge deletes its rows",
+          deleted.get("whatsapp_messages") == 4 and not deleted.get("conversation_logs"), deleted)
+    check_summaries(db, "summaries match a full rebuild after a session purge")
+
+
+def test_date_purge(db):
+    print("\n📋 Test 2: Purging by date in chunks")
+    deleted = db.purge_history(before="2024-01-11 12:02:00", chunk_size=3)
+    check("date purge deletes in chunks", deleted == {"conversation_logs": 2, "whatsapp_messages": 4}, deleted)
+    check_summaries(db, "summaries match a full rebuild after a date purge")
+
+
+def test_source_purge(db):
+    print("\n📋 Test 3: Purging by source")
+    deleted = db.purge_history(source="whatsapp", before="2024-01-13")
+    check("whatsapp purge limited to whatsapp", deleted == {"whatsapp_messages": 2}, deleted)
+    deleted = db.purge_history(source="api", chunk_size=2)
+    check("source purge limited to that source", deleted == {"conversation_logs": 5}, deleted)
+    check("other sources kept", db.get_session("session-4") is not None)
+    check_summaries(db, "summaries match a full rebuild after source purges")
+
+    plan = " ".join(row[3] for row in db.connection().execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM conversation_logs WHERE source = ? AND created_at < ? LIMIT ?",
+        ("web", "2024-01-12", 10)
+    ))
+    check("source purges use the (source, created_at) index",
+          "idx_conversation_logs_source_created" in plan, plan)
+
+
+def test_full_purge(db):
+    print("\n📋 Test 4: Purging everything")
+    db.purge_history()
+    stats = db.get_stats()
+    check("full purge empties the history",
+          stats["messages"] == 0 and stats["conversations"] == 0 and stats["whatsapp"] == 0, stats)
+    check_summaries(db, "summaries match a full rebuild after a full purge")
+
+
+def main():
+    print("🧹 Testing history purges...")
+    db = DatabaseService(lazy_load=False)
+    try:
+        fill_history(db)
+        test_session_purge(db)
+        test_date_purge(db)
+        test_source_purge(db)
+        test_full_purge(db)
+    finally:
+        db.close()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All history purge tests passed")
+
+
+if __name__ == "__main__":
+    main()
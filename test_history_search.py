@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Test script for full-text history search (FTS5 indexes over the log tables).
+
+Works on a throwaway database in a temporary directory that starts with legacy rows, so
+the migration has to index existing history. Importing main_enhanced runs its port
+cleanup, so stop the server before running this.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# DatabaseService always opens agent_database.db in the working directory
+os.chdir(tempfile.mkdtemp(prefix="history_search_"))
+
+from main_enhanced import DatabaseService, build_fts_query
+
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+def create_legacy_database():
+    """Log tables with history written before the search index existed"""
+    conn = sqlite3.connect("agent_database.db")
+    conn.executescript('''
+        CREATE TABLE conversation_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            user_message TEXT,
+            assistant_response TEXT,
+            llm_provider TEXT,
+            llm_model TEXT,
+            processing_time REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE whatsapp_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_number TEXT NOT NULL,
+            message_text TEXT NOT NULL,
+            message_type TEXT DEFAULT 'text',
+            response_text TEXT,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    conn.executemany('''
+        INSERT INTO conversation_logs (session_id, user_message, assistant_response, llm_provider)
+        VALUES (?, ?, ?, 'gemini')
+    ''', [(f"session-{i % 2}", f"Pergunta {i} sobre pizza de calabresa" if i < 5 else f"Pergunta {i} sobre o clima",
+           "Resposta com informação") for i in range(8)])
+    conn.executemany('''
+        INSERT INTO whatsapp_messages (from_number, message_text, response_text) VALUES (?, ?, ?)
+    ''', [("5511999900001", f"Mensagem {i} do WhatsApp sobre pão", "Ok") for i in range(3)])
+    conn.commit()
+    conn.close()
+
+
+def test_query_building():
+    print("\n📋 Test 1: Free text becomes a safe FTS query")
+    check("words quoted, prefix on the last", build_fts_query("pizza calab") == '"pizza" "calab"*',
+          build_fts_query("pizza calab"))
+    check("operators and quotes stripped", build_fts_query('pizza" OR (x') == '"pizza" "OR" "x"*',
+          build_fts_query('pizza" OR (x'))
+    check("punctuation-only text is empty", build_fts_query("?!") == "")
+
+
+def test_existing_rows(db):
+    print("\n📋 Test 2: The migration indexes existing history")
+    results, has_more = db.search_messages("calabresa")
+    check("existing rows indexed", len(results) == 5 and not has_more, len(results))
+    results, _ = db.search_messages("Calabresa PIZZ")
+    check("case-insensitive prefix match on the last word", len(results) == 5, len(results))
+    results, _ = db.search_messages("informacao")
+    check("accents ignored", len(results) == 8, len(results))
+    results, _ = db.search_messages("pão", source="whatsapp")
+    check("whatsapp messages searchable", len(results) == 3 and all(r["type"] == "whatsapp" for r in results),
+          results)
+    check("snippets highlight the match", "<mark>calabresa</mark>" in db.search_messages("calabresa")[0][0]["user_snippet"])
+
+    page, has_more = db.search_messages("pergunta", limit=3)
+    rest, _ = db.search_messages("pergunta", limit=10, offset=3)
+    check("paged results", len(page) == 3 and has_more and len(rest) == 5, (len(page), has_more, len(rest)))
+    check("pages don't overlap", not {r["id"] for r in page} & {r["id"] for r in rest})
+
+
+def test_triggers(db):
+    print("\n📋 Test 3: Inserts and deletes keep the index current")
+    db.save_conversation("session-fts", "Receita de abacaxi grelhado", "Use canela")
+    db.save_batch(conversations=[
+        ("session-fts", "Outro abacaxi", "Ok", "gemini", None, None, "api", "2024-02-01 10:00:00")
+    ])
+    results, _ = db.search_messages("abacaxi")
+    check("new rows indexed", len(results) == 2 and {r["session_id"] for r in results} == {"session-fts"}, results)
+    results, _ = db.search_messages("abacaxi", source="api")
+    check("source filter", len(results) == 1 and results[0]["source"] == "api", results)
+
+    db.purge_history(session_id="session-fts")
+    results, _ = db.search_messages("abacaxi")
+    check("deleted rows leave the index", results == [], results)
+
+
+def test_recreated(db):
+    print("\n📋 Test 4: A missing index is recreated on startup")
+    conn = db.connection()
+    for fts_table, _, _ in db.FTS_TABLES:
+        conn.execute(f"DROP TABLE {fts_table}")
+    conn.commit()
+    check("index dropped", not db.has_full_text_search())
+    db.ensure_full_text_search(conn)
+    check("index recreated", db.has_full_text_search())
+    results, _ = db.search_messages("calabresa")
+    check("recreated index covers existing rows", len(results) == 5, len(results))
+
+
+def main():
+    print("🔎 Testing full-text history search...")
+    create_legacy_database()
+    db = DatabaseService(lazy_load=False)
+    try:
+        test_query_building()
+        if not db.has_full_text_search():
+            print("  ⚠️ SQLite built without FTS5, skipping the index tests")
+        else:
+            test_existing_rows(db)
+            test_triggers(db)
+            test_recreated(db)
+    finally:
+        db.close()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All history search tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Test script for LLM provider fallback and the per-provider circuit breaker.
+
+Runs LLMService against llm_stub_server.py in-process, so no API keys or network access
+are needed. Importing main_enhanced runs its port cleanup, so stop the server before running this.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from llm_stub_server import StubLLMServer
+
+stub = StubLLMServer().start()
+
+# Point the providers at the stub before the app reads its configuration
+os.environ.update({
+    "OPENROUTER_BASE_URL": f"{stub.url}/openrouter",
+    "GEMINI_BASE_URL": f"{stub.url}/gemini",
+    "OPENROUTER_API_KEY": "test-key",
+    "GEMINI_API_KEY": "test-key",
+    "LLM_HTTP2": "false",
+    "LLM_ROUTING": "preferred",
+    "CIRCUIT_FAILURE_THRESHOLD": "3",
+    "CIRCUIT_COOLDOWN_SECONDS": "30",
+    "OPENROUTER_RPM_LIMIT": "0",
+    "GEMINI_RPM_LIMIT": "0",
+    "LLM_CACHE_ENABLED": "false",
+    "SEMANTIC_CACHE_ENABLED": "false",
+})
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# The app keeps its database and audio folders in the working directory
+os.chdir(tempfile.mkdtemp(prefix="llm_circuit_breaker_"))
+
+from main_enhanced import llm_service, ProviderHealth
+
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+def reset(openrouter=None, gemini=None):
+    """Fresh circuit state and default stub behaviour for the next scenario"""
+    llm_service.health = ProviderHealth()
+    stub.reset()
+    stub.set_behaviour("openrouter", **(openrouter or {}))
+    stub.set_behaviour("gemini", **(gemini or {}))
+
+
+def state(provider):
+    return llm_service.health.status()[provider]["state"]
+
+
+async def open_circuit(provider="openrouter"):
+    """Trip the circuit with server errors, then let the cooldown lapse so the next call is a trial"""
+    stub.set_behaviour(provider, status=500)
+    for _ in range(3):
+        await llm_service.generate_response("Olá", provider=provider)
+    llm_service.health._state[provider]["open_until"] = time.time() - 1
+
+
+async def collect(stream):
+    return "".join([delta async for delta in stream])
+
+
+async def test_primary_answers():
+    print("\n📋 Test 1: Healthy primary answers")
+    reset()
+    response = await llm_service.generate_response("Olá", provider="openrouter")
+    check("answer comes from openrouter", response == stub.answer("openrouter"), repr(response))
+    check("gemini not called", stub.calls["gemini"] == 0)
+    check("circuit stays closed", state("openrouter") == "closed")
+
+
+async def test_fallback_opens_circuit():
+    print("\n📋 Test 2: Failing primary falls back and opens its circuit")
+    reset(openrouter={"status": 500})
+    for _ in range(3):
+        response = await llm_service.generate_response("Olá", provider="openrouter")
+        check("fallback answer comes from gemini", response == stub.answer("gemini"), repr(response))
+    check("circuit open after 3 failures", state("openrouter") == "open", state("openrouter"))
+
+    calls = stub.calls["openrouter"]
+    response = await llm_service.generate_response("Olá", provider="openrouter")
+    check("open circuit skips openrouter", stub.calls["openrouter"] == calls)
+    check("gemini still answers", response == stub.answer("gemini"))
+
+
+async def test_rate_limit_opens_circuit():
+    print("\n📋 Test 3: 429 with Retry-After opens the circuit at once")
+    reset(openrouter={"status": 429, "retry_after": 45})
+    response = await llm_service.generate_response("Olá", provider="openrouter")
+    status = llm_service.health.status()["openrouter"]
+    check("fallback answer comes from gemini", response == stub.answer("gemini"))
+    check("circuit open after one 429", status["state"] == "open", status["state"])
+    check("cooldown follows Retry-After", 40 < status["retry_in"] <= 45, status["retry_in"])
+
+
+async def test_client_errors_keep_circuit_closed():
+    print("\n📋 Test 4: 4xx client errors never open the circuit")
+    for code in (400, 403):
+        reset(openrouter={"status": code})
+        for _ in range(5):
+            response = await llm_service.generate_response("Olá", provider="openrouter")
+        status = llm_service.health.status()["openrouter"]
+        check(f"{code} still falls back to gemini", response == stub.answer("gemini"), repr(response))
+        check(f"{code} leaves the circuit closed", status["state"] == "closed", status)
+        check(f"{code} not counted as a provider failure",
+              status["consecutive_failures"] == 0 and status["failures"] == 0, status)
+        check(f"{code} reported as a client error", status["client_errors"] == 5, status)
+        check(f"{code} keeps trying openrouter", stub.calls["openrouter"] == 5, stub.calls)
+
+    reset()
+    await open_circuit()
+    stub.set_behaviour("openrouter", status=400)
+    await llm_service.generate_response("Olá", provider="openrouter")
+    status = llm_service.health.status()["openrouter"]
+    check("400 during a trial doesn't reopen the circuit", status["state"] == "half_open", status)
+    check("400 during a trial releases the probe slot", llm_service.health.available("openrouter"))
+
+
+async def test_half_open_recovery():
+    print("\n📋 Test 5: Half-open trial closes the circuit on success")
+    reset()
+    await open_circuit()
+    stub.set_behaviour("openrouter")
+    response = await llm_service.generate_response("Olá", provider="openrouter")
+    check("trial answer comes from openrouter", response == stub.answer("openrouter"), repr(response))
+    check("circuit closed again", state("openrouter") == "closed", state("openrouter"))
+
+
+async def test_cancelled_trial_released():
+    print("\n📋 Test 6: Cancelled half-open trials release the probe slot")
+    reset()
+    await open_circuit()
+    stub.set_behaviour("openrouter", delay=1.0)
+
+    task = asyncio.ensure_future(llm_service.generate_response("Olá", provider="openrouter"))
+    await asyncio.sleep(0.2)
+    check("trial in flight blocks other requests", not llm_service.health.available("openrouter"))
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    check("cancelled call releases the slot", llm_service.health.available("openrouter"))
+
+    stub.set_behaviour("openrouter", text="um dois três quatro cinco")
+    stream = llm_service.stream_response("Olá", provider="openrouter")
+    first = await stream.__anext__()
+    check("stream trial starts with openrouter", first == "um ", repr(first))
+    await stream.aclose()
+    check("closed stream releases the slot", llm_service.health.available("openrouter"))
+
+
+async def test_both_fail():
+    print("\n📋 Test 7: Both providers failing returns an error message")
+    reset(openrouter={"status": 500}, gemini={"status": 503})
+    response = await llm_service.generate_response("Olá", provider="openrouter")
+    check("error message returned", response.startswith("Desculpe"), repr(response))
+
+
+async def test_stream_fallback():
+    print("\n📋 Test 8: Streaming falls back before the first token")
+    reset(openrouter={"status": 503})
+    text = await collect(llm_service.stream_response("Olá", provider="openrouter"))
+    check("streamed answer comes from gemini", text == stub.answer("gemini"), repr(text))
+
+    reset()
+    text = await collect(llm_service.stream_response("Olá", provider="openrouter"))
+    check("healthy stream comes from openrouter", text == stub.answer("openrouter"), repr(text))
+
+
+async def main():
+    print("🧪 Testing LLM fallback and circuit breaker against stub providers...")
+    try:
+        await test_primary_answers()
+        await test_fallback_opens_circuit()
+        await test_rate_limit_opens_circuit()
+        await test_client_errors_keep_circuit_closed()
+        await test_half_open_recovery()
+        await test_cancelled_trial_released()
+        await test_both_fail()
+        await test_stream_fallback()
+    finally:
+        await llm_service.shutdown()
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All LLM circuit breaker tests passed")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test script for hedged LLM requests (backup provider called when the primary is slow).
+
+Runs LLMService against llm_stub_server.py in-process, so no API keys or network access
+are needed. Importing main_enhanced runs its port cleanup, so stop the server before running this.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from llm_stub_server import StubLLMServer
+
+stub = StubLLMServer().start()
+
+# Point the providers at the stub before the app reads its configuration
+os.environ.update({
+    "OPENROUTER_BASE_URL": f"{stub.url}/openrouter",
+    "GEMINI_BASE_URL": f"{stub.url}/gemini",
+    "OPENROUTER_API_KEY": "test-key",
+    "GEMINI_API_KEY": "test-key",
+    "LLM_HTTP2": "false",
+    "LLM_ROUTING": "preferred",
+    "OPENROUTER_RPM_LIMIT": "0",
+    "GEMINI_RPM_LIMIT": "0",
+    "LLM_HEDGE_DEFAULT_DELAY": "0.3",
+    "LLM_CACHE_ENABLED": "false",
+    "SEMANTIC_CACHE_ENABLED": "false",
+})
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# The app keeps its database and audio folders in the working directory
+os.chdir(tempfile.mkdtemp(prefix="llm_hedging_"))
+
+from main_enhanced import llm_service, ProviderHealth
+
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+def reset(openrouter=None, gemini=None):
+    """Fresh provider health (no latency samples) and default stub behaviour"""
+    llm_service.health = ProviderHealth()
+    stub.reset()
+    stub.set_behaviour("openrouter", **(openrouter or {}))
+    stub.set_behaviour("gemini", **(gemini or {}))
+
+
+def state(provider):
+    return llm_service.health.status()[provider]["state"]
+
+
+async def collect(stream):
+    return "".join([delta async for delta in stream])
+
+
+async def test_hedge_slow_primary():
+    print("\n📋 Test 1: Slow primary is hedged and the backup answer wins")
+    reset(openrouter={"delay": 1.5})
+    hedges = llm_service.hedges_fired
+    started = time.perf_counter()
+    response = await llm_service.generate_response("Olá", provider="openrouter", hedge=True)
+    elapsed = time.perf_counter() - started
+    check("hedged answer comes from gemini", response == stub.answer("gemini"), repr(response))
+    check("hedge fired", llm_service.hedges_fired == hedges + 1)
+    check("answered before the slow primary", elapsed < 1.2, f"{elapsed:.2f}s")
+    check("cancelled primary is not counted as a failure", state("openrouter") == "closed")
+
+
+async def test_no_hedge_when_fast():
+    print("\n📋 Test 2: A fast primary never triggers the backup")
+    reset()
+    hedges = llm_service.hedges_fired
+    response = await llm_service.generate_response("Olá", provider="openrouter", hedge=True)
+    check("answer comes from openrouter", response == stub.answer("openrouter"), repr(response))
+    check("no hedge fired", llm_service.hedges_fired == hedges)
+    check("gemini not called", stub.calls["gemini"] == 0, stub.calls)
+
+
+async def test_hedge_fast_failure():
+    print("\n📋 Test 3: Primary failing inside the hedge delay still falls back")
+    reset(openrouter={"status": 500})
+    hedges = llm_service.hedges_fired
+    response = await llm_service.generate_response("Olá", provider="openrouter", hedge=True)
+    check("fallback answer comes from gemini", response == stub.answer("gemini"), repr(response))
+    check("no hedge fired for a fast failure", llm_service.hedges_fired == hedges)
+
+    reset(openrouter={"status": 500})
+    text = await collect(llm_service.stream_response("Olá", provider="openrouter", hedge=True))
+    check("streamed fallback comes from gemini", text == stub.answer("gemini"), repr(text))
+    check("no hedge fired for a fast stream failure", llm_service.hedges_fired == hedges)
+
+
+async def test_hedge_slow_stream():
+    print("\n📋 Test 4: Slow first token is hedged on streams")
+    reset(openrouter={"delay": 1.5})
+    hedges = llm_service.hedges_fired
+    started = time.perf_counter()
+    text = await collect(llm_service.stream_response("Olá", provider="openrouter", hedge=True))
+    elapsed = time.perf_counter() - started
+    check("hedged stream comes from gemini", text == stub.answer("gemini"), repr(text))
+    check("hedge fired", llm_service.hedges_fired == hedges + 1)
+    check("answered before the slow primary", elapsed < 1.2, f"{elapsed:.2f}s")
+
+
+async def main():
+    print("🏁 Testing hedged LLM requests against stub providers...")
+    try:
+        await test_hedge_slow_primary()
+        await test_no_hedge_when_fast()
+        await test_hedge_fast_failure()
+        await test_hedge_slow_stream()
+    finally:
+        await llm_service.shutdown()
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All LLM hedging tests passed")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test script for the pooled async HTTP clients used by LLMService.
+
+Runs against llm_stub_server.py in-process, so no API keys or network access are needed.
+Importing main_enhanced runs its port cleanup, so stop the server before running this.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from llm_stub_server import StubLLMServer
+
+stub = StubLLMServer().start()
+
+# Point the providers at the stub before the app reads its configuration
+os.environ.update({
+    "OPENROUTER_BASE_URL": f"{stub.url}/openrouter",
+    "GEMINI_BASE_URL": f"{stub.url}/gemini",
+    "OPENROUTER_API_KEY": "test-openrouter-key",
+    "GEMINI_API_KEY": "test-gemini-key",
+    "LLM_HTTP2": "false",
+    "LLM_CACHE_ENABLED": "false",
+    "SEMANTIC_CACHE_ENABLED": "false",
+})
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# The app keeps its database and audio folders in the working directory
+os.chdir(tempfile.mkdtemp(prefix="llm_http_client_"))
+
+from main_enhanced import llm_service
+
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+async def test_providers_answer():
+    print("\n📋 Test 1: Both providers answer through the shared clients")
+    stub.reset()
+    response = await llm_service.generate_response("Olá", provider="openrouter")
+    check("openrouter answer", response == stub.answer("openrouter"), repr(response))
+    request = stub.last_request["openrouter"]
+    check("openrouter request authenticated",
+          request["headers"].get("Authorization") == "Bearer test-openrouter-key", request)
+
+    response = await llm_service.generate_response("Olá", provider="gemini")
+    check("gemini answer", response == stub.answer("gemini"), repr(response))
+    request = stub.last_request["gemini"]
+    check("gemini request carries the model and key",
+          ":generateContent" in request["path"] and "key=test-gemini-key" in request["path"], request)
+
+
+async def test_connection_reuse():
+    print("\n📋 Test 2: Requests reuse pooled keep-alive connections")
+    stub.reset()
+    client = llm_service._get_client("openrouter")
+    for _ in range(5):
+        await llm_service.generate_response("Olá", provider="openrouter")
+    check("same client object reused", llm_service._get_client("openrouter") is client)
+    check("one connection for sequential requests", len(stub.connections["openrouter"]) == 1,
+          stub.connections["openrouter"])
+
+
+async def test_concurrent_requests():
+    print("\n📋 Test 3: Slow providers don't block the event loop")
+    stub.reset()
+    stub.set_behaviour("openrouter", delay=0.3)
+    started = time.perf_counter()
+    responses = await asyncio.gather(*[
+        llm_service.generate_response(f"Pergunta {i}", provider="openrouter") for i in range(5)
+    ])
+    elapsed = time.perf_counter() - started
+    check("every request answered", all(r == stub.answer("openrouter") for r in responses), responses)
+    check("requests ran concurrently", elapsed < 1.0, f"{elapsed:.2f}s")
+
+
+async def test_lifecycle():
+    print("\n📋 Test 4: Clients are opened at startup and closed at shutdown")
+    await llm_service.shutdown()
+    await llm_service.startup()
+    clients = dict(llm_service._clients)
+    check("startup opens both provider clients", sorted(clients) == ["gemini", "openrouter"], sorted(clients))
+    await llm_service.shutdown()
+    check("shutdown closes the clients", all(client.is_closed for client in clients.values()))
+    check("shutdown forgets the clients", not llm_service._clients)
+
+
+async def main():
+    print("🌐 Testing the LLM HTTP clients against the stub providers...")
+    try:
+        await test_providers_answer()
+        await test_connection_reuse()
+        await test_concurrent_requests()
+        await test_lifecycle()
+    finally:
+        await llm_service.shutdown()
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All LLM HTTP client tests passed")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test script for the sentence chunker and WAV encoding used by the pipelined voice turn.
+
+No models are loaded. Importing main_enhanced runs its port cleanup, so stop the
+server before running this.
+"""
+import io
+import os
+import sys
+import tempfile
+import wave
+
+import numpy as np
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# The app keeps its database and audio folders in the working directory
+os.chdir(tempfile.mkdtemp(prefix="sentence_chunker_"))
+
+from main_enhanced import SentenceChunker, encode_wav
+
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+def chunk(text, step, min_chars=20):
+    """Feed text in deltas of `step` characters, as an LLM stream would, and flush at the end"""
+    chunker = SentenceChunker(min_chars=min_chars)
+    sentences = []
+    for i in range(0, len(text), step):
+        sentences.extend(chunker.feed(text[i:i + step]))
+    return sentences + chunker.flush()
+
+
+def test_streamed_sentences():
+    print("\n📋 Test 1: Sentences are emitted as soon as they are complete")
+    chunker = SentenceChunker(min_chars=10)
+    check("incomplete sentence held back", chunker.feed("Bom dia, tudo") == [])
+    check("sentence emitted once its end arrives", chunker.feed(" bem com você? Eu") == ["Bom dia, tudo bem com você?"])
+    check("remainder flushed at the end", chunker.flush() == ["Eu"])
+    check("flush empties the buffer", chunker.flush() == [])
+
+    text = "Primeira frase completa aqui. Segunda frase completa aqui!\nTerceira linha sem ponto"
+    expected = ["Primeira frase completa aqui.", "Segunda frase completa aqui!", "Terceira linha sem ponto"]
+    check("same sentences whatever the delta size",
+          all(chunk(text, step) == expected for step in (1, 3, 7, len(text))),
+          {step: chunk(text, step) for step in (1, 3, 7)})
+
+
+def test_abbreviations_and_short_fragments():
+    print("\n📋 Test 2: Abbreviations and short fragments don't split sentences")
+    text = "Olá! O Sr. Silva mora na Av. Paulista, nº. 12. Ele chega amanhã às dez horas. Até logo"
+    sentences = chunk(text, 7)
+    check("abbreviations don't end sentences", sentences[0] == "Olá! O Sr. Silva mora na Av. Paulista, nº. 12.",
+          sentences)
+    check("short fragments merged, remainder flushed",
+          sentences[1:] == ["Ele chega amanhã às dez horas.", "Até logo"], sentences)
+    check("initials don't end sentences", chunk("Falei com J. Silva ontem à tarde. Tudo certo.", 5, 10)
+          == ["Falei com J. Silva ontem à tarde.", "Tudo certo."])
+    check("etc. ends a sentence before a capital", chunk("Compre pão, leite etc. Depois volte para casa.", 4, 10)
+          == ["Compre pão, leite etc.", "Depois volte para casa."])
+
+
+def test_encode_wav():
+    print("\n📋 Test 3: Sentence audio is encoded as 16-bit mono WAV")
+    samples = np.sin(np.linspace(0, 100, 22050))
+    with wave.open(io.BytesIO(encode_wav(samples, 22050))) as wav_file:
+        check("16-bit mono", (wav_file.getnchannels(), wav_file.getsampwidth()) == (1, 2))
+        check("sample rate kept", wav_file.getframerate() == 22050, wav_file.getframerate())
+        check("every sample kept", wav_file.getnframes() == 22050, wav_file.getnframes())
+    with wave.open(io.BytesIO(encode_wav(np.array([2.0, -2.0]), 16000))) as wav_file:
+        pcm = np.frombuffer(wav_file.readframes(2), dtype="<i2")
+    check("out-of-range samples clipped", abs(int(pcm[0])) >= 32766 and abs(int(pcm[1])) >= 32766, pcm)
+
+
+def main():
+    print("🗣️ Testing the sentence chunker...")
+    test_streamed_sentences()
+    test_abbreviations_and_short_fragments()
+    test_encode_wav()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All sentence chunker tests passed")
+
+
+if __name__ == "__main__":
+    main()
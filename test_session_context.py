@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-session conversation context cache.
+
+Works on a throwaway database in a temporary directory. Importing main_enhanced runs
+its port cleanup, so stop the server before running this.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# DatabaseService always opens agent_database.db in the working directory
+os.chdir(tempfile.mkdtemp(prefix="session_context_"))
+
+from main_enhanced import DatabaseService, DatabaseWriteBehind, SessionContextCache, config
+
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+def turn(i):
+    return {"user": f"Pergunta {i}", "assistant": f"Resposta {i}"}
+
+
+def log_turns(db, session_id, numbers):
+    db.save_batch(conversations=[
+        (session_id, f"Pergunta {i}", f"Resposta {i}", "gemini", None, 0.1, "web", f"2026-01-01 10:00:{i:02d}")
+        for i in numbers
+    ])
+
+
+class SlowDatabase:
+    """Holds get_recent_turns until released, so turns can be recorded while the read is pending"""
+
+    def __init__(self, db):
+        self.db = db
+        self.reading = threading.Event()
+        self.release = threading.Event()
+
+    def get_recent_turns(self, session_id, limit=10):
+        self.reading.set()
+        self.release.wait(5)
+        return self.db.get_recent_turns(session_id, limit)
+
+
+async def pending_read(context, slow, session_id):
+    task = asyncio.ensure_future(context.get_context(session_id))
+    await asyncio.to_thread(slow.reading.wait, 5)
+    return task
+
+
+async def test_cold_and_warm(db):
+    print("\n📋 Test 1: First use reads SQLite, later turns come from the cache")
+    log_turns(db, "session-cold", range(3))
+    context = SessionContextCache(db)
+    check("history loaded on a miss", await context.get_context("session-cold") == [turn(i) for i in range(3)])
+    context.record_turn("session-cold", "Pergunta 3", "Resposta 3")
+    check("recorded turn served from the cache", await context.get_context("session-cold") == [turn(i) for i in range(4)])
+    check("one miss, one hit", (context.misses, context.hits) == (1, 1), context.status())
+
+    context.record_turn("session-new", "Pergunta 0", "Resposta 0")
+    check("turn of an unseen session is kept", await context.get_context("session-new") == [turn(0)])
+
+
+async def test_turn_recorded_during_read(db):
+    print("\n📋 Test 2: Turns recorded while the history is being read are kept")
+    log_turns(db, "session-race", range(2))
+    slow = SlowDatabase(db)
+    context = SessionContextCache(slow)
+    task = await pending_read(context, slow, "session-race")
+    context.record_turn("session-race", "Pergunta 2", "Resposta 2")
+    slow.release.set()
+    expected = [turn(i) for i in range(3)]
+    check("pending read merges the new turn", await task == expected)
+    check("cache keeps the merged history", await context.get_context("session-race") == expected)
+
+    # The same turn reaching SQLite before the read finishes isn't duplicated
+    log_turns(db, "session-flushed", range(2))
+    slow = SlowDatabase(db)
+    context = SessionContextCache(slow)
+    task = await pending_read(context, slow, "session-flushed")
+    context.record_turn("session-flushed", "Pergunta 2", "Resposta 2")
+    log_turns(db, "session-flushed", [2])
+    slow.release.set()
+    turns = await task
+    check("flushed turn not duplicated", turns == expected, turns)
+
+
+async def test_queued_turns(db):
+    print("\n📋 Test 3: Turns still queued in the write-behind logger are part of the context")
+    log_turns(db, "session-queued", range(2))
+    context = SessionContextCache(db)
+    writer = DatabaseWriteBehind(db, context)
+    await writer.start()
+    writer.save_conversation("session-queued", "Pergunta 2", "Resposta 2", "gemini")
+    expected = [turn(i) for i in range(3)]
+    check("queued turn included before the flush", await context.get_context("session-queued") == expected)
+    await writer.stop()
+    check("no duplicate after the flush", await context.get_context("session-queued") == expected)
+    check("fresh cache reads the same history", await SessionContextCache(db).get_context("session-queued") == expected)
+
+
+async def test_invalidate_during_read(db):
+    print("\n📋 Test 4: History deleted during a read isn't cached again")
+    log_turns(db, "session-deleted", range(2))
+    slow = SlowDatabase(db)
+    context = SessionContextCache(slow)
+    task = await pending_read(context, slow, "session-deleted")
+    context.invalidate("session-deleted")
+    slow.release.set()
+    await task
+    check("stale read not cached", "session-deleted" not in context._sessions)
+
+
+async def test_limits(db):
+    print("\n📋 Test 5: Turn, session and token limits")
+    context = SessionContextCache(db)
+    for i in range(config.CONTEXT_MAX_TURNS + 3):
+        context.record_turn("session-long", f"Pergunta {i}", f"Resposta {i}")
+    turns = await context.get_context("session-long")
+    check("only the last CONTEXT_MAX_TURNS turns kept",
+          turns == [turn(i) for i in range(3, config.CONTEXT_MAX_TURNS + 3)], turns)
+
+    sessions = config.CONTEXT_CACHE_SESSIONS
+    config.CONTEXT_CACHE_SESSIONS = 2
+    try:
+        for name in ("a", "b", "c"):
+            context.record_turn(f"session-{name}", "Pergunta", "Resposta")
+        check("least recently used session evicted", list(context._sessions) == ["session-b", "session-c"],
+              list(context._sessions))
+    finally:
+        config.CONTEXT_CACHE_SESSIONS = sessions
+
+    context.record_turn("session-big", "x" * config.CONTEXT_MAX_TOKENS * 4, "Resposta")
+    context.record_turn("session-big", "Pergunta curta", "Resposta")
+    turns = await context.get_context("session-big")
+    check("turns past the token budget dropped", turns == [{"user": "Pergunta curta", "assistant": "Resposta"}], turns)
+
+
+async def main():
+    config.DB_DURABILITY = "async"
+    db = DatabaseService(lazy_load=False)
+    try:
+        await test_cold_and_warm(db)
+        await test_turn_recorded_during_read(db)
+        await test_queued_turns(db)
+        await test_invalidate_during_read(db)
+        await test_limits(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print("💬 Testing the session context cache...")
+    asyncio.run(main())
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All session context tests passed")
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Test script for the session summary tables (sessions, history_stats, daily_stats):
+the backfill migration on an existing database and the triggers that keep them current.
+
+Works on a throwaway database in a temporary directory. Importing main_enhanced runs
+its port cleanup, so stop the server before running this.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# DatabaseService always opens agent_database.db in the working directory
+os.chdir(tempfile.mkdtemp(prefix="session_summaries_"))
+
+from main_enhanced import DatabaseService
+
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+def create_legacy_database():
+    """Log tables as created before the summaries existed, with some history"""
+    conn = sqlite3.connect("agent_database.db")
+    conn.executescript('''
+        CREATE TABLE conversation_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            user_message TEXT,
+            assistant_response TEXT,
+            llm_provider TEXT,
+            llm_model TEXT,
+            processing_time REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE whatsapp_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_number TEXT NOT NULL,
+            message_text TEXT NOT NULL,
+            message_type TEXT DEFAULT 'text',
+            response_text TEXT,
+            processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    conn.executemany('''
+        INSERT INTO conversation_logs
+        (session_id, user_message, assistant_response, llm_provider, llm_model, processing_time, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (f"session-{session}", f"Pergunta {turn} da sessão {session}", f"Resposta {turn}",
+         "gemini" if session % 2 else "openrouter", "test-model", 0.5 if turn % 2 else None,
+         f"2024-01-{10 + session:02d} 12:{turn:02d}:00")
+        for session in range(4) for turn in range(5)
+    ])
+    conn.executemany('''
+        INSERT INTO whatsapp_messages (from_number, message_text, response_text, processed_at)
+        VALUES (?, ?, ?, ?)
+    ''', [
+        (f"55119999000{number}", f"Mensagem {turn} do WhatsApp", f"Resposta {turn}", f"2024-01-1{turn} 08:00:00")
+        for number in range(2) for turn in range(3)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def summaries(db):
+    """Current contents of the incrementally maintained summary tables"""
+    conn = db.connection()
+    return (
+        conn.execute("SELECT * FROM sessions ORDER BY session_id").fetchall(),
+        conn.execute("SELECT * FROM history_stats").fetchall(),
+        conn.execute("SELECT * FROM daily_stats ORDER BY day").fetchall(),
+    )
+
+
+def rebuilt_summaries(db):
+    """Summary tables recomputed from scratch by the backfill migration (rolled back afterwards)"""
+    conn = db.connection()
+    try:
+        db._migrate_backfill_session_summaries(conn)
+        return summaries(db)
+    finally:
+        conn.rollback()
+
+
+def check_summaries(db, name):
+    current = summaries(db)
+    expected = rebuilt_summaries(db)
+    check(name, current == expected, f"\n     current:  {current}\n     expected: {expected}")
+
+
+def test_backfill():
+    print("\n📋 Test 1: Existing history is summarized by the migration")
+    create_legacy_database()
+    db = DatabaseService(lazy_load=False)
+    stats = db.get_stats()
+    check("sessions backfilled", stats["conversations"] == 6, stats)
+    check("message counts backfilled", stats["messages"] == 20 and stats["whatsapp"] == 6, stats)
+    check("average response time backfilled", stats["avg_response_time"] == 0.5, stats)
+
+    session = db.get_session("session-1")
+    check("session row backfilled", session is not None and session[1] == "Pergunta 0 da sessão 1"
+          and session[2] == 5, session)
+    whatsapp = db.get_session("whatsapp:551199990001")
+    check("whatsapp session backfilled", whatsapp is not None and whatsapp[2] == 3, whatsapp)
+    days = dict(db.connection().execute("SELECT day, messages FROM daily_stats"))
+    check("daily counts backfilled", days.get("2024-01-10") == 7 and days.get("2024-01-13") == 5, days)
+    return db
+
+
+def test_triggers(db):
+    print("\n📋 Test 2: Triggers keep the summaries current on insert")
+    db.save_conversation("session-new", "Primeira pergunta", "Resposta", "gemini", "test-model", 1.5)
+    db.save_conversation("session-new", "Segunda pergunta", "Resposta", "openrouter", "test-model", None)
+    db.save_whatsapp_message("5511999900009", "Oi pelo WhatsApp", "Olá!")
+    db.save_batch(conversations=[
+        ("session-api", f"Chamada {i}", "Ok", "gemini", None, 0.2, "api", f"2024-02-01 10:00:0{i}")
+        for i in range(3)
+    ])
+    # An older row arriving late becomes the session's first message
+    db.save_batch(conversations=[
+        ("session-api", "Chamada atrasada", "Ok", "gemini", None, None, "api", "2024-01-31 09:00:00")
+    ])
+
+    session = db.get_session("session-new")
+    check("new session summarized", session is not None and session[2] == 2, session)
+    check("first message kept", session is not None and session[1] == "Primeira pergunta", session)
+    check("whatsapp session summarized", db.get_session("whatsapp:5511999900009") is not None)
+    session = db.get_session("session-api")
+    check("late row becomes the first message", session is not None and session[1] == "Chamada atrasada", session)
+    check("source recorded", db.connection().execute(
+        "SELECT source FROM sessions WHERE session_id = 'session-api'").fetchone() == ("api",))
+    check_summaries(db, "summaries match a full rebuild after inserts")
+
+
+def main():
+    print("📊 Testing session summaries...")
+    db = test_backfill()
+    try:
+        check_summaries(db, "backfilled summaries match a full rebuild")
+        test_triggers(db)
+    finally:
+        db.close()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All session summary tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script for the content-addressed cache of synthesized audio (TTSAudioCache).
+
+No TTS model is loaded. Importing main_enhanced runs its port cleanup, so stop the
+server before running this.
+"""
+import os
+import sys
+import tempfile
+import time
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# The app keeps its database and audio folders in the working directory
+os.chdir(tempfile.mkdtemp(prefix="tts_audio_cache_"))
+
+from main_enhanced import TTSAudioCache, config
+
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+def write_artifact(directory, cache, text, size):
+    key = cache.key(text, "test-model", "pt", None, "wav")
+    path = os.path.join(directory, cache.filename(key, "wav"))
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    cache.put(key, path)
+    return key, path
+
+
+def test_keys():
+    print("\n📋 Test 1: Cache keys")
+    cache = TTSAudioCache(tempfile.mkdtemp(prefix="tts_cache_"))
+    check("key ignores whitespace differences",
+          cache.key("Olá  mundo\n", "m", "pt", None, "wav") == cache.key("Olá mundo", "m", "pt", None, "wav"))
+    check("key depends on the text", cache.key("Olá", "m", "pt", None, "wav") != cache.key("Oi", "m", "pt", None, "wav"))
+    check("key depends on the model", cache.key("Olá", "a", "pt", None, "wav") != cache.key("Olá", "b", "pt", None, "wav"))
+    check("key depends on the language", cache.key("Olá", "m", "pt", None, "wav") != cache.key("Olá", "m", "en", None, "wav"))
+    check("key depends on the speaker",
+          cache.key("Olá", "m", "pt", "a", "wav") != cache.key("Olá", "m", "pt", "b", "wav"))
+    check("key depends on the format", cache.key("Olá", "m", "pt", None, "wav") != cache.key("Olá", "m", "pt", None, "mp3"))
+
+
+def test_eviction():
+    print("\n📋 Test 2: LRU eviction by entry count and size")
+    config.TTS_CACHE_MAX_ENTRIES = 3
+    config.TTS_CACHE_MAX_MB = 512
+    directory = tempfile.mkdtemp(prefix="tts_cache_")
+    cache = TTSAudioCache(directory)
+
+    first, first_path = write_artifact(directory, cache, "primeiro", 100)
+    second, _ = write_artifact(directory, cache, "segundo", 100)
+    check("stored artifact is a hit", cache.get(first) == first_path)
+    third, _ = write_artifact(directory, cache, "terceiro", 100)
+    fourth, _ = write_artifact(directory, cache, "quarto", 100)
+    check("least recently used entry evicted", cache.get(second) is None)
+    check("recently used entry kept", cache.get(first) == first_path)
+    check("evicted file deleted", len([n for n in os.listdir(directory) if n.endswith(".wav")]) == 3)
+
+    config.TTS_CACHE_MAX_ENTRIES = 100
+    config.TTS_CACHE_MAX_MB = 1
+    big = TTSAudioCache(tempfile.mkdtemp(prefix="tts_cache_"))
+    keys = [write_artifact(big.directory, big, f"grande {i}", 400 * 1024)[0] for i in range(4)]
+    check("size budget enforced", big.status()["entries"] == 2 and big.get(keys[0]) is None and big.get(keys[3]),
+          big.status())
+
+    os.remove(first_path)
+    check("entry whose file vanished is a miss", cache.get(first) is None)
+    return cache, third, fourth
+
+
+def test_persistence(cache, third, fourth):
+    print("\n📋 Test 3: Index persistence and work-file sweeping")
+    config.TTS_CACHE_MAX_ENTRIES = 3
+    config.TTS_CACHE_MAX_MB = 512
+    cache.flush()
+    directory = cache.directory
+    stale = os.path.join(directory, "tts_abandoned.wav.part")
+    fresh = os.path.join(directory, "tts_in_progress.wav.part")
+    for path in (stale, fresh):
+        open(path, "wb").close()
+    old = time.time() - TTSAudioCache.WORK_FILE_MAX_AGE - 60
+    os.utime(stale, (old, old))
+
+    reloaded = TTSAudioCache(directory)
+    check("index persisted across restarts", reloaded.get(third) is not None and reloaded.get(fourth) is not None)
+    check("abandoned work files swept", not os.path.exists(stale))
+    check("recent work files kept", os.path.exists(fresh))
+
+
+def main():
+    print("🎵 Testing the TTS audio cache...")
+    config.TTS_CACHE_ENABLED = True
+    test_keys()
+    cache, third, fourth = test_eviction()
+    test_persistence(cache, third, fourth)
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All TTS audio cache tests passed")
+
+
+if __name__ == "__main__":
+    main()
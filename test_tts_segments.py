@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Test script for long-text TTS: sentence segmentation, crossfaded joining, segment
+synthesis on the shared model and the torch thread cap.
+
+Uses a fake resident model (no Coqui install needed). Importing main_enhanced runs its
+port cleanup, so stop the server before running this.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+
+import numpy as np
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# The app keeps its database and audio folders in the working directory
+os.chdir(tempfile.mkdtemp(prefix="tts_segments_"))
+
+from main_enhanced import SentenceChunker, WorkerPool, config, crossfade_concat, physical_cpu_count, tts_service
+
+MODEL_NAME = "tts_models/pt/cv/vits"
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+class FakeModel:
+    """Stands in for a loaded Coqui model: 0.1 s of audio per call, recording overlapping inferences"""
+
+    def __init__(self):
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def tts(self, text, **kwargs):
+        with self._lock:
+            self.calls.append(text)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(0.05)
+            return np.full(2205, 0.5, dtype=np.float32)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def resident(*models):
+    tts_service._models.clear()
+    for index, model in enumerate(models):
+        tts_service._models[(f"{MODEL_NAME}-{index}" if index else MODEL_NAME, "cpu")] = {
+            "model": model, "size_mb": 0, "loaded_at": "", "hits": 0
+        }
+
+
+def test_split():
+    print("\n📋 Test 1: Splitting long text into synthesis segments")
+    text = ("Esta é a primeira frase da resposta. Esta é a segunda frase, um pouco mais longa, "
+            "com várias vírgulas, pausas; e um travessão — no meio do texto para forçar cortes. "
+            "Fim.") * 3
+    segments = SentenceChunker.split(text, 80)
+    check("segments respect max_chars", all(len(segment) <= 80 for segment in segments),
+          [len(segment) for segment in segments])
+    check("no words lost or reordered", " ".join(segments).split() == text.split())
+    check("short text stays whole", SentenceChunker.split("Olá, tudo bem?", 80) == ["Olá, tudo bem?"])
+    check("abbreviations don't split sentences",
+          SentenceChunker.split("O Sr. Silva mora na Av. Paulista. Ele chega amanhã.", 40)
+          == ["O Sr. Silva mora na Av. Paulista.", "Ele chega amanhã."])
+    check("unbreakable text cut at max_chars",
+          all(len(segment) <= 20 for segment in SentenceChunker.split("a" * 50, 20)))
+
+
+def test_crossfade_concat():
+    print("\n📋 Test 2: Crossfaded joining of audio segments")
+    parts = [np.ones(1000, dtype=np.float32), np.ones(800, dtype=np.float32), np.ones(600, dtype=np.float32)]
+    joined = crossfade_concat(parts, 100)
+    check("each boundary overlaps by the crossfade", len(joined) == 2400 - 2 * 100, len(joined))
+    check("equal-power fade keeps a constant signal level", np.all(joined > 0.99) and np.all(joined < 1.42),
+          (joined.min(), joined.max()))
+    joined = crossfade_concat([np.zeros(10, dtype=np.float32), np.ones(500, dtype=np.float32)], 100)
+    check("overlap limited by a short segment", len(joined) == 500, len(joined))
+    check("single segment returned unchanged", len(crossfade_concat([np.ones(10)], 100)) == 10)
+
+
+async def test_long_speech():
+    print("\n📋 Test 3: Long texts are synthesized segment by segment")
+    model = FakeModel()
+    resident(model)
+    tts_service.worker_pool.shutdown()
+    tts_service.worker_pool = WorkerPool("tts", max_workers=4, max_queue=16, timeout=10)
+    config.TTS_CACHE_ENABLED = True
+    config.TTS_SEGMENT_MAX_CHARS = 60
+    config.TTS_CROSSFADE_MS = 10
+
+    text = " ".join(f"Esta é a frase número {i} de uma resposta bem longa." for i in range(6))
+    segments = SentenceChunker.split(text, config.TTS_SEGMENT_MAX_CHARS)
+    result = await tts_service.generate_speech(text, MODEL_NAME)
+    check("long text synthesized", result.get("success"), result)
+    check("one model call per segment", model.calls == segments, model.calls)
+    check("segments never overlap on the shared model", model.max_active == 1, model.max_active)
+    check("only the joined result is cached", tts_service.audio_cache.status()["entries"] == 1,
+          tts_service.audio_cache.status())
+
+    again = await tts_service.generate_speech(text, MODEL_NAME)
+    check("repeat request served from the cache", again.get("cached") and len(model.calls) == len(segments), again)
+
+    await tts_service.synthesize_segment("Olá, tudo bem?", MODEL_NAME)
+    check("standalone segments are still cached", tts_service.audio_cache.status()["entries"] == 2,
+          tts_service.audio_cache.status())
+
+
+def test_torch_threads():
+    print("\n📋 Test 4: torch threads follow the resident models")
+    fake_torch = types.ModuleType("torch")
+    fake_torch.threads = 8
+    fake_torch.get_num_threads = lambda: fake_torch.threads
+    fake_torch.set_num_threads = lambda n: setattr(fake_torch, "threads", n)
+    real_torch = sys.modules.get("torch")
+    sys.modules["torch"] = fake_torch
+    try:
+        tts_service._torch_default_threads = None
+        tts_service.worker_pool = WorkerPool("tts", max_workers=4, max_queue=0, timeout=10)
+        config.TTS_TORCH_THREADS = 0
+
+        resident(FakeModel())
+        tts_service._configure_torch_threads()
+        check("one resident model keeps torch's default", fake_torch.threads == 8, fake_torch.threads)
+
+        resident(FakeModel(), FakeModel())
+        tts_service._configure_torch_threads()
+        expected = max(physical_cpu_count() // 2, 1)
+        check("two resident models split the cores", fake_torch.threads == expected, fake_torch.threads)
+
+        resident(FakeModel())
+        tts_service._configure_torch_threads()
+        check("default restored after an eviction", fake_torch.threads == 8, fake_torch.threads)
+
+        tts_service.worker_pool = WorkerPool("tts", max_workers=1, max_queue=0, timeout=10)
+        resident(FakeModel(), FakeModel())
+        tts_service._configure_torch_threads()
+        check("a single worker keeps torch's default", fake_torch.threads == 8, fake_torch.threads)
+
+        config.TTS_TORCH_THREADS = 3
+        tts_service._configure_torch_threads()
+        check("TTS_TORCH_THREADS wins", fake_torch.threads == 3, fake_torch.threads)
+    finally:
+        if real_torch is not None:
+            sys.modules["torch"] = real_torch
+        else:
+            del sys.modules["torch"]
+        tts_service.worker_pool.shutdown()
+
+
+def main():
+    print("🎵 Testing long-text TTS segmentation...")
+    test_split()
+    test_crossfade_concat()
+    asyncio.run(test_long_speech())
+    test_torch_threads()
+
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All long-text TTS tests passed")
+
+
+if __name__ == "__main__":
+    main()
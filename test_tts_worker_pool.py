@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test script for TTS synthesis on the bounded worker pool.
+
+Uses a fake resident model (no Coqui install needed) to check that synthesis stays off
+the event loop, that requests sharing a model never run inference at the same time,
+and that a full queue or a slow job are reported as 503/504.
+Importing main_enhanced runs its port cleanup, so stop the server before running this.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# The app keeps its database and audio folders in the working directory
+os.chdir(tempfile.mkdtemp(prefix="tts_worker_pool_"))
+
+from main_enhanced import WorkerPool, config, encode_wav, tts_service
+
+MODEL_NAME = "tts_models/pt/cv/vits"
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+class FakeModel:
+    """Stands in for a loaded Coqui model; records how many inferences overlap"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def tts_to_file(self, text, file_path, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.seconds)
+            with open(file_path, "wb") as f:
+                f.write(encode_wav(np.zeros(2205), 22050))
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def use_model(model, workers, max_queue=8, timeout=10):
+    """Make the fake model resident and give the service a fresh pool"""
+    tts_service._models.clear()
+    tts_service._models[(MODEL_NAME, "cpu")] = {"model": model, "size_mb": 0, "loaded_at": "", "hits": 0}
+    tts_service.worker_pool.shutdown()
+    tts_service.worker_pool = WorkerPool("tts", max_workers=workers, max_queue=max_queue, timeout=timeout)
+
+
+async def max_loop_lag(stop: asyncio.Event) -> float:
+    """Largest delay seen by a 10 ms ticker while synthesis runs"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, time.perf_counter() - started - 0.01)
+    return worst
+
+
+async def test_concurrent_requests():
+    print("\n📋 Test 1: Concurrent requests share the model safely off the event loop")
+    model = FakeModel(0.2)
+    use_model(model, workers=4)
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(max_loop_lag(stop))
+    results = await asyncio.gather(*[
+        tts_service.generate_speech(f"Frase número {i}.", MODEL_NAME) for i in range(4)
+    ])
+    stop.set()
+    lag = await ticker
+    check("every request succeeded", all(result.get("success") for result in results), results)
+    check("one inference at a time on the shared model", model.max_active == 1, model.max_active)
+    check("event loop stayed responsive", lag < 0.1, f"{lag:.3f}s")
+
+
+async def test_saturation():
+    print("\n📋 Test 2: A full queue is rejected with 503")
+    use_model(FakeModel(0.3), workers=1, max_queue=0)
+    results = await asyncio.gather(*[
+        tts_service.generate_speech(f"Outra frase {i}.", MODEL_NAME) for i in range(2)
+    ])
+    codes = sorted(result.get("status_code", 200) for result in results)
+    check("second request rejected", codes == [200, 503], results)
+    check("rejection counted", tts_service.worker_pool.status()["rejected"] == 1)
+
+
+async def test_timeout():
+    print("\n📋 Test 3: A slow synthesis times out with 504")
+    use_model(FakeModel(0.5), workers=1, timeout=0.1)
+    result = await tts_service.generate_speech("Frase demorada.", MODEL_NAME)
+    check("timeout reported", result.get("status_code") == 504, result)
+    await asyncio.sleep(0.6)
+    check("worker released after the slow job", tts_service.worker_pool.status()["running"] == 0)
+
+
+async def main():
+    print("🎵 Testing the TTS worker pool...")
+    config.TTS_CACHE_ENABLED = False
+    config.TTS_SEGMENT_MAX_CHARS = 0
+    try:
+        await test_concurrent_requests()
+        await test_saturation()
+        await test_timeout()
+    finally:
+        tts_service.worker_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All TTS worker pool tests passed")
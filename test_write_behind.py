@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script for the write-behind conversation/WhatsApp logger.
+
+Works on a throwaway database in a temporary directory. Importing main_enhanced runs
+its port cleanup, so stop the server before running this.
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+# Add backend directory to path
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+# DatabaseService always opens agent_database.db in the working directory
+os.chdir(tempfile.mkdtemp(prefix="write_behind_"))
+
+from main_enhanced import DatabaseService, DatabaseWriteBehind, config
+
+failures = []
+
+
+def check(name, condition, detail=""):
+    if condition:
+        print(f"  ✅ {name}")
+    else:
+        print(f"  ❌ {name} {detail}")
+        failures.append(name)
+
+
+def count(db, table):
+    return db.connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+class FlakyDatabase:
+    """Wraps DatabaseService, failing save_batch as if the database were locked"""
+
+    def __init__(self, db, failures_left):
+        self.db = db
+        self.failures_left = failures_left
+        self.attempts = 0
+
+    def save_batch(self, conversations=None, whatsapp_messages=None):
+        self.attempts += 1
+        if self.failures_left:
+            self.failures_left -= 1
+            raise sqlite3.OperationalError("database is locked")
+        self.db.save_batch(conversations, whatsapp_messages)
+
+
+async def test_batched_flush(db):
+    print("\n📋 Test 1: Records are accepted immediately and flushed in batches")
+    writer = DatabaseWriteBehind(db)
+    await writer.start()
+    for i in range(25):
+        writer.save_conversation("session-queued", f"Pergunta {i}", "Resposta", "gemini", None, 0.25)
+    writer.save_whatsapp_message("5511999900042", "Mensagem enfileirada", "Ok")
+    check("nothing written before the flush", count(db, "conversation_logs") == 0)
+    await asyncio.sleep(config.DB_FLUSH_INTERVAL_MS / 1000 * 2)
+    check("queued records flushed", count(db, "conversation_logs") == 25 and count(db, "whatsapp_messages") == 1)
+    check("flushed as one batch", writer.batches_flushed == 1, writer.status())
+    writer.save_conversation("session-queued", "Última pergunta", "Resposta")
+    await writer.stop()
+    check("shutdown flushes what is still queued", count(db, "conversation_logs") == 26)
+
+
+async def test_retry(db):
+    print("\n📋 Test 2: A locked database is retried with backoff")
+    flaky = FlakyDatabase(db, failures_left=2)
+    writer = DatabaseWriteBehind(flaky)
+    await writer.start()
+    writer.save_conversation("session-retry", "Pergunta", "Resposta")
+    await writer.stop()
+    check("batch written after retries", count(db, "conversation_logs") == 27, writer.status())
+    check("retried twice", flaky.attempts == 3, flaky.attempts)
+    check("nothing spilled", writer.records_spilled == 0 and not os.path.exists(config.DB_SPILL_PATH))
+
+
+async def test_spill_and_replay(db):
+    print("\n📋 Test 3: Batches that keep failing are spilled and replayed")
+    flaky = FlakyDatabase(db, failures_left=100)
+    writer = DatabaseWriteBehind(flaky)
+    await writer.start()
+    for i in range(3):
+        writer.save_conversation("session-spill", f"Pergunta {i}", "Resposta")
+    writer.save_whatsapp_message("5511999900043", "Mensagem perdida?", "Não")
+    await writer.stop()
+    check("failed batch counted", writer.flush_errors == 1, writer.status())
+    check("records spilled to disk", writer.records_spilled == 4 and os.path.exists(config.DB_SPILL_PATH),
+          writer.status())
+    check("nothing written while the database fails", count(db, "conversation_logs") == 27)
+
+    writer = DatabaseWriteBehind(db)
+    await writer.start()
+    await writer.stop()
+    check("spilled records replayed on startup", count(db, "conversation_logs") == 30
+          and count(db, "whatsapp_messages") == 2)
+    check("spill file removed", not os.path.exists(config.DB_SPILL_PATH))
+    rows = db.connection().execute(
+        "SELECT user_message, source FROM conversation_logs WHERE session_id = 'session-spill' ORDER BY id"
+    ).fetchall()
+    check("replayed rows intact", rows == [(f"Pergunta {i}", "web") for i in range(3)], rows)
+
+
+async def test_sync_fallback(db):
+    print("\n📋 Test 4: Synchronous writes spill instead of dropping records")
+    flaky = FlakyDatabase(db, failures_left=1)
+    writer = DatabaseWriteBehind(flaky)  # not started: writes synchronously
+    writer.save_conversation("session-sync", "Pergunta", "Resposta")
+    check("failed synchronous write spilled", os.path.exists(config.DB_SPILL_PATH))
+    writer.save_conversation("session-sync", "Outra pergunta", "Resposta")
+    check("spill replayed after the next successful write", count(db, "conversation_logs") == 32
+          and not os.path.exists(config.DB_SPILL_PATH))
+    writer._executor.shutdown()
+
+
+async def main():
+    config.DB_DURABILITY = "async"
+    config.DB_FLUSH_RETRIES = 2
+    db = DatabaseService(lazy_load=False)
+    try:
+        await test_batched_flush(db)
+        await test_retry(db)
+        await test_spill_and_replay(db)
+        await test_sync_fallback(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print("💾 Testing the database write-behind logger...")
+    asyncio.run(main())
+    if failures:
+        print(f"\n❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ All write-behind tests passed")